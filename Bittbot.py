@@ -14,17 +14,17 @@
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
 import sys
-from typing import List
 
-from api import Api
-from api.bittrex import Bittrex
-from api.poloniex import Poloniex
+from api import ExchangeFactory
 from domain import Parameters
-from domain.TickerData import TickerData
+from domain.CoinRegistry import CoinRegistry
+from domain.TickerSnapshot import TickerSnapshot
 from utils import Config
 from utils import ConfigGenerator
 from utils.LoggingUtils import LoggingUtils
 from utils.ConfigTelegram import ConfigTelegram
+from worker.AsyncBotWorker import AsyncBotWorker
+from worker.BotHost import BotHost
 from worker.BotWorker import BotWorker
 
 
@@ -41,6 +41,12 @@ class BittBot(object):
             self.logger.logging_empty_line()
             self.logger.logging_info("BITTBOT version {}.{}.{}".format(Config.VERSION_MAJOR, Config.VERSION_MINOR, Config.VERSION_REVISION))
 
+            if "Workers" in self.params.config:
+                # Many strategies at once, each one with the parameters of its worker in the config
+                bot_host = BotHost(self.params, self.api, self.apikey)
+                bot_host.run()
+                return
+
             self.remove_invalid_alt_pairs()
             self.params.funcionamiento = Config.get_strategy_type()  # Get operation type
 
@@ -56,7 +62,10 @@ class BittBot(object):
                 config_telegram.run()
 
             elif self.params.funcionamiento in [Config.STRATEGY_AUTO_MARGIN, Config.STRATEGY_MACD_RSI, Config.STRATEGY_MANUAL_INCREMENT_24H_ALL_ALTS, Config.STRATEGY_BBANDS]:
-                bot = BotWorker(self.params, self.api)
+                if self.params.config.get("Async_Worker", False):
+                    bot = AsyncBotWorker(self.params, self.api)
+                else:
+                    bot = BotWorker(self.params, self.api)
                 bot.run()
 
             else:
@@ -75,41 +84,23 @@ class BittBot(object):
             self.logger.print_help()
             sys.exit(1)
 
-        self.params.coins_trader = []
+        self.params.coins_trader = CoinRegistry()
         api_keys = Config.read_api_keys_config()
+        self.apikey = api_keys
 
         self.params.config_file = Config.get_config_file()
         self.params.config = Config.read_config(self.params.config_file)
-        if self.params.config["Exchange"] == "Bittrex":
-            external_api = Bittrex.Bittrex(api_keys["Bittrex_ApiKey"], api_keys["Bittrex_ApiSecret"])
-            self.params.api_key = api_keys["Bittrex_ApiKey"]
-        elif self.params.config["Exchange"] == "Poloniex":
-            external_api = Poloniex.Poloniex(api_keys["Poloniex_ApiKey"], api_keys["Poloniex_ApiSecret"])
-            self.params.api_key = api_keys["Poloniex_ApiKey"]
-        else:
+        self.api = ExchangeFactory.create_api(self.params, self.params.config["Exchange"], api_keys)
+        if self.api is None:
             self.logger.logging_info("Exchange {} not supported.".format(self.params.config["Exchange"]))
-            self.logger.logging_info("Valid options are Poloniex and Bittrex")
+            self.logger.logging_info("Valid options are {}".format(" and ".join(ExchangeFactory.SUPPORTED_EXCHANGES)))
             sys.exit(1)
-        self.api = Api.Api(self.params, external_api)
+        self.params.api_key = api_keys[self.params.config["Exchange"] + "_ApiKey"]
         self.params.altstr = self.params.config["Alt_Coin"]
         self.params.working_alts = self.params.config["WorkingAlts"]
 
     def remove_invalid_alt_pairs(self):
-        ticker = self.api.get_full_ticker()  # type: List[TickerData]
-
-        not_existing_alts = []
-        for alt in self.params.working_alts:
-            alt_pair = self.params.altstr + '_' + alt
-            found = False
-            for ticker_alt in ticker:
-                if ticker_alt.marketName == alt_pair:
-                    found = True
-            if not found:
-                not_existing_alts.append(alt)
-                continue
-        if len(not_existing_alts) > 0:
-            self.logger.logging_line_char("-")
-            for al in not_existing_alts:
-                self.logger.logging_warning('LA COMBINACION {}_{} NO EXISTE EN EL EXCHANGE, ELIMINANDOLA DE LA LISTA'.format(self.params.altstr, al))
-                self.params.working_alts.remove(al)
-            self.logger.logging_line_char("-")
+        ticker_snapshot = TickerSnapshot()
+        ticker_snapshot.update(self.api.get_full_ticker())
+
+        Config.remove_invalid_alt_pairs(self.params, ticker_snapshot)
@@ -20,4 +20,6 @@ def start_bot():
     app.run()
 
 
-start_bot()
+# Guarded: the worker processes import this module again when they start
+if __name__ == '__main__':
+    start_bot()
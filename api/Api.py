@@ -13,36 +13,106 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from domain.BalanceCache import BalanceCache
 from domain.CoinMarketData import CoinMarketData
+from domain.MarketHistoric import MarketHistoric
+from domain.OrdersSnapshot import OrdersSnapshot
 from domain.Parameters import Parameters
+from domain.TickJournal import TickJournal
 from domain.TickerData import TickerData
+from event.BalanceUpdated import BalanceUpdated
+from event.OrderUpdated import OrderUpdated
+from utils import Config
+from utils.LatencyProxy import LatencyProxy
 from utils.LoggingUtils import LoggingUtils
 
 
 class Api(object):
     def __init__(self, params: Parameters, api):
         self.params = params
-        self.api = api
+        # Every call to the Exchange (Poloniex, Bittrex) is measured
+        self.api = LatencyProxy(api, type(api).__name__)
         self.shown_ticker_minute = -1
         self.logger = LoggingUtils()
-        self.market_historic = None
+        # Market data fed by the websocket, one for each candle timeframe of the workers sharing this Api
+        self.market_historics = []  # type: List[MarketHistoric]
+        self.subscribe_lock = threading.Lock()
+        # Feeds the market historics in place of the websocket of the Exchange (worker processes, see SharedMarketFeed)
+        self.market_feed = None
+        self.tick_journal = None  # type: TickJournal
+        # Orders pushed by the account websocket, empty if the Exchange doesn't send them
+        self.account_orders = OrdersSnapshot([], [])
+        self.balances = BalanceCache(self.api.get_full_balance)
 
     def get_full_ticker(self) -> List[TickerData]:
         return self.api.get_full_ticker()
 
+    '''
+    Feeds market_historic with the websocket. Many workers can subscribe their market historics, all of them are fed
+    by the same websocket connection, opened with the first subscription. With a market feed, it's used instead.
+    '''
     def subscribe_websocket(self, market_historic):
-        self.market_historic = market_historic
-        self.api.subscribe_websocket(self.process_websocket_ticker_update)
+        with self.subscribe_lock:
+            if market_historic in self.market_historics:
+                return
+            market_historic.enable_candle_repair(self.get_historic_values_between)
+            if self.market_feed is None:
+                # The websocket only sends the markets that change, so start from the full ticker
+                market_historic.ticker_snapshot.update(self.get_full_ticker())
+            self.market_historics = self.market_historics + [market_historic]
+            if len(self.market_historics) > 1:
+                return
+            if self.market_feed is not None:
+                self.market_feed.start(self)
+            else:
+                self.api.subscribe_websocket(self.process_websocket_ticker_update, self.process_websocket_reconnected,
+                                             self.process_websocket_order_update, self.process_websocket_balance_update)
 
     def process_websocket_ticker_update(self, ws_ticker):
         show_ticker = False
         if datetime.now().minute != self.shown_ticker_minute:
             self.shown_ticker_minute = datetime.now().minute
             show_ticker = True
-        self.market_historic.process_ticker(ws_ticker, show_ticker)
+        for market_historic in self.market_historics:
+            market_historic.process_ticker(ws_ticker, show_ticker)
+        if self.tick_journal is not None:
+            self.tick_journal.append(ws_ticker)
+
+    def enable_tick_journal(self, directory):
+        self.tick_journal = TickJournal(directory)
+
+    def close_tick_journal(self):
+        if self.tick_journal is not None:
+            self.tick_journal.close()
+            self.tick_journal = None
+
+    def process_websocket_reconnected(self):
+        self.logger.logging_warning("Reconectado al Websocket, se repararán las velas del tiempo desconectado")
+        for market_historic in self.market_historics:
+            market_historic.websocket_reconnected()
+
+    '''
+    An order of the account has been opened, changed or closed (filled or cancelled). market_name is None when the
+    Exchange doesn't tell it.
+    '''
+    def process_websocket_order_update(self, market_name, order_id, is_open, traded):
+        if is_open:
+            self.account_orders.add_open_order(order_id)
+        else:
+            self.account_orders.close_order(order_id, traded)
+            self.invalidate_balances(market_name)
+        for market_historic in self.market_historics:
+            market_historic.events.publish(OrderUpdated([market_name] if market_name is not None else [], str(order_id)))
+
+    def process_websocket_balance_update(self, currencies):
+        self.balances.invalidate(currencies)
+        for market_historic in self.market_historics:
+            market_historic.events.publish(BalanceUpdated(currencies))
 
     def hist_exists(self, coin, n_order):
         return self.api.exist_trade_order(coin, n_order)
@@ -51,6 +121,7 @@ class Api(object):
         order_num, price = self.api.order_buy(currency_pair, lowest_ask, invest_balance)
 
         if order_num is not None:
+            self.invalidate_balances(currency_pair)
             self.logger.logging_result_star('{} CREADA ORDEN DE COMPRA NUM {} - PRECIO: {} - INVERSION: {}'.format(currency_pair, order_num, lowest_ask, invest_balance))
         else:
             self.logger.logging_result_star('{} FALLO AL INTENTAR CRER ORDEN DE COMPRA - PRECIO: {} - INVERSION: {}'.format(currency_pair, lowest_ask, invest_balance))
@@ -61,6 +132,7 @@ class Api(object):
         order_num = self.api.order_sell(currency_pair, sell_price, invest_balance)
 
         if order_num is not None:
+            self.invalidate_balances(currency_pair)
             self.logger.logging_result_star("{} CREADA ORDEN DE VENTA NUM {} - PRECIO: {} - IVERSION: {}".format(currency_pair, order_num, sell_price, invest_balance))
         else:
             self.logger.logging_result_star('{} ERROR AL INTENTAR CRER ORDEN DE VENDA - PRECIO: {} - INVERSION: {}'.format(currency_pair, sell_price, invest_balance))
@@ -69,6 +141,8 @@ class Api(object):
 
     def order_move(self, close_order_id, lowest_ask, operation_type):
         order_num = self.api.order_move(close_order_id, lowest_ask, operation_type)
+        # The market is not known, and even a failed move may have cancelled the order
+        self.invalidate_balances()
 
         if order_num is not None:
             self.logger.logging_result_star('MOVIDA ORDEN DE {}: {} -> {} AL NUEVO PRECIO: {} CORRECTAMENTE'.format(operation_type, close_order_id, order_num, lowest_ask))
@@ -80,28 +154,57 @@ class Api(object):
     def open_orders(self, currency_pair, num_last_order):
         return self.api.open_orders(currency_pair, num_last_order)
 
-    def get_balance(self, c):
-        return self.api.get_balance(c)
+    def get_orders_snapshot(self) -> Optional[OrdersSnapshot]:
+        return self.api.get_orders_snapshot()
+
+    '''
+    Returns the balance of the currency (ex: BTC), or of the alt of the pair (ex: BTC_NEO -> NEO), from the cache.
+    '''
+    def get_balance(self, c, refresh=False):
+        cc = c.split('_')
+        return self.balances.get_balance(cc[-1], refresh)
+
+    '''
+    Balances of the currencies of the pair (ex: BTC_NEO -> BTC and NEO) must be read again, or all of them if the
+    pair is not known.
+    '''
+    def invalidate_balances(self, currency_pair=None):
+        if currency_pair is None:
+            self.balances.invalidate()
+        else:
+            self.balances.invalidate(currency_pair.split('_'))
 
     def get_full_balance(self):
         return self.api.get_full_balance()
 
-    def exists_in_coins_trader(self, coin):
-        for co in self.params.coins_trader:
-            if coin == co.n_alt:
-                return True
-        return False
-
-    def num_open_orders(self):
-        n_open_orders = 0
-        for c in self.params.coins_trader:
-            if c.operation_type != 'NO_ORDER':
-                n_open_orders += 1
-
-        return n_open_orders
-
     def get_historic_values_fifteen_min(self, coin, max_lasts=500) -> CoinMarketData:
         return self.api.get_historic_values_fifteen_min(coin, max_lasts)
 
     def get_historic_values_five_min(self, coin, max_lasts=500) -> CoinMarketData:
         return self.api.get_historic_values_five_min(coin, max_lasts)
+
+    '''
+    Gets the candles of candles_time_minutes opened between start and end (epoch seconds), to repair candles lost.
+    '''
+    def get_historic_values_between(self, coin, candles_time_minutes, start, end) -> CoinMarketData:
+        return self.api.get_historic_values_between(coin, candles_time_minutes, start, end)
+
+    '''
+    Gets the historic candles of many coins at once. historic_requests has the number of candles wanted for each coin.
+    The coins are requested from a pool of threads and every request waits for the rate limiter of the Exchange, so it
+    takes what the Exchange allows instead of a fixed time per coin. Yields (coin, CoinMarketData) as soon as each coin
+    is received, in no particular order.
+    '''
+    def get_historic_values_many(self, historic_requests: Dict[str, int], candles_time_minutes: int) -> Iterator[Tuple[str, CoinMarketData]]:
+        if candles_time_minutes == 15:
+            get_historic_values = self.get_historic_values_fifteen_min
+        elif candles_time_minutes == 5:
+            get_historic_values = self.get_historic_values_five_min
+        else:
+            raise ValueError("No hay valores historicos de {} minutos".format(candles_time_minutes))
+        if len(historic_requests) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=min(Config.HISTORIC_BACKFILL_WORKERS, len(historic_requests))) as executor:
+            futures = {executor.submit(get_historic_values, coin, max_lasts): coin for coin, max_lasts in historic_requests.items()}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
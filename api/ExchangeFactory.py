@@ -0,0 +1,35 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+from typing import Optional
+
+from api.Api import Api
+from api.bittrex import Bittrex
+from api.poloniex import Poloniex
+from domain.Parameters import Parameters
+
+SUPPORTED_EXCHANGES = ["Poloniex", "Bittrex"]
+
+
+# Creates the Api of the exchange with its keys in api_keys, or None if the exchange is not supported
+def create_api(params: Parameters, exchange, api_keys) -> Optional[Api]:
+    if exchange == "Bittrex":
+        external_api = Bittrex.Bittrex(api_keys["Bittrex_ApiKey"], api_keys["Bittrex_ApiSecret"])
+    elif exchange == "Poloniex":
+        external_api = Poloniex.Poloniex(api_keys["Poloniex_ApiKey"], api_keys["Poloniex_ApiSecret"])
+    else:
+        return None
+    return Api(params, external_api)
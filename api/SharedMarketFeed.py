@@ -0,0 +1,167 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+import time
+import zlib
+from threading import Thread
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from domain.SharedMarketData import SharedMarketData, attach_shared_market_data, SHARED_TICKER_COLUMNS
+from domain.TickerData import TickerData
+from utils import Config
+from utils.LoggingUtils import LoggingUtils
+
+
+class SharedMarketFeed(object):
+    '''
+    Feeds the market historics of the Api of a worker process with the shared market data written by the process with
+    the websocket, in place of the websocket of the Exchange. The shared memory is polled every
+    Config.SHARED_MARKET_POLL_SECONDS and only the tickers and candles that changed are read.
+    Each worker process only reads its shard of the markets: the ones with crc32(market name) % shard_count equal to
+    shard_index, so the coins are split between the processes without asking anyone.
+    '''
+    def __init__(self, shared_data_name, shard_index=0, shard_count=1):
+        self.shared_data_name = shared_data_name
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.shared_data = None  # type: SharedMarketData
+        self.api = None
+        self.logger = LoggingUtils()
+        self.feed_thread = None  # type: Thread
+        # Markets of the shard, their slots in the shared memory and the sequence of their last ticker read
+        self.market_names = []  # type: List[str]
+        self.market_slots = np.zeros(0, dtype=np.int64)
+        self.ticker_sequences = np.zeros(0, dtype=np.int64)
+        self.candle_sequences = np.zeros(0, dtype=np.int64)
+        self.num_markets_seen = 0
+        self.tickers_version = -1
+        self.candles_version = -1
+        # Generation of the candles of each market when they were last read
+        self.candle_generations = {}  # type: Dict[str, int]
+
+    def is_in_shard(self, market_name) -> bool:
+        return zlib.crc32(market_name.encode()) % self.shard_count == self.shard_index
+
+    '''
+    Starts feeding the market historics of api. Called by Api.subscribe_websocket.
+    '''
+    def start(self, api) -> None:
+        if self.feed_thread is not None:
+            return
+        self.api = api
+        self.shared_data = attach_shared_market_data(self.shared_data_name)
+        self.feed_thread = Thread(target=self.run_feed)
+        self.feed_thread.daemon = True
+        self.feed_thread.start()
+
+    def run_feed(self) -> None:
+        while True:
+            try:
+                self.read_new_markets()
+                self.read_tickers()
+                self.read_candles()
+            except Exception:
+                self.logger.logging_bittbot_error('LEER LOS DATOS DE MERCADO COMPARTIDOS')
+            time.sleep(Config.SHARED_MARKET_POLL_SECONDS)
+
+    def read_new_markets(self) -> None:
+        num_markets = len(self.shared_data)
+        if num_markets == self.num_markets_seen:
+            return
+        new_names = self.shared_data.get_market_names(self.num_markets_seen)
+        new_slots = [self.num_markets_seen + i for i, market_name in enumerate(new_names) if self.is_in_shard(market_name)]
+        self.market_names.extend(new_names[slot - self.num_markets_seen] for slot in new_slots)
+        self.market_slots = np.concatenate([self.market_slots, np.array(new_slots, dtype=np.int64)])
+        self.ticker_sequences = np.concatenate([self.ticker_sequences, np.zeros(len(new_slots), dtype=np.int64)])
+        self.candle_sequences = np.concatenate([self.candle_sequences, np.zeros(len(new_slots), dtype=np.int64)])
+        self.num_markets_seen = num_markets
+
+    def read_tickers(self) -> None:
+        tickers_version = self.shared_data.get_tickers_version()
+        if tickers_version == self.tickers_version or len(self.market_slots) == 0:
+            return
+        self.tickers_version = tickers_version
+        # Compared over all the markets of the shard at once
+        changed = np.nonzero(self.shared_data.ticker_sequences[self.market_slots] != self.ticker_sequences)[0]
+        if len(changed) == 0:
+            return
+        read, tickers, sequences = self.shared_data.read_tickers(self.market_slots[changed])
+        # The rows still being written are read on the next poll, the writer changes the version after them
+        changed = changed[read]
+        partial_ticker = []
+        for position, values, sequence in zip(changed, tickers, sequences):
+            self.ticker_sequences[position] = sequence
+            partial_ticker.append(self.to_ticker_data(self.market_names[position], values))
+        if len(partial_ticker) > 0:
+            self.api.process_websocket_ticker_update(partial_ticker)
+
+    def to_ticker_data(self, market_name, values) -> TickerData:
+        ticker = dict(zip(SHARED_TICKER_COLUMNS, values))
+        ticker_data = TickerData()
+        ticker_data.marketName = market_name
+        ticker_data.high = ticker['high24hr']
+        ticker_data.low = ticker['low24hr']
+        ticker_data.last = ticker['last']
+        ticker_data.ask = ticker['lowestAsk']
+        ticker_data.bid = ticker['highestBid']
+        ticker_data.percentChange = ticker['percentChange']
+        ticker_data.baseVolume = ticker['baseVolume']
+        ticker_data.timeStamp = ticker['time'] if ticker['time'] > 0 else None
+        return ticker_data
+
+    def read_candles(self) -> None:
+        candles_version = self.shared_data.get_candles_version()
+        if candles_version == self.candles_version or len(self.market_slots) == 0:
+            return
+        self.candles_version = candles_version
+        sequences = self.shared_data.candle_sequences[self.market_slots].copy()
+        changed = np.nonzero(sequences != self.candle_sequences)[0]
+        if len(changed) == 0:
+            return
+        # Markets to read again next time: without ticker yet, or being written on every try
+        unread = set()
+        for market_historic in self.api.market_historics:
+            new_candles = {}  # type: Dict[str, Tuple[np.ndarray, bool]]
+            for position in changed:
+                market_name = self.market_names[position]
+                read = self.read_market_candles(market_historic, market_name, int(self.market_slots[position]))
+                if read is None:
+                    unread.add(market_name)
+                elif read[0].shape[1] > 0:
+                    new_candles[market_name] = read
+            unread.update(market_historic.add_closed_candles(new_candles))
+        self.candle_sequences[changed] = sequences[changed]
+        for position in changed:
+            if self.market_names[position] in unread:
+                self.candle_sequences[position] = -1
+                self.candle_generations.pop(self.market_names[position], None)
+
+    '''
+    Returns the candles of the market after the last one of the market historic, and if they replace its candles.
+    All of them are read when the shared ones have been replaced since the last read.
+    '''
+    def read_market_candles(self, market_historic, market_name, slot: int):
+        coin = market_historic.get_coin_market_data(market_name)
+        generation = self.candle_generations.get(market_name)
+        replaced = coin is None or len(coin.timestamp) == 0 or generation != int(self.shared_data.candle_generations[slot])
+        read = self.shared_data.read_candles(slot, None if replaced else coin.timestamp[-1])
+        if read is None:
+            return None
+        generation, candles = read
+        self.candle_generations[market_name] = generation
+        return candles, replaced
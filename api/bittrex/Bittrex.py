@@ -13,31 +13,62 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
+import calendar
 import time
-from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from api.bittrex.BittrexLib import BittrexLib
 from api.bittrex.BittrexWebsocketAPI import BittrexWebsocketAPI
+from domain import CandleStore
+from domain import TimeframeAggregator
 from domain.CoinMarketData import CoinMarketData
+from domain.OrdersSnapshot import OrdersSnapshot
 from domain.TickerData import TickerData
+from utils import Config
 from utils.LoggingUtils import LoggingUtils
+from utils.RateLimiter import RateLimiter
 import requests
 
+REQUESTS_PER_SECOND = 1  # Bittrex doesn't publish its limits, but blocks clients making more than about 1 call per second
+
 
 class Bittrex(object):
     def __init__(self, api_key, secret):
         self.api_key = api_key
         self.secret = secret
-        self.api = BittrexLib(api_key, secret)  # type: BittrexLib
+        self.rate_limiter = RateLimiter(REQUESTS_PER_SECOND, 2)
+        self.api = BittrexLib(api_key, secret, self.rate_limiter)  # type: BittrexLib
         self.websocket = None
         self.api_ws_ticker_callback = None
+        self.api_ws_order_callback = None
+        self.api_ws_balance_callback = None
         self.logger = LoggingUtils()
         self.logger.logging_info("Selected Bittrex Exchange")
 
-    def subscribe_websocket(self, callback):
+    def subscribe_websocket(self, callback, reconnect_callback=None, order_callback=None, balance_callback=None):
         self.api_ws_ticker_callback = callback
-        self.websocket = BittrexWebsocketAPI(self.process_websocket_ticker, self.api)
+        self.api_ws_order_callback = order_callback
+        self.api_ws_balance_callback = balance_callback
+        account_callback = None
+        if order_callback is not None or balance_callback is not None:
+            account_callback = self.process_websocket_account
+        self.websocket = BittrexWebsocketAPI(self.process_websocket_ticker, self.api, reconnect_callback, account_callback)
+
+    '''
+    Processes the private deltas of the account: order deltas ("o", with the delta type "TY": 0 open, 1 partially
+    filled, 2 filled, 3 cancelled) and balance deltas ("d").
+    '''
+    def process_websocket_account(self, delta):
+        try:
+            if 'o' in delta and self.api_ws_order_callback is not None:
+                order = delta['o']
+                is_open = delta['TY'] in [0, 1]
+                traded = delta['TY'] == 2 or order['q'] < order['Q']
+                self.api_ws_order_callback(order['E'].replace("-", "_"), order['OU'], is_open, traded)
+            elif 'd' in delta and self.api_ws_balance_callback is not None:
+                self.api_ws_balance_callback([delta['d']['c']])
+        except Exception:
+            self.logger.logging_bittbot_error('PROCESAR LA NOTIFICACION DE LA CUENTA {}'.format(delta))
 
     def get_full_ticker(self) -> List[TickerData]:
         while True:
@@ -167,72 +198,88 @@ class Bittrex(object):
             except Exception:
                 self.logger.logging_bittbot_error('LEER LAS ORDENES ABIERTAS', 10)
 
+    '''
+    Reads the open orders and the closed orders history of all the markets in two calls.
+    Returns None if they can't be read.
+    '''
+    def get_orders_snapshot(self) -> Optional[OrdersSnapshot]:
+        try:
+            open_orders = self.api.get_all_open_orders()
+            order_history = self.api.get_order_history()
+            if not open_orders["success"] or not order_history["success"]:
+                return None
+            return OrdersSnapshot([order["OrderUuid"] for order in open_orders["result"]], [order["OrderUuid"] for order in order_history["result"]])
+        except Exception:
+            self.logger.logging_bittbot_error('LEER LAS ORDENES DE TODOS LOS MERCADOS')
+            return None
+
     def get_historic_values_fifteen_min(self, coin, max_lasts) -> CoinMarketData:
         currency = coin.replace("_", "-")
-        request_url = "https://bittrex.com/Api/v2.0/pub/market/GetTicks?marketName={}&tickInterval=fiveMin".format(currency)
-        success = False
-        while not success:
-            try:
-                response = requests.get(request_url).json()
-                success = True
-            except Exception:
-                self.logger.logging_info("El Exchange esta ocupado, reintentando en 2 segundos...")
-                time.sleep(2)
+        response = self.get_five_min_ticks(currency)
 
-        historic = CoinMarketData()
-        if response["success"]:
+        # Bittrex doesn't have 15min candles, so we roll up the 5min ones (3 of them for every 15min candle)
+        historic = CoinMarketData(max_lasts * 3)
+        if response is not None and response["success"]:
             historic.alt_name = currency
-            for historic_ticker in response["result"]:
-                timestamp = datetime.strptime(historic_ticker["T"], "%Y-%m-%dT%H:%M:%S")
-                if timestamp.minute in [15, 30, 45, 00]:
-                    historic.open.append(historic_ticker["O"])
-                    historic.high.append(historic_ticker["H"])
-                    historic.low.append(historic_ticker["L"])
-                    historic.close.append(historic_ticker["C"])
-                    historic.volume.append(historic_ticker["BV"])
-                    historic.timestamp.append(historic_ticker["T"])
-
-        historic.open = historic.open[-max_lasts:]
-        historic.high = historic.high[-max_lasts:]
-        historic.low = historic.low[-max_lasts:]
-        historic.close = historic.close[-max_lasts:]
-        historic.volume = historic.volume[-max_lasts:]
-        historic.timestamp = historic.timestamp[-max_lasts:]
+            self.append_historic_ticks(historic, response["result"][-(max_lasts * 3):])
 
-        return historic
+        return TimeframeAggregator.roll_up(historic, 15, 5, max_lasts)
 
     def get_historic_values_five_min(self, coin, max_lasts) -> CoinMarketData:
         currency = coin.replace("_", "-")
-        request_url = "https://bittrex.com/Api/v2.0/pub/market/GetTicks?marketName={}&tickInterval=fiveMin".format(currency)
-        success = False
-        while not success:
-            try:
-                response = requests.get(request_url).json()
-                success = True
-            except Exception:
-                self.logger.logging_info("El Exchange esta ocupado, reintentando en 2 segundos...")
-                time.sleep(2)
+        response = self.get_five_min_ticks(currency)
 
         historic = CoinMarketData()
-        if response["success"]:
+        if response is not None and response["success"]:
             historic.alt_name = currency
-            for historic_ticker in response["result"]:
-                historic.open.append(historic_ticker["O"])
-                historic.high.append(historic_ticker["H"])
-                historic.low.append(historic_ticker["L"])
-                historic.close.append(historic_ticker["C"])
-                historic.volume.append(historic_ticker["BV"])
-                historic.timestamp.append(historic_ticker["T"])
-
-        historic.open = historic.open[-max_lasts:]
-        historic.high = historic.high[-max_lasts:]
-        historic.low = historic.low[-max_lasts:]
-        historic.close = historic.close[-max_lasts:]
-        historic.volume = historic.volume[-max_lasts:]
-        historic.timestamp = historic.timestamp[-max_lasts:]
+            self.append_historic_ticks(historic, response["result"][-max_lasts:])
 
         return historic
 
+    '''
+    Gets the candles of candles_time_minutes (5 or 15) opened between start and end (epoch seconds). GetTicks always
+    returns the last days of 5min candles, so the ones in the period are selected from them.
+    '''
+    def get_historic_values_between(self, coin, candles_time_minutes, start, end) -> CoinMarketData:
+        currency = coin.replace("_", "-")
+        response = self.get_five_min_ticks(currency)
+
+        historic = CoinMarketData()
+        if response is not None and response["success"]:
+            historic.alt_name = currency
+            self.append_historic_ticks(historic, response["result"])
+        if candles_time_minutes != 5:
+            historic = TimeframeAggregator.roll_up(historic, candles_time_minutes, 5)
+
+        return CandleStore.select_candles(historic, start, end)
+
+    '''
+    Returns the GetTicks response with the 5min candles of the market, or None if it can't be read after
+    HISTORIC_MAX_RETRIES attempts.
+    '''
+    def get_five_min_ticks(self, currency):
+        request_url = "https://bittrex.com/Api/v2.0/pub/market/GetTicks?marketName={}&tickInterval=fiveMin".format(currency)
+        for attempt in range(Config.HISTORIC_MAX_RETRIES):
+            try:
+                self.rate_limiter.acquire()
+                return requests.get(request_url).json()
+            except Exception:
+                if attempt < Config.HISTORIC_MAX_RETRIES - 1:
+                    self.logger.logging_info("El Exchange esta ocupado, reintentando en {} segundos...".format(2 ** attempt))
+                    time.sleep(2 ** attempt)
+        self.logger.logging_error("No se han podido obtener las velas de {}".format(currency))
+        return None
+
+    def append_historic_ticks(self, historic: CoinMarketData, ticks) -> None:
+        for historic_ticker in ticks:
+            historic.open.append(historic_ticker["O"])
+            historic.high.append(historic_ticker["H"])
+            historic.low.append(historic_ticker["L"])
+            historic.close.append(historic_ticker["C"])
+            historic.volume.append(historic_ticker["BV"])
+            # Bittrex returns the candle open time in UTC, with format 2018-01-01T00:00:00
+            historic.timestamp.append(calendar.timegm(time.strptime(historic_ticker["T"], "%Y-%m-%dT%H:%M:%S")))
+
     def process_websocket_ticker(self, ticker_dict):
         ticker = []  # type: List[TickerData]
         for tickerAlt in ticker_dict['D']:
@@ -248,7 +295,7 @@ class Bittrex(object):
                 ticker_data.volume = float(tickerAlt["V"])
                 ticker_data.last = float(tickerAlt["l"])
                 ticker_data.baseVolume = float(tickerAlt["m"])
-                ticker_data.timeStamp = tickerAlt["T"]
+                ticker_data.timeStamp = self.parse_exchange_time(tickerAlt["T"])
                 ticker_data.bid = float(tickerAlt["B"])
                 ticker_data.ask = float(tickerAlt["A"])
                 ticker_data.openBuyOrders = int(tickerAlt["G"])
@@ -281,7 +328,7 @@ class Bittrex(object):
                     ticker_data.volume = float(tickerAlt["Volume"])
                     ticker_data.last = float(tickerAlt["Last"])
                     ticker_data.baseVolume = float(tickerAlt["BaseVolume"])
-                    ticker_data.timeStamp = tickerAlt["TimeStamp"]
+                    ticker_data.timeStamp = self.parse_exchange_time(tickerAlt["TimeStamp"])
                     ticker_data.bid = float(tickerAlt["Bid"])
                     ticker_data.ask = float(tickerAlt["Ask"])
                     ticker_data.openBuyOrders = int(tickerAlt["OpenBuyOrders"])
@@ -295,6 +342,19 @@ class Bittrex(object):
 
             return ticker
 
+    '''
+    Returns the epoch seconds of a Bittrex time, or None if it can't be read. The websocket sends epoch milliseconds,
+    and REST an UTC time with format 2018-01-01T00:00:00.123
+    '''
+    def parse_exchange_time(self, exchange_time):
+        try:
+            if isinstance(exchange_time, (int, float)):
+                return exchange_time / 1000.0
+            seconds, _, fraction = exchange_time.partition('.')
+            return calendar.timegm(time.strptime(seconds, "%Y-%m-%dT%H:%M:%S")) + float("0." + (fraction or "0"))
+        except Exception:
+            return None  # The local clock will be used
+
     def parse_balance(self, bittrex_balance):
         if bittrex_balance["success"]:
             return float(bittrex_balance["result"]["Balance"])
@@ -19,6 +19,7 @@
 
 import time
 import hmac
+import threading
 import hashlib
 try:
     from urllib import urlencode
@@ -43,9 +44,13 @@ class BittrexLib(object):
     """
     Used for requesting Bittrex with API key and API secret
     """
-    def __init__(self, api_key, api_secret):
+    def __init__(self, api_key, api_secret, rate_limiter=None):
         self.api_key = str(api_key) if api_key is not None else ''
         self.api_secret = str(api_secret) if api_secret is not None else ''
+        self.rate_limiter = rate_limiter
+        # The nonce of the private calls is the time of the call: the threads sharing the client (workers of the same
+        # Exchange, AsyncBotWorker executor) take it and send the request one at a time, so it arrives in order
+        self.private_lock = threading.Lock()
 
     def api_query(self, method, options=None):
         """
@@ -62,7 +67,6 @@ class BittrexLib(object):
         """
         if not options:
             options = {}
-        nonce = str(int(time.time() * 1000))
         method_set = 'public'
 
         if method in MARKET_SET:
@@ -70,9 +74,18 @@ class BittrexLib(object):
         elif method in ACCOUNT_SET:
             method_set = 'account'
 
+        if method_set == 'public':
+            return self.send_query(method_set, method, options)
+        with self.private_lock:
+            return self.send_query(method_set, method, options)
+
+    def send_query(self, method_set, method, options):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
         request_url = (BASE_URL % method_set) + method + '?'
 
         if method_set != 'public':
+            nonce = str(int(time.time() * 1000))
             request_url += 'apikey=' + self.api_key + "&nonce=" + nonce + '&'
 
         request_url += urlencode(options)
@@ -22,10 +22,13 @@ from utils.LoggingUtils import LoggingUtils
 
 class BittrexWebsocketAPI(BittrexSocket):
 
-    def __init__(self, callback, api):
+    def __init__(self, callback, api, reconnect_callback=None, account_callback=None):
         super().__init__()
         self.callback = callback
         self.api = api
+        self.reconnect_callback = reconnect_callback
+        self.account_callback = account_callback
+        self.connections = 0
         self.act_tick = None
         self.logger = LoggingUtils()
         self.connected = None
@@ -45,9 +48,17 @@ class BittrexWebsocketAPI(BittrexSocket):
     def connect_websocket(self):
         try:
             self.subscribe_to_summary_deltas()
+            if self.account_callback is not None:
+                # Order and balance deltas of the account
+                self.authenticate(self.api.api_key, self.api.api_secret)
             self.connected = True
         except Exception:
             self.connected = False
+        if self.connected:
+            self.connections += 1
+            if self.connections > 1 and self.reconnect_callback is not None:
+                # Summary deltas sent while we were disconnected are lost
+                self.reconnect_callback()
         return self.connected
 
     async def on_error(self, msg):
@@ -57,3 +68,7 @@ class BittrexWebsocketAPI(BittrexSocket):
 
     async def on_public(self, msg):
         self.callback(msg)
+
+    async def on_private(self, msg):
+        if self.account_callback is not None:
+            self.account_callback(msg)
@@ -18,16 +18,24 @@ import json
 import time
 import datetime
 
+from email.utils import parsedate_to_datetime
+
 from hashlib import sha512
-from typing import List
+from threading import Lock
+from typing import List, Optional
 from urllib.parse import urlencode
 
 import requests
 
 from api.poloniex.PoloniexWebsocketAPI import PoloniexWebsocketAPI
 from domain.CoinMarketData import CoinMarketData
+from domain.OrdersSnapshot import OrdersSnapshot
 from domain.TickerData import TickerData
+from utils import Config
 from utils.LoggingUtils import LoggingUtils
+from utils.RateLimiter import RateLimiter
+
+REQUESTS_PER_SECOND = 6  # Poloniex allows 6 calls per second to the public and trading APIs
 
 
 class Poloniex(object):
@@ -37,6 +45,19 @@ class Poloniex(object):
         self.secret = secret
         self.websocket = None
         self.api_ws_ticker_callback = None
+        self.api_ws_reconnect_callback = None
+        self.api_ws_order_callback = None
+        self.api_ws_balance_callback = None
+        self.alt_id_relation = {}
+        self.currency_id_relation = {}
+        # Markets of the orders notified as new, and orders with trades, until they are closed
+        self.account_order_markets = {}
+        self.account_traded_orders = set()
+        self.clock_offset = 0.0  # Seconds to add to the local clock to get the Poloniex clock
+        self.rate_limiter = RateLimiter(REQUESTS_PER_SECOND, REQUESTS_PER_SECOND)
+        # Poloniex rejects a nonce lower than the last one received, so the private calls of all the threads (workers
+        # sharing the Api, AsyncBotWorker executor) take the nonce and send the request one at a time
+        self.private_lock = Lock()
         self.logger = LoggingUtils()
         self.logger.logging_info("Selected Poloniex Exchange")
 
@@ -50,31 +71,39 @@ class Poloniex(object):
 
         while True:
             try:
-                args['command'] = command
-                args['nonce'] = self.get_nonce()
-                post_data = urlencode(args)
+                with self.private_lock:
+                    self.rate_limiter.acquire()
+                    args['command'] = command
+                    args['nonce'] = self.get_nonce()
+                    post_data = urlencode(args)
 
-                sign = hmac.new(self.secret.encode('utf-8'), post_data.encode('utf-8'), sha512)
+                    sign = hmac.new(self.secret.encode('utf-8'), post_data.encode('utf-8'), sha512)
 
-                ret = requests.post('https://poloniex.com/tradingApi', data=args,
-                                    headers={'Sign': sign.hexdigest(), 'Key': self.api_key})
+                    ret = requests.post('https://poloniex.com/tradingApi', data=args,
+                                        headers={'Sign': sign.hexdigest(), 'Key': self.api_key})
 
                 return json.loads(ret.text, parse_float=str)
             except Exception:
                 self.logger.logging_bittbot_error('EJECUTAR PRIVATE ORDER {}'.format(command), 10)
 
     def public_order(self, command, args=None):
-        if args is None:
-            args = {}
-
         while True:
             try:
-                args['command'] = command
-                ret = requests.get('https://poloniex.com/public?' + urlencode(args))
-                return json.loads(ret.text, parse_float=str)
+                return self.public_order_once(command, args)
             except Exception:
                 self.logger.logging_bittbot_error('EJECUTAR PUBLIC ORDER {}'.format(command), 10)
 
+    '''
+    Calls the public API once, raising the error if it fails. For the callers with their own retries.
+    '''
+    def public_order_once(self, command, args=None):
+        if args is None:
+            args = {}
+        args['command'] = command
+        self.rate_limiter.acquire()
+        ret = requests.get('https://poloniex.com/public?' + urlencode(args))
+        return json.loads(ret.text, parse_float=str)
+
     def get_full_ticker(self) -> List[TickerData]:
         while True:
             try:
@@ -107,16 +136,88 @@ class Poloniex(object):
             ticker.append(ticker_data)
         return ticker
 
-    def subscribe_websocket(self, callback):
+    def subscribe_websocket(self, callback, reconnect_callback=None, order_callback=None, balance_callback=None):
         self.api_ws_ticker_callback = callback
+        self.api_ws_reconnect_callback = reconnect_callback
+        self.api_ws_order_callback = order_callback
+        self.api_ws_balance_callback = balance_callback
+        self.measure_clock_offset()
         ticker = self.get_full_ticker()
-        alt_id_relation = self.populate_alt_to_id(ticker)
-        self.websocket = PoloniexWebsocketAPI(self.process_websocket_ticker, alt_id_relation)
+        self.alt_id_relation = self.populate_alt_to_id(ticker)
+        account_subscription = None
+        if order_callback is not None or balance_callback is not None:
+            self.currency_id_relation = self.populate_currency_to_id()
+            account_subscription = self.get_account_subscription
+        self.websocket = PoloniexWebsocketAPI(self.process_websocket_ticker, self.alt_id_relation, self.process_websocket_reconnected,
+                                              self.process_websocket_account, account_subscription)
 
     def process_websocket_ticker(self, ticker):
+        received_time = time.time() + self.clock_offset
         ticker = self.parse_ticker(ticker)
+        # Poloniex ticks don't have time, so we use the time they are received in the Poloniex clock
+        for ticker_data in ticker:
+            ticker_data.timeStamp = received_time
         self.api_ws_ticker_callback(ticker)
 
+    '''
+    Processes the updates of the account notifications channel: new orders ("n"), trades ("t"), order amount changes
+    ("o", 0 when the order is filled or cancelled) and balance changes ("b").
+    '''
+    def process_websocket_account(self, updates):
+        changed_currencies = []
+        for update in updates:
+            try:
+                if update[0] == 'n':
+                    order_id = str(update[2])
+                    self.account_order_markets[order_id] = self.alt_id_relation.get(update[1])
+                    if self.api_ws_order_callback is not None:
+                        self.api_ws_order_callback(self.account_order_markets[order_id], order_id, True, False)
+                elif update[0] == 't':
+                    self.account_traded_orders.add(str(update[6]))
+                elif update[0] == 'o':
+                    order_id = str(update[1])
+                    is_open = float(update[2]) > 0
+                    # Newer versions of the channel also send the reason of the change, "f" when it's a fill
+                    traded = order_id in self.account_traded_orders or (len(update) > 3 and update[3] == 'f')
+                    market_name = self.account_order_markets.get(order_id)
+                    if not is_open:
+                        self.account_order_markets.pop(order_id, None)
+                        self.account_traded_orders.discard(order_id)
+                    if self.api_ws_order_callback is not None:
+                        self.api_ws_order_callback(market_name, order_id, is_open, traded)
+                elif update[0] == 'b':
+                    currency = self.currency_id_relation.get(update[1])
+                    if currency is not None and currency not in changed_currencies:
+                        changed_currencies.append(currency)
+            except Exception:
+                self.logger.logging_bittbot_error('PROCESAR LA NOTIFICACION DE LA CUENTA {}'.format(update))
+        if len(changed_currencies) > 0 and self.api_ws_balance_callback is not None:
+            self.api_ws_balance_callback(changed_currencies)
+
+    def get_account_subscription(self):
+        payload = 'nonce={}'.format(self.get_nonce())
+        sign = hmac.new(self.secret.encode('utf-8'), payload.encode('utf-8'), sha512)
+        return {'command': 'subscribe', 'channel': 1000, 'key': self.api_key, 'payload': payload, 'sign': sign.hexdigest()}
+
+    def process_websocket_reconnected(self):
+        self.measure_clock_offset()
+        if self.api_ws_reconnect_callback is not None:
+            self.api_ws_reconnect_callback()
+
+    '''
+    Measures the difference between the local clock and the Poloniex one, using the Date header of a public request
+    (which has a precision of 1 second) and the middle of the request time.
+    '''
+    def measure_clock_offset(self):
+        try:
+            self.rate_limiter.acquire()
+            sent_time = time.time()
+            ret = requests.get('https://poloniex.com/public?' + urlencode({'command': 'returnOrderBook', 'currencyPair': 'USDT_BTC', 'depth': 1}))
+            received_time = time.time()
+            self.clock_offset = parsedate_to_datetime(ret.headers['Date']).timestamp() - (sent_time + received_time) / 2
+        except Exception:
+            self.logger.logging_bittbot_error('MEDIR LA DIFERENCIA CON EL RELOJ DE POLONIEX')
+
     def get_balance(self, currency_pair):
         while True:
             try:
@@ -193,46 +294,70 @@ class Poloniex(object):
             except Exception:
                 self.logger.logging_bittbot_error('LEER LAS ORDENES ABIERTAS', 10)
 
-    def get_historic_values_fifteen_min(self, currency_pair, max_lasts) -> CoinMarketData:
-        while True:
-            try:
-                historic = CoinMarketData()
-                now = int(time.time())
-                start = datetime.datetime.now() - datetime.timedelta(minutes=(15*max_lasts))
-                start = int(time.mktime(start.timetuple()))
-                response = self.public_order('returnChartData', {'currencyPair': currency_pair, 'start': start, 'end': now, 'period': 900})
-                for historic_ticker in response:
-                    historic.open.append(float(historic_ticker["open"]))
-                    historic.high.append(float(historic_ticker["high"]))
-                    historic.low.append(float(historic_ticker["low"]))
-                    historic.close.append(float(historic_ticker["close"]))
-                    historic.volume.append(float(historic_ticker["volume"]))
+    '''
+    Reads the open orders and the trades of the last ORDERS_HISTORY_SECONDS of all the markets in two calls.
+    Returns None if they can't be read.
+    '''
+    def get_orders_snapshot(self) -> Optional[OrdersSnapshot]:
+        try:
+            open_orders = self.private_order('returnOpenOrders', {'currencyPair': 'all'})
+            trades = self.private_order('returnTradeHistory', {'currencyPair': 'all', 'limit': 10000,
+                                                               'start': int(time.time() + self.clock_offset - Config.ORDERS_HISTORY_SECONDS)})
+            # With currencyPair 'all' they are dicts by market, but an empty list is returned when there are no trades
+            open_order_ids = [order['orderNumber'] for orders in open_orders.values() for order in orders]
+            traded_order_ids = [trade['orderNumber'] for market_trades in (trades.values() if isinstance(trades, dict) else []) for trade in market_trades]
+            return OrdersSnapshot(open_order_ids, traded_order_ids)
+        except Exception:
+            self.logger.logging_bittbot_error('LEER LAS ORDENES DE TODOS LOS MERCADOS')
+            return None
 
-                return historic
-            except Exception:
-                self.logger.logging_bittbot_error('OBTENER VALORES HISTORICOS', 10)
+    def get_historic_values_fifteen_min(self, currency_pair, max_lasts) -> CoinMarketData:
+        return self.get_historic_values(currency_pair, max_lasts, 15)
 
     def get_historic_values_five_min(self, currency_pair, max_lasts) -> CoinMarketData:
-        while True:
+        return self.get_historic_values(currency_pair, max_lasts, 5)
+
+    def get_historic_values(self, currency_pair, max_lasts, candles_time_minutes) -> CoinMarketData:
+        start = datetime.datetime.now() - datetime.timedelta(minutes=(candles_time_minutes*max_lasts))
+        start = int(time.mktime(start.timetuple()))
+        return self.get_historic_values_between(currency_pair, candles_time_minutes, start, int(time.time()))
+
+    '''
+    Gets the candles of candles_time_minutes opened between start and end (epoch seconds). If they can't be read after
+    HISTORIC_MAX_RETRIES attempts, the returned CoinMarketData is empty.
+    '''
+    def get_historic_values_between(self, currency_pair, candles_time_minutes, start, end) -> CoinMarketData:
+        for attempt in range(Config.HISTORIC_MAX_RETRIES):
             try:
                 historic = CoinMarketData()
-                now = int(time.time())
-                start = datetime.datetime.now() - datetime.timedelta(minutes=(5*max_lasts))
-                start = int(time.mktime(start.timetuple()))
-                response = self.public_order('returnChartData', {'currencyPair': currency_pair, 'start': start, 'end': now, 'period': 300})
+                response = self.public_order_once('returnChartData', {'currencyPair': currency_pair, 'start': int(start), 'end': int(end), 'period': candles_time_minutes * 60})
                 for historic_ticker in response:
+                    if int(historic_ticker["date"]) == 0:
+                        # Poloniex returns a row of zeros when there are no candles in the period
+                        continue
                     historic.open.append(float(historic_ticker["open"]))
                     historic.high.append(float(historic_ticker["high"]))
                     historic.low.append(float(historic_ticker["low"]))
                     historic.close.append(float(historic_ticker["close"]))
                     historic.volume.append(float(historic_ticker["volume"]))
+                    historic.timestamp.append(float(historic_ticker["date"]))
 
                 return historic
             except Exception:
-                self.logger.logging_bittbot_error('OBTENER VALORES HISTORICOS', 10)
+                # No wait after the last attempt
+                wait_seconds = 2 ** attempt if attempt < Config.HISTORIC_MAX_RETRIES - 1 else 0
+                self.logger.logging_bittbot_error('OBTENER VALORES HISTORICOS DE {}'.format(currency_pair), wait_seconds)
+        return CoinMarketData()
 
     def populate_alt_to_id(self, ticker: List[TickerData]):
         alt_to_id = {}
         for ticker_alt in ticker:
             alt_to_id[ticker_alt.id] = ticker_alt.marketName
         return alt_to_id
+
+    def populate_currency_to_id(self):
+        currency_to_id = {}
+        currencies = self.public_order('returnCurrencies')
+        for currency in currencies:
+            currency_to_id[int(currencies[currency]["id"])] = currency
+        return currency_to_id
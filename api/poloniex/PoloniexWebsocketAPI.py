@@ -23,9 +23,14 @@ class PoloniexWebsocketAPI(object):
 
     url = 'wss://api2.poloniex.com/'
 
-    def __init__(self, callback, alt_id_relation):
+    def __init__(self, callback, alt_id_relation, reconnect_callback=None, account_callback=None, account_subscription=None):
         self.callback = callback
         self.alt_id_relation = alt_id_relation
+        self.reconnect_callback = reconnect_callback
+        self.account_callback = account_callback
+        # Returns the signed subscription to the account notifications, with a new nonce for every connection
+        self.account_subscription = account_subscription
+        self.connections = 0
 
         thread = threading.Thread(target=self.run_server)
         thread.daemon = True
@@ -45,7 +50,10 @@ class PoloniexWebsocketAPI(object):
 
     def on_message(self, ws, message):
         ticker_alt = json.loads(message)
-        if len(ticker_alt) == 3:
+        if len(ticker_alt) == 3 and ticker_alt[0] == 1000:
+            if self.account_callback is not None:
+                self.account_callback(ticker_alt[2])
+        elif len(ticker_alt) == 3 and ticker_alt[0] == 1002:
             alt = ticker_alt[2]
             coin_name = self.alt_id_relation[alt[0]]
             ticker = {coin_name: {}}
@@ -69,3 +77,10 @@ class PoloniexWebsocketAPI(object):
     def on_open(self, ws):
         # Subscribe to channel 1002 (Ticker Channel)
         ws.send(json.dumps({'command': 'subscribe', 'channel': 1002}))
+        # Subscribe to channel 1000 (Account Notifications: orders, trades and balances)
+        if self.account_subscription is not None:
+            ws.send(json.dumps(self.account_subscription()))
+        self.connections += 1
+        if self.connections > 1 and self.reconnect_callback is not None:
+            # Tickers sent while we were disconnected are lost
+            self.reconnect_callback()
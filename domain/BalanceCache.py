@@ -0,0 +1,66 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+import time
+from threading import Lock
+from typing import Callable, Dict, Iterable, Optional
+
+from utils import Config
+
+
+class BalanceCache(object):
+    '''
+    Balances of all the currencies of the account, read at once with load_balances (one private call) and kept for
+    BALANCE_CACHE_SECONDS. The currencies affected by an order placed, filled or cancelled are invalidated, and the
+    next read of any of them loads all the balances again.
+    '''
+    def __init__(self, load_balances: Callable[[], Dict], ttl_seconds: float = Config.BALANCE_CACHE_SECONDS):
+        self.load_balances = load_balances
+        self.ttl_seconds = ttl_seconds
+        self.balances = None  # type: Dict[str, float]
+        self.loaded_time = 0.0
+        self.invalid_currencies = set()
+        self.lock = Lock()
+
+    '''
+    Returns the balance of the currency, or None if the balances can't be read (ex: wrong Api Keys).
+    With refresh all the balances are loaded again, even if they are not expired.
+    '''
+    def get_balance(self, currency: str, refresh: bool = False) -> Optional[float]:
+        with self.lock:
+            if refresh or self.balances is None or currency in self.invalid_currencies or time.monotonic() - self.loaded_time > self.ttl_seconds:
+                self.load()
+            if self.balances is None:
+                return None
+            # Exchanges don't always return the currencies without balance
+            return self.balances.get(currency, 0.0)
+
+    def invalidate(self, currencies: Iterable[str] = None) -> None:
+        with self.lock:
+            if currencies is None:
+                self.balances = None
+            else:
+                self.invalid_currencies.update(currencies)
+
+    def load(self) -> None:
+        balances = self.load_balances()
+        self.invalid_currencies = set()
+        if not isinstance(balances, dict) or 'error' in balances:
+            # Not cached, so the next read tries again
+            self.balances = None
+            return
+        self.balances = {currency: float(balance) for currency, balance in balances.items()}
+        self.loaded_time = time.monotonic()
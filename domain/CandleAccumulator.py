@@ -0,0 +1,45 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+class CandleAccumulator(object):
+    '''
+    Running open/high/low/close of the candle being built from the ticker "lasts". Every tick is added in O(1), so
+    there is no need to keep all the lasts received until the candle is closed.
+    '''
+    def __init__(self):
+        self.open = 0.0
+        self.high = 0.0
+        self.low = 0.0
+        self.close = 0.0
+        self.ticks = 0
+
+    def add(self, last: float) -> None:
+        if self.ticks == 0:
+            self.open = last
+            self.high = last
+            self.low = last
+        elif last > self.high:
+            self.high = last
+        elif last < self.low:
+            self.low = last
+        self.close = last
+        self.ticks += 1
+
+    def reset(self) -> None:
+        self.open = 0.0
+        self.high = 0.0
+        self.low = 0.0
+        self.close = 0.0
+        self.ticks = 0
@@ -0,0 +1,221 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+import os
+from queue import Queue
+from threading import Thread
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from domain.CoinMarketData import CoinMarketData, CANDLE_HISTORY_CAPACITY
+from utils.LoggingUtils import LoggingUtils
+
+CANDLE_ROWS = 6  # timestamp, open, high, low, close and volume
+# Candles appended after the .npy file before writing it again with all of them
+APPEND_MAX_CANDLES = 1000
+
+
+class CandleStore(object):
+    '''
+    Stores the closed candles of every market and timeframe on disk. For each of them there is a .npy file with the
+    timestamp, open, high, low, close and volume rows, and a .candles file with the candles closed after it, appended
+    as raw float64 records. When APPEND_MAX_CANDLES candles have been appended, the .npy file is written again with
+    all of them and the .candles file is emptied.
+    The .npy files are replaced atomically, so a crash while saving leaves the previous version of the file, and a
+    record cut by a crash at the end of a .candles file is ignored.
+    The files are written by a writer thread, so the callers don't wait for the disk (they hold candles_lock). The
+    writes waiting when it wakes up are done together, and a full save discards the writes of the market before it.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        self.logger = LoggingUtils()
+        os.makedirs(directory, exist_ok=True)
+        # (file name, candles, if they replace all the stored ones) to write
+        self.writes = Queue()
+        # Candles in the .candles file of every file name, counted when the file is first appended
+        self.appended_candles = {}  # type: Dict[str, int]
+        self.writer_thread = Thread(target=self.run_writer)
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    def get_file_name(self, coin_pair_name, timeframe_minutes: int):
+        return os.path.join(self.directory, "{}_{}m.npy".format(coin_pair_name, timeframe_minutes))
+
+    def get_append_file_name(self, file_name):
+        return file_name[:-len(".npy")] + ".candles"
+
+    '''
+    Replaces the stored candles with candles (rows of timestamp, open, high, low, close and volume).
+    '''
+    def save(self, coin_pair_name, timeframe_minutes: int, candles: np.ndarray) -> None:
+        self.writes.put((self.get_file_name(coin_pair_name, timeframe_minutes), candles, True))
+
+    '''
+    Adds candles (rows of timestamp, open, high, low, close and volume) after the stored ones.
+    '''
+    def append(self, coin_pair_name, timeframe_minutes: int, candles: np.ndarray) -> None:
+        self.writes.put((self.get_file_name(coin_pair_name, timeframe_minutes), candles, False))
+
+    '''
+    Waits until every candle saved or appended is written.
+    '''
+    def flush(self) -> None:
+        self.writes.join()
+
+    def run_writer(self) -> None:
+        while True:
+            writes = [self.writes.get()]
+            while not self.writes.empty():
+                writes.append(self.writes.get())
+            try:
+                for file_name, file_writes in self.group_writes(writes).items():
+                    self.write_file(file_name, file_writes)
+            finally:
+                for _ in writes:
+                    self.writes.task_done()
+
+    '''
+    Returns the writes of every file name in order, without the ones before the last full save.
+    '''
+    def group_writes(self, writes) -> Dict[str, List[Tuple[np.ndarray, bool]]]:
+        file_writes = {}  # type: Dict[str, List[Tuple[np.ndarray, bool]]]
+        for file_name, candles, replace in writes:
+            if replace:
+                file_writes[file_name] = []
+            file_writes.setdefault(file_name, []).append((candles, replace))
+        return file_writes
+
+    def write_file(self, file_name, file_writes: List[Tuple[np.ndarray, bool]]) -> None:
+        try:
+            if file_writes[0][1]:
+                self.write_candles(file_name, file_writes[0][0])
+                file_writes = file_writes[1:]
+            if len(file_writes) > 0:
+                self.append_candles(file_name, np.hstack([candles for candles, _ in file_writes]))
+        except Exception:
+            self.logger.logging_bittbot_error('GUARDAR LAS VELAS EN {}'.format(file_name))
+
+    def write_candles(self, file_name, candles: np.ndarray) -> None:
+        with open(file_name + ".tmp", 'wb') as candles_file:
+            np.save(candles_file, candles)
+        os.replace(file_name + ".tmp", file_name)
+        # After replacing the .npy file: if it crashes in between, the appended candles are already in it
+        open(self.get_append_file_name(file_name), 'wb').close()
+        self.appended_candles[file_name] = 0
+
+    def append_candles(self, file_name, candles: np.ndarray) -> None:
+        append_file_name = self.get_append_file_name(file_name)
+        if file_name not in self.appended_candles:
+            self.appended_candles[file_name] = os.path.getsize(append_file_name) // (CANDLE_ROWS * 8) if os.path.isfile(append_file_name) else 0
+        if self.appended_candles[file_name] + candles.shape[1] > APPEND_MAX_CANDLES:
+            stored = self.read_candles(file_name)
+            if stored is not None:
+                candles = np.hstack([stored, candles[:, candles[0] > stored[0, -1]]]) if stored.shape[1] > 0 else candles
+            self.write_candles(file_name, candles[:, -CANDLE_HISTORY_CAPACITY:])
+            return
+        with open(append_file_name, 'ab') as append_file:
+            append_file.write(np.ascontiguousarray(candles.T, dtype=np.float64).tobytes())
+        self.appended_candles[file_name] += candles.shape[1]
+
+    def load(self, coin_pair_name, timeframe_minutes: int) -> CoinMarketData:
+        file_name = self.get_file_name(coin_pair_name, timeframe_minutes)
+        if not os.path.isfile(file_name):
+            return None
+        try:
+            candles = self.read_candles(file_name)
+        except Exception:
+            self.logger.logging_bittbot_error('LEER LAS VELAS DE {} DE {}'.format(coin_pair_name, file_name))
+            return None
+        return from_candle_rows(coin_pair_name, candles)
+
+    '''
+    Returns the candles of the .npy file followed by the ones appended after it.
+    '''
+    def read_candles(self, file_name) -> np.ndarray:
+        candles = np.load(file_name)
+        append_file_name = self.get_append_file_name(file_name)
+        if not os.path.isfile(append_file_name):
+            return candles
+        with open(append_file_name, 'rb') as append_file:
+            data = append_file.read()
+        # A record cut by a crash is ignored
+        data = data[:len(data) - len(data) % (CANDLE_ROWS * 8)]
+        appended = np.frombuffer(data, dtype=np.float64).reshape(-1, CANDLE_ROWS).T
+        if candles.shape[1] > 0:
+            # Appended before the .npy file was written again
+            appended = appended[:, appended[0] > candles[0, -1]]
+        return np.hstack([candles, appended])
+
+
+'''
+Returns the candles as a 2D array with the timestamp, open, high, low, close and volume rows. Only the last
+num_candles ones if given.
+'''
+def to_candle_rows(coin_market_data: CoinMarketData, num_candles: int = None) -> np.ndarray:
+    first = -num_candles if num_candles is not None else 0
+    return np.vstack([coin_market_data.timestamp.view()[first:], coin_market_data.open.view()[first:],
+                      coin_market_data.high.view()[first:], coin_market_data.low.view()[first:],
+                      coin_market_data.close.view()[first:], coin_market_data.volume.view()[first:]])
+
+
+def from_candle_rows(coin_pair_name, candles: np.ndarray) -> CoinMarketData:
+    coin_market_data = CoinMarketData()
+    coin_market_data.alt_name = coin_pair_name
+    coin_market_data.timestamp.extend(candles[0])
+    coin_market_data.open.extend(candles[1])
+    coin_market_data.high.extend(candles[2])
+    coin_market_data.low.extend(candles[3])
+    coin_market_data.close.extend(candles[4])
+    coin_market_data.volume.extend(candles[5])
+    return coin_market_data
+
+
+'''
+Returns the stored candles with the fetched ones put in their place. Stored candles in the period covered by fetched
+(from the first to the last fetched timestamp) are replaced by the fetched ones, and the stored candles after it are
+kept, so fetched can be the candles after the stored ones or the candles of a hole in the middle of them.
+'''
+def merge_candles(stored: CoinMarketData, fetched: CoinMarketData) -> CoinMarketData:
+    if len(fetched.close) == 0:
+        return stored
+    keep = int(np.searchsorted(stored.timestamp.view(), fetched.timestamp[0]))
+    keep_after = int(np.searchsorted(stored.timestamp.view(), fetched.timestamp[-1], side='right'))
+    merged = CoinMarketData()
+    merged.alt_name = stored.alt_name
+    for merged_series, stored_series, fetched_series in [(merged.timestamp, stored.timestamp, fetched.timestamp),
+                                                         (merged.open, stored.open, fetched.open),
+                                                         (merged.high, stored.high, fetched.high),
+                                                         (merged.low, stored.low, fetched.low),
+                                                         (merged.close, stored.close, fetched.close),
+                                                         (merged.volume, stored.volume, fetched.volume)]:
+        merged_series.extend(np.concatenate([stored_series.view()[:keep], fetched_series.view(),
+                                             stored_series.view()[keep_after:]]))
+    return merged
+
+
+'''
+Returns the candles with timestamp between start and end (both included).
+'''
+def select_candles(candles: CoinMarketData, start, end) -> CoinMarketData:
+    first = int(np.searchsorted(candles.timestamp.view(), start))
+    last = int(np.searchsorted(candles.timestamp.view(), end, side='right'))
+    selected = CoinMarketData()
+    selected.alt_name = candles.alt_name
+    for selected_series, series in [(selected.timestamp, candles.timestamp), (selected.open, candles.open),
+                                    (selected.high, candles.high), (selected.low, candles.low),
+                                    (selected.close, candles.close), (selected.volume, candles.volume)]:
+        selected_series.extend(series.view()[first:last])
+    return selected
@@ -13,26 +13,62 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
+from typing import Dict
+
+from domain.CandleAccumulator import CandleAccumulator
+from domain.MarketTicker import MarketTicker
+from utils.RingBuffer import RingBuffer
+
+# Max number of candles kept for every market. Older candles are discarded.
+CANDLE_HISTORY_CAPACITY = 1000
+
+
 class CoinMarketData(object):
-    def __init__(self):
+    def __init__(self, capacity=CANDLE_HISTORY_CAPACITY):
         self.alt_name = ""
 
-        # Last Ticker information
-        self.high24hr = 0.0
-        self.low24hr = 0.0
-        self.last = 0.0
-        self.lowestAsk = 0.0
-        self.highestBid = 0.0
-        self.percentChange = 0.0
-        self.baseVolume = 0.0
-
-        # Candle Historic
-        self.open = []
-        self.high = []
-        self.low = []
-        self.close = []
-        self.volume = []
-        self.timestamp = []
-
-        # Current Candle "Lasts" values to calculate the candle at the end
-        self.current_candle_data = []
+        # Last Ticker information. Read it once (ticker = coin.ticker) to use several values of the same tick
+        self.ticker = MarketTicker()
+
+        # Candle Historic. Timestamps are the candle open time in epoch seconds
+        self.open = RingBuffer(capacity)
+        self.high = RingBuffer(capacity)
+        self.low = RingBuffer(capacity)
+        self.close = RingBuffer(capacity)
+        self.volume = RingBuffer(capacity)
+        self.timestamp = RingBuffer(capacity)
+
+        # Higher timeframe candles derived from these ones, indexed by the timeframe in minutes (ex: 30 -> 30min candles)
+        self.timeframes = {}  # type: Dict[int, CoinMarketData]
+        self.timeframe_aggregators = {}  # type: Dict[int, TimeframeAggregator]
+
+        # Current Candle open/high/low/close, updated with every "last" received until the candle is closed
+        self.current_candle = CandleAccumulator()
+
+    @property
+    def high24hr(self) -> float:
+        return self.ticker.high24hr
+
+    @property
+    def low24hr(self) -> float:
+        return self.ticker.low24hr
+
+    @property
+    def last(self) -> float:
+        return self.ticker.last
+
+    @property
+    def lowestAsk(self) -> float:
+        return self.ticker.lowestAsk
+
+    @property
+    def highestBid(self) -> float:
+        return self.ticker.highestBid
+
+    @property
+    def percentChange(self) -> float:
+        return self.ticker.percentChange
+
+    @property
+    def baseVolume(self) -> float:
+        return self.ticker.baseVolume
@@ -0,0 +1,72 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+from typing import Dict, Iterator, List, Optional, Union
+
+from domain.InfoAlt import InfoAlt
+
+
+class CoinRegistry(object):
+    '''
+    The alts the bot is trading (coins_trader), indexed by market name and by operation_type, so membership, removal
+    and the number of alts in each state are O(1). It can be used as the list it replaces: append, remove, len, in
+    (with an InfoAlt or a market name) and iteration, in the order the alts were added.
+    Iteration goes over a copy, so alts can be added or removed while iterating.
+    '''
+    def __init__(self):
+        self.coins = {}  # type: Dict[str, InfoAlt]
+        self.coins_by_operation_type = {}  # type: Dict[str, Dict[str, InfoAlt]]
+
+    def __len__(self) -> int:
+        return len(self.coins)
+
+    def __iter__(self) -> Iterator[InfoAlt]:
+        return iter(list(self.coins.values()))
+
+    def __contains__(self, item: Union[InfoAlt, str]) -> bool:
+        if isinstance(item, InfoAlt):
+            return self.coins.get(item.n_alt) is item
+        return item in self.coins
+
+    def append(self, coin: InfoAlt) -> None:
+        if coin.n_alt in self.coins:
+            self.remove(self.coins[coin.n_alt])
+        self.coins[coin.n_alt] = coin
+        self.coins_by_operation_type.setdefault(coin.operation_type, {})[coin.n_alt] = coin
+        coin.registry = self
+
+    def remove(self, coin: InfoAlt) -> None:
+        if coin not in self:
+            raise ValueError('{} is not in the registry'.format(coin.n_alt))
+        del self.coins[coin.n_alt]
+        del self.coins_by_operation_type[coin.operation_type][coin.n_alt]
+        coin.registry = None
+
+    def get(self, market_name: str) -> Optional[InfoAlt]:
+        return self.coins.get(market_name)
+
+    def get_coins(self, operation_type: str) -> List[InfoAlt]:
+        return list(self.coins_by_operation_type.get(operation_type, {}).values())
+
+    def count(self, operation_type: str) -> int:
+        return len(self.coins_by_operation_type.get(operation_type, {}))
+
+    def num_open_orders(self) -> int:
+        return len(self.coins) - self.count('NO_ORDER')
+
+    def update_operation_type(self, coin: InfoAlt, old_operation_type: str, new_operation_type: str) -> None:
+        self.coins_by_operation_type[old_operation_type].pop(coin.n_alt, None)
+        self.coins_by_operation_type.setdefault(new_operation_type, {})[coin.n_alt] = coin
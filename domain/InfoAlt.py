@@ -31,9 +31,12 @@ class InfoAlt(object):
         # multiply this value for the price that we sell it (last_sell_price)
         self.inv_last_venta = 0.0  # type: float
 
+        # Registry (coins_trader) that indexes this alt by operation_type, if it's in one
+        self.registry = None
+
         # State of the last operation done with this Alt. Do not translate to english as it's used on logs :(
         # Valid values: 'NO_ORDER', 'BUY', 'WAIT_BUY', 'SELL', 'WAIT_SELL'
-        self.operation_type = 'NO_ORDER'  # type: str
+        self._operation_type = 'NO_ORDER'  # type: str
 
         # Identifier of the last order put on the Exchange (order id)
         self.num_last_orden = ''  # type: str
@@ -43,3 +46,13 @@ class InfoAlt(object):
 
         # Last Candle which we used to buy this altcoin (to avoid buying more than once in the same candle on Technical Analysis Strategies)
         self.last_used_candle = 0  # type: int
+
+    @property
+    def operation_type(self) -> str:
+        return self._operation_type
+
+    @operation_type.setter
+    def operation_type(self, operation_type: str) -> None:
+        if self.registry is not None:
+            self.registry.update_operation_type(self, self._operation_type, operation_type)
+        self._operation_type = operation_type
@@ -14,129 +14,534 @@
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
 import time
-from threading import Timer
-from datetime import datetime, timedelta
-from typing import Dict, List
+from queue import Queue, Empty
+from threading import Lock, RLock, Thread
+from typing import Dict, List, Tuple
+
+import numpy as np
 
 from domain.TickerData import TickerData
+from domain.TickerSnapshot import TickerSnapshot
+from domain.CandleStore import CandleStore, from_candle_rows, merge_candles, to_candle_rows
+from domain.CandleAccumulator import CandleAccumulator
 from domain.CoinMarketData import CoinMarketData
+from domain.MarketTicker import MarketTicker
+from domain.TimeframeAggregator import TimeframeAggregator, append_candle
+from event.CandleClosed import CandleClosed
+from event.EventBus import EventBus
+from event.TickerUpdated import TickerUpdated
+from event.WebsocketReconnected import WebsocketReconnected
+from indicator.IndicatorEngine import IndicatorEngine
 from utils.LoggingUtils import LoggingUtils
-from utils import RepeatedTimer as timer
+
+# Seconds without any tick after the end of a candle before closing it with the local clock
+IDLE_CANDLE_CLOSE_DELAY = 5
 
 
 class MarketHistoric(object):
     def __init__(self):
         self.market_historic = {}  # type: Dict[str, CoinMarketData]
+        # Latest ticker of all the markets by columns, to select markets without asking the Exchange
+        self.ticker_snapshot = TickerSnapshot()
+        # TickerUpdated, CandleClosed and WebsocketReconnected events
+        self.events = EventBus()
         self.logger = LoggingUtils()
         # Candle data variables
         self.store_candle_data = False
         self.candle_time_minutes = 5
-        self.update_market_timer = None
+        self.candles_started = False
+        # Candles received already closed with add_closed_candles (worker processes reading the shared market data)
+        # instead of built from the ticks
+        self.external_candles = False
+        # Candles are closed when the Exchange time of the ticks reaches the end of the candle. If no tick arrives, the
+        # Exchange time is estimated from the last one with the monotonic clock.
+        self.exchange_time = 0.0
+        self.exchange_time_monotonic = 0.0
+        self.current_candle_start = None
+        self.sealed_candles = Queue()  # (candle timestamp, [(coin_pair_name, candle accumulator, None without ticks)])
+        self.candle_thread = None  # type: Thread
+        # Higher timeframes (in minutes) calculated from the candles of candle_time_minutes
+        self.timeframes = []  # type: List[int]
+        # Indicators calculated incrementally over the candles of every market and timeframe
+        self.indicators = IndicatorEngine()
+        # Incremented every time candles are added or replaced, to know if anything calculated with them is outdated
+        self.candles_version = 0
+        # Stores the closed candles on disk to avoid downloading all of them again when the bot is restarted
+        self.candle_store = None  # type: CandleStore
+        # Candles lost (websocket disconnections, candles without ticks) are repaired in background from the Exchange
+        self.historic_values_between = None  # Function(coin, candles_time_minutes, start, end) -> CoinMarketData
+        self.candles_to_repair = {}  # type: Dict[str, float]  # Coin -> timestamp of the first candle to repair
+        # Only the markets with historic candles set by the strategies (set_coin_market_data and
+        # set_coin_market_historic_only) are repaired and stored, the rest only have the candles built from the ticks
+        # and nobody reads them
+        self.tracked_markets = set()
+        # Coin -> last candle asked to the Exchange without getting any candle, the ones before it are not asked again
+        self.empty_repairs_until = {}  # type: Dict[str, float]
+        self.repair_thread = None  # type: Thread
+        # Threads: the websocket writes the tickers and current candles, the candle timer and the repair thread write
+        # the candles and the strategies read all of them.
+        # Tickers are replaced by new MarketTicker objects, so they are read without locks. ticks_lock is only held
+        # while adding the lasts of a ticker to the current candles and while swapping them for empty ones, so the
+        # websocket never waits for anything else. candles_lock serializes the candle writers, and the readers of
+        # the indicators (their engine is not thread safe).
+        # Markets are never removed, and to iterate them we use a copy of the dict items.
+        self.ticks_lock = Lock()
+        self.candles_lock = RLock()
 
     def get_coin_market_data(self, coin_pair_name) -> CoinMarketData:
-        if coin_pair_name in self.market_historic:
-            return self.market_historic[coin_pair_name]
+        return self.market_historic.get(coin_pair_name)
+
+    def get_ticker(self, coin_pair_name) -> MarketTicker:
+        return self.market_historic[coin_pair_name].ticker
+
+    '''
+    Returns the last closed candle of the coin in the given timeframe as (timestamp, open, high, low, close, volume).
+    '''
+    def get_last_candle(self, coin_pair_name, timeframe_minutes: int) -> Tuple:
+        with self.candles_lock:
+            candles = self.get_coin_market_data_timeframe(coin_pair_name, timeframe_minutes)
+            return (candles.timestamp[-1], candles.open[-1], candles.high[-1], candles.low[-1], candles.close[-1],
+                    candles.volume[-1])
 
     def set_coin_market_data(self, coin_pair_name, coin_market_data: CoinMarketData) -> None:
-        self.market_historic[coin_pair_name] = coin_market_data
+        with self.candles_lock:
+            coin_market_data.alt_name = coin_pair_name
+            # Before it can be read, with its higher timeframes complete
+            self.rebuild_timeframes(coin_market_data)
+            with self.ticks_lock:
+                # Keep the ticker and current candle received from the websocket
+                current = self.market_historic.get(coin_pair_name)
+                if current is not None:
+                    coin_market_data.ticker = current.ticker
+                    coin_market_data.current_candle = current.current_candle
+                self.market_historic[coin_pair_name] = coin_market_data
+            self.tracked_markets.add(coin_pair_name)
+            self.candles_version += 1
+            self.store_candles(coin_pair_name)
+
+    '''
+    Returns the candles of the coin for the given timeframe. The timeframe must be candle_time_minutes or one of the
+    timeframes added with add_timeframe.
+    '''
+    def get_coin_market_data_timeframe(self, coin_pair_name, timeframe_minutes: int) -> CoinMarketData:
+        coin = self.get_coin_market_data(coin_pair_name)
+        if coin is None or timeframe_minutes == self.candle_time_minutes:
+            return coin
+        return coin.timeframes.get(timeframe_minutes)
+
+    '''
+    Returns the outputs of the indicator for the candles of the coin in the given timeframe, as numpy arrays aligned
+    with the candles (same result than the talib function over the candles close).
+    Example: get_indicator('BTC_NEO', 15, MacdIndicator, 12, 26, 9) -> macd, macdsignal, macdhist
+    '''
+    def get_indicator(self, coin_pair_name, timeframe_minutes: int, indicator_class, *params):
+        with self.candles_lock:
+            candles = self.get_coin_market_data_timeframe(coin_pair_name, timeframe_minutes)
+            return self.indicators.get(coin_pair_name, timeframe_minutes, candles, indicator_class, *params)
+
+    '''
+    Returns the candles of the given series ('close', 'open', ...) for many coins in 2D arrays with one row per coin,
+    to calculate indicators for all of them at once. Coins are grouped by their number of candles, so every row has
+    all the candles of its coin and recursive indicators (EMA, RSI) get the same values than coin by coin.
+    Coins with less than min_candles candles are not included.
+    Returns, for each group, the names of its coins (in the same order than the rows) and an array for each series.
+    '''
+    def get_candles_matrices(self, coin_pair_names, timeframe_minutes: int, min_candles: int, series=('close',)) -> List[Tuple[List[str], List[np.ndarray]]]:
+        groups = {}  # type: Dict[int, Tuple[List[str], List[List[np.ndarray]]]]  # Number of candles -> names, rows
+        with self.candles_lock:
+            for coin_pair_name in coin_pair_names:
+                candles = self.get_coin_market_data_timeframe(coin_pair_name, timeframe_minutes)
+                if candles is None or len(candles.close) < min_candles:
+                    continue
+                names, rows = groups.setdefault(len(candles.close), ([], [[] for _ in series]))
+                names.append(coin_pair_name)
+                for series_rows, series_name in zip(rows, series):
+                    series_rows.append(getattr(candles, series_name).view())
+            return [(names, [np.vstack(series_rows) for series_rows in rows]) for names, rows in groups.values()]
 
     '''
     Sets only the historic values of open,close,high,low,volume,timestamp. Current ticker data and current candle
-    calculation data is preserved. Useful to update only the historic candle data. 
+    calculation data is preserved. Useful to update only the historic candle data. The values are written into new
+    candle buffers, with their higher timeframes, and then put in place of the ones of the coin: a reader without
+    candles_lock gets every series either before or after, never half written. Readers of several series take the
+    lock (get_last_candle, get_candles_matrices), so they don't mix them.
     '''
     def set_coin_market_historic_only(self, coin_pair_name, coin_market_data: CoinMarketData) -> None:
-        current_coin_market_data = self.market_historic[coin_pair_name]
-        for candle_data in current_coin_market_data.current_candle_data:
-            coin_market_data.current_candle_data.append(candle_data)
-        coin_market_data.high24hr = current_coin_market_data.high24hr
-        coin_market_data.low24hr = current_coin_market_data.low24hr
-        coin_market_data.last = current_coin_market_data.last
-        coin_market_data.lowestAsk = current_coin_market_data.lowestAsk
-        coin_market_data.highestBid = current_coin_market_data.highestBid
-        coin_market_data.percentChange = current_coin_market_data.percentChange
-        coin_market_data.baseVolume = current_coin_market_data.baseVolume
-        self.market_historic[coin_pair_name] = coin_market_data
+        with self.candles_lock:
+            coin = self.market_historic[coin_pair_name]
+            rebuilt = CoinMarketData(coin.close.capacity)
+            rebuilt.alt_name = coin_pair_name
+            for rebuilt_series, new_series in [(rebuilt.open, coin_market_data.open), (rebuilt.high, coin_market_data.high),
+                                               (rebuilt.low, coin_market_data.low), (rebuilt.close, coin_market_data.close),
+                                               (rebuilt.volume, coin_market_data.volume),
+                                               (rebuilt.timestamp, coin_market_data.timestamp)]:
+                rebuilt_series.extend(new_series.view())
+            self.rebuild_timeframes(rebuilt)
+            coin.timeframes, coin.timeframe_aggregators = rebuilt.timeframes, rebuilt.timeframe_aggregators
+            coin.open, coin.high, coin.low, coin.volume, coin.timestamp, coin.close = \
+                rebuilt.open, rebuilt.high, rebuilt.low, rebuilt.volume, rebuilt.timestamp, rebuilt.close
+            self.candles_version += 1
+            self.tracked_markets.add(coin_pair_name)
+            self.store_candles(coin_pair_name)
 
     '''
     Fill all the information for every alt in the ticker.
-    If self.store_candle_data is set to True, append every last from the ticker to the "current_candle_data" property, to be able to calculate candles.
+    If self.store_candle_data is set to True, add every last from the ticker to the "current_candle" accumulator, to be able to calculate candles.
     '''
     def process_ticker(self, partial_ticker: List[TickerData], show_ticker) -> None:
         if show_ticker:
             self.logger.logging_line_char('-')
             self.logger.logging_info('FECHA TICKER: {} '.format(time.strftime("%d/%m/%y %H:%M:%S")))
             self.logger.logging_line_char('-')
-        for ticker_alt in partial_ticker:
-            self.add_coin_ticker_data(ticker_alt.marketName, ticker_alt.high, ticker_alt.low, ticker_alt.percentChange,
-                                      ticker_alt.baseVolume, ticker_alt.ask, ticker_alt.bid, ticker_alt.last)
-            if self.store_candle_data:
-                self.append_current_candle_data(ticker_alt.marketName, ticker_alt.last)
+        self.ticker_snapshot.update(partial_ticker)
+        with self.ticks_lock:
+            self.advance_exchange_time(self.get_ticker_time(partial_ticker))
+            for ticker_alt in partial_ticker:
+                self.add_coin_ticker_data(ticker_alt.marketName, ticker_alt.high, ticker_alt.low, ticker_alt.percentChange,
+                                          ticker_alt.baseVolume, ticker_alt.ask, ticker_alt.bid, ticker_alt.last)
+                if self.store_candle_data:
+                    self.append_current_candle_data(ticker_alt.marketName, ticker_alt.last)
+        self.events.publish(TickerUpdated([ticker_alt.marketName for ticker_alt in partial_ticker], self.exchange_time))
 
     def add_coin_ticker_data(self, coin_name, high24hr, low24hr, percent_change, base_volume, lowest_ask, highest_bid, last) -> None:
         if coin_name not in self.market_historic:
             cmd = CoinMarketData()
             cmd.alt_name = coin_name
+            self.create_timeframes(cmd)
             self.market_historic[coin_name] = cmd
-        coin = self.market_historic[coin_name]
-        coin.high24hr = float(high24hr)
-        coin.low24hr = float(low24hr)
-        coin.percentChange = float(percent_change)
-        coin.baseVolume = float(base_volume)
-        coin.lowestAsk = float(lowest_ask)
-        coin.highestBid = float(highest_bid)
-        coin.last = float(last)
+        self.market_historic[coin_name].ticker = MarketTicker(float(high24hr), float(low24hr), float(last), float(lowest_ask),
+                                                              float(highest_bid), float(percent_change), float(base_volume))
 
     ##############################################
     #           Candle Calculations              #
     ##############################################
 
+    '''
+    Starts building candles of candle_time_minutes. The strategies sharing this market historic call it with the same
+    timeframe, only the first call starts them.
+    '''
     def start_candle_calculations(self, candle_time_minutes: int) -> None:
-        self.store_candle_data = True
-        self.candle_time_minutes = candle_time_minutes
-        self.program_next_candle_timer()
+        with self.ticks_lock:
+            if self.candles_started:
+                if candle_time_minutes != self.candle_time_minutes:
+                    raise ValueError("Las velas ya se calculan cada {} minutos, no cada {}".format(self.candle_time_minutes, candle_time_minutes))
+                return
+            self.candle_time_minutes = candle_time_minutes
+            self.candles_started = True
+            if self.external_candles:
+                return
+            self.store_candle_data = True
+        self.candle_thread = Thread(target=self.run_candle_thread)
+        self.candle_thread.daemon = True
+        self.candle_thread.start()
+
+    '''
+    Returns the Exchange time of the most recent tick of the ticker. Ticks without time use the local clock.
+    '''
+    def get_ticker_time(self, partial_ticker: List[TickerData]) -> float:
+        ticker_time = 0.0
+        for ticker_alt in partial_ticker:
+            if ticker_alt.timeStamp is not None and ticker_alt.timeStamp > ticker_time:
+                ticker_time = ticker_alt.timeStamp
+        return ticker_time if ticker_time > 0 else time.time()
 
-    def program_next_candle_timer(self) -> None:
-        # Syncrhonize the first candle calculation to the next 'self.candle_time_minutes' minutes to follow Exchanges calculations
-        sync_timer = Timer(self.get_seconds_until_next_candle(), self.synchronized_market_update)
-        sync_timer.daemon = True
-        sync_timer.start()
+    '''
+    Moves the Exchange time forward (it never goes back) and seals the current candles if it reached the end of them.
+    Must be called with ticks_lock.
+    '''
+    def advance_exchange_time(self, exchange_time: float) -> None:
+        if exchange_time <= self.exchange_time:
+            return
+        self.exchange_time = exchange_time
+        self.exchange_time_monotonic = time.monotonic()
+        if self.store_candle_data:
+            self.seal_candles(exchange_time)
 
-    def synchronized_market_update(self) -> None:
+    '''
+    If exchange_time is after the end of the current candles, swaps the current candle of every coin for an empty one
+    and queues the sealed ones to be closed by the candle thread, out of the websocket thread. Coins without ticks in
+    the candle keep their empty accumulator, and None is queued instead: the ticks of the next candle may arrive
+    before the candle thread closes this one. Must be called with ticks_lock.
+    '''
+    def seal_candles(self, exchange_time: float) -> None:
         candle_seconds = self.candle_time_minutes * 60
-        self.update_market_timer = timer.RepeatedTimer(candle_seconds, self.close_and_calculate_candle)
-        self.close_and_calculate_candle()
+        candle_start = float(int(exchange_time // candle_seconds) * candle_seconds)
+        if self.current_candle_start is None:
+            self.current_candle_start = candle_start
+            return
+        if candle_start <= self.current_candle_start:
+            return
+        sealed = []
+        for coin_pair_name, coin in list(self.market_historic.items()):
+            if coin.current_candle.ticks > 0:
+                sealed.append((coin_pair_name, coin.current_candle))
+                coin.current_candle = CandleAccumulator()
+            else:
+                sealed.append((coin_pair_name, None))
+        self.sealed_candles.put((self.current_candle_start, sealed))
+        self.current_candle_start = candle_start
 
-    def append_current_candle_data(self, coin_pair_name, last) -> None:
-        self.market_historic[coin_pair_name].current_candle_data.append(last)
+    def run_candle_thread(self) -> None:
+        while True:
+            try:
+                candle_timestamp, sealed = self.sealed_candles.get(timeout=1)
+            except Empty:
+                self.seal_idle_candles()
+                continue
+            try:
+                self.close_candles(candle_timestamp, sealed)
+            except Exception:
+                self.logger.logging_bittbot_error('CERRAR LAS VELAS DE {}'.format(time.strftime("%d/%m/%y %H:%M", time.localtime(candle_timestamp))))
 
-    def close_and_calculate_candle(self) -> None:
-        for coin_pair_name in self.market_historic:
-            coin = self.market_historic[coin_pair_name]
-            if len(coin.current_candle_data) == 0:
-                self.logger.logging_warning("Coin {} doesn't have any candle data!!!".format(coin.alt_name))
+    '''
+    When no tick arrives (idle websocket), the candles are sealed when the Exchange time estimated with the monotonic
+    clock is IDLE_CANDLE_CLOSE_DELAY seconds after their end.
+    '''
+    def seal_idle_candles(self) -> None:
+        with self.ticks_lock:
+            if self.exchange_time == 0:
                 return
-            # Write the calculated values for the new candle to the end of each array and Reset current candle data
-            if len(coin.close) == 0:
-                # We may reach this point before the coin gets historic value, so we use the first data as open. This
-                # can happen at the beggining of the program execution
-                coin.open.append(float(coin.current_candle_data[0]))
-            else:
-                coin.open.append(float(coin.close[-1]))
-            coin.high.append(float(max(coin.current_candle_data)))
-            coin.low.append(float(min(coin.current_candle_data)))
-            coin.close.append(float(coin.current_candle_data[-1]))
-            coin.volume.append(float(coin.baseVolume))
-            coin.current_candle_data = []
-
-    def get_seconds_until_next_candle(self) -> int:
-        now = datetime.now()
-        minute = now.minute + 1
-        for next_min in range(0, (60 + self.candle_time_minutes), self.candle_time_minutes):
-            if next_min >= minute:
-                if next_min == 60:
-                    next_min = 0
-                    target_time = now.replace(minute=next_min, second=0) + timedelta(hours=1)
+            estimated_time = self.exchange_time + time.monotonic() - self.exchange_time_monotonic
+            self.seal_candles(estimated_time - IDLE_CANDLE_CLOSE_DELAY)
+
+    def append_current_candle_data(self, coin_pair_name, last) -> None:
+        self.market_historic[coin_pair_name].current_candle.add(float(last))
+
+    '''
+    Adds the sealed candles, opened at candle_timestamp, to the candles of every coin.
+    '''
+    def close_candles(self, candle_timestamp: float, sealed) -> None:
+        candle_seconds = self.candle_time_minutes * 60
+        closed_candles = {}  # type: Dict[Tuple[int, float], List[str]]  # (timeframe, timestamp) -> coins
+        with self.candles_lock:
+            for coin_pair_name, current_candle in sealed:
+                coin = self.market_historic[coin_pair_name]
+                if len(coin.timestamp) > 0 and coin.timestamp[-1] >= candle_timestamp:
+                    # The historic values got from the Exchange already have this candle, but not complete because
+                    # it was still open. Get it again now that it's closed.
+                    self.mark_candles_to_repair(coin_pair_name, candle_timestamp)
+                    continue
+                if current_candle is None:
+                    # No ticks in the candle, usual in the markets without trades, so it's not logged
+                    if len(coin.close) > 0:
+                        self.mark_candles_to_repair(coin_pair_name, candle_timestamp)
+                    continue
+                if len(coin.timestamp) > 0 and candle_timestamp - coin.timestamp[-1] > candle_seconds:
+                    # Some candles were not closed, get them from the Exchange
+                    self.mark_candles_to_repair(coin_pair_name, coin.timestamp[-1] + candle_seconds)
+                # Write the accumulated values for the new candle to the end of each array and Reset current candle data
+                if len(coin.close) == 0:
+                    # We may reach this point before the coin gets historic value, so we use the first data as open. This
+                    # can happen at the beggining of the program execution
+                    coin.open.append(current_candle.open)
                 else:
-                    target_time = now.replace(minute=next_min, second=0)
-                delta = target_time - now
-                return delta.seconds
+                    coin.open.append(float(coin.close[-1]))
+                coin.high.append(current_candle.high)
+                coin.low.append(current_candle.low)
+                coin.close.append(current_candle.close)
+                coin.volume.append(float(coin.baseVolume))
+                coin.timestamp.append(candle_timestamp)
+                self.indicators.update(coin_pair_name, self.candle_time_minutes, coin.close[-1])
+                closed_candles.setdefault((self.candle_time_minutes, candle_timestamp), []).append(coin_pair_name)
+                for rolled_candle in self.roll_up_candle(coin, -1):
+                    closed_candles.setdefault(rolled_candle, []).append(coin_pair_name)
+                self.store_new_candles(coin_pair_name, 1)
+            self.candles_version += 1
+        for timeframe_minutes, timestamp in sorted(closed_candles):
+            self.events.publish(CandleClosed(closed_candles[(timeframe_minutes, timestamp)], timeframe_minutes, timestamp))
+        self.start_candles_repair(candle_timestamp)
+
+    '''
+    Adds candles of candle_time_minutes closed somewhere else to the coins: new_candles has, for each coin, its candles
+    (rows of timestamp, open, high, low, close and volume) and if they replace the ones the coin has. Candles that
+    don't replace are only added if they are after the last candle of the coin, and the ones that replace are put in
+    place of the candles the coin has for the same period, like repaired candles.
+    Returns the coins without ticker yet, their candles are not added.
+    '''
+    def add_closed_candles(self, new_candles: Dict[str, Tuple[np.ndarray, bool]]) -> List[str]:
+        closed_candles = {}  # type: Dict[Tuple[int, float], List[str]]  # (timeframe, timestamp) -> coins
+        coins_without_ticker = []
+        with self.candles_lock:
+            for coin_pair_name, (candles, replaced) in new_candles.items():
+                coin = self.market_historic.get(coin_pair_name)
+                if coin is None:
+                    coins_without_ticker.append(coin_pair_name)
+                    continue
+                if candles.shape[1] == 0:
+                    continue
+                if replaced or len(coin.timestamp) == 0:
+                    self.set_coin_market_historic_only(coin_pair_name, merge_candles(coin, from_candle_rows(coin_pair_name, candles)))
+                    closed_candles.setdefault((self.candle_time_minutes, float(candles[0, -1])), []).append(coin_pair_name)
+                    continue
+                first_new = int(np.searchsorted(candles[0], coin.timestamp[-1], side='right'))
+                for i in range(first_new, candles.shape[1]):
+                    append_candle(coin, tuple(float(value) for value in candles[:, i]))
+                    self.indicators.update(coin_pair_name, self.candle_time_minutes, coin.close[-1])
+                    closed_candles.setdefault((self.candle_time_minutes, coin.timestamp[-1]), []).append(coin_pair_name)
+                    for rolled_candle in self.roll_up_candle(coin, -1):
+                        closed_candles.setdefault(rolled_candle, []).append(coin_pair_name)
+                if first_new < candles.shape[1]:
+                    self.store_new_candles(coin_pair_name, candles.shape[1] - first_new)
+            self.candles_version += 1
+        for timeframe_minutes, timestamp in sorted(closed_candles):
+            self.events.publish(CandleClosed(closed_candles[(timeframe_minutes, timestamp)], timeframe_minutes, timestamp))
+        return coins_without_ticker
+
+    ##############################################
+    #              Candles Repair                #
+    ##############################################
+
+    def enable_candle_repair(self, historic_values_between) -> None:
+        self.historic_values_between = historic_values_between
+
+    '''
+    Marks the candles of the coin from first_timestamp to be repaired. Untracked markets and the candles the Exchange
+    already answered without any candle are not marked.
+    '''
+    def mark_candles_to_repair(self, coin_pair_name, first_timestamp) -> None:
+        with self.candles_lock:
+            if coin_pair_name not in self.tracked_markets:
+                return
+            if coin_pair_name in self.empty_repairs_until:
+                first_timestamp = max(first_timestamp, self.empty_repairs_until[coin_pair_name] + self.candle_time_minutes * 60)
+            if coin_pair_name not in self.candles_to_repair or first_timestamp < self.candles_to_repair[coin_pair_name]:
+                self.candles_to_repair[coin_pair_name] = float(first_timestamp)
+
+    '''
+    The ticks sent while the websocket was disconnected are lost, so every candle since the last ticker received
+    (including the candle being built) has to be repaired once it is closed.
+    '''
+    def websocket_reconnected(self) -> None:
+        candle_seconds = self.candle_time_minutes * 60
+        first_lost = float(int(self.exchange_time // candle_seconds) * candle_seconds)
+        with self.candles_lock:
+            for coin_pair_name, coin in list(self.market_historic.items()):
+                if len(coin.close) > 0:
+                    self.mark_candles_to_repair(coin_pair_name, first_lost)
+        self.events.publish(WebsocketReconnected(self.exchange_time))
+
+    def start_candles_repair(self, last_closed_timestamp) -> None:
+        if self.historic_values_between is None or len(self.candles_to_repair) == 0:
+            return
+        if self.repair_thread is not None and self.repair_thread.is_alive():
+            return  # Will be repaired after the next candle
+        self.repair_thread = Thread(target=self.repair_candles, args=(last_closed_timestamp,))
+        self.repair_thread.daemon = True
+        self.repair_thread.start()
+
+    '''
+    Gets from the Exchange only the candles between the first candle to repair and the last closed one, and puts them
+    in place of the ones we have. If the Exchange has no candles for them (a market without trades) they are not
+    asked again.
+    '''
+    def repair_candles(self, last_closed_timestamp) -> None:
+        with self.candles_lock:
+            candles_to_repair = self.candles_to_repair
+            self.candles_to_repair = {}
+        for coin_pair_name in candles_to_repair:
+            first_timestamp = candles_to_repair[coin_pair_name]
+            if first_timestamp > last_closed_timestamp:
+                # Not closed yet
+                self.mark_candles_to_repair(coin_pair_name, first_timestamp)
+                continue
+            fetched = self.historic_values_between(coin_pair_name, self.candle_time_minutes, first_timestamp, last_closed_timestamp)
+            with self.candles_lock:
+                coin = self.market_historic[coin_pair_name]
+                if len(fetched.close) == 0:
+                    self.empty_repairs_until[coin_pair_name] = float(last_closed_timestamp)
+                    continue
+                self.set_coin_market_historic_only(coin_pair_name, merge_candles(coin, fetched))
+            self.logger.logging_info("Reparadas {} velas de {}".format(len(fetched.close), coin_pair_name))
+
+    ##############################################
+    #        Higher Timeframe Calculations       #
+    ##############################################
+
+    '''
+    Starts calculating candles of timeframe_minutes for every coin, rolling up the candles of candle_time_minutes
+    as they are closed. timeframe_minutes must be a multiple of candle_time_minutes.
+    '''
+    def add_timeframe(self, timeframe_minutes: int) -> None:
+        if timeframe_minutes == self.candle_time_minutes or timeframe_minutes in self.timeframes:
+            return
+        if timeframe_minutes % self.candle_time_minutes != 0:
+            raise ValueError("Timeframe {} is not a multiple of {} minutes".format(timeframe_minutes, self.candle_time_minutes))
+        self.timeframes.append(timeframe_minutes)
+        with self.candles_lock:
+            for coin_pair_name, coin in list(self.market_historic.items()):
+                self.rebuild_timeframes(coin)
+
+    def rebuild_timeframes(self, coin: CoinMarketData) -> None:
+        self.indicators.reset(coin.alt_name)
+        self.create_timeframes(coin)
+        if len(self.timeframes) > 0:
+            for i in range(len(coin.close)):
+                self.roll_up_candle(coin, i)
+
+    def create_timeframes(self, coin: CoinMarketData) -> None:
+        coin.timeframes = {}
+        coin.timeframe_aggregators = {}
+        for timeframe_minutes in self.timeframes:
+            rolled = CoinMarketData()
+            rolled.alt_name = coin.alt_name
+            coin.timeframes[timeframe_minutes] = rolled
+            coin.timeframe_aggregators[timeframe_minutes] = TimeframeAggregator(timeframe_minutes, self.candle_time_minutes)
+
+    '''
+    Adds the candle at index to the higher timeframes. Returns (timeframe, timestamp) of the higher timeframe candles
+    completed with it.
+    '''
+    def roll_up_candle(self, coin: CoinMarketData, index: int) -> List[Tuple[int, float]]:
+        rolled_candles = []
+        for timeframe_minutes in coin.timeframe_aggregators:
+            aggregator = coin.timeframe_aggregators[timeframe_minutes]
+            for candle in aggregator.add_candle(coin.timestamp[index], coin.open[index], coin.high[index],
+                                                coin.low[index], coin.close[index], coin.volume[index]):
+                append_candle(coin.timeframes[timeframe_minutes], candle)
+                self.indicators.update(coin.alt_name, timeframe_minutes, candle[4])
+                rolled_candles.append((timeframe_minutes, candle[0]))
+        return rolled_candles
+
+    ##############################################
+    #             Candles stored on disk         #
+    ##############################################
+
+    def enable_candle_store(self, directory) -> None:
+        self.candle_store = CandleStore(directory)
+
+    '''
+    Stores all the candles of the coin, replacing the stored ones. Only the tracked markets are stored, the candles of
+    the rest are not read by anyone. The candles are copied and written by the writer thread of the candle store, so
+    it can be called with candles_lock.
+    '''
+    def store_candles(self, coin_pair_name) -> None:
+        if self.candle_store is not None and coin_pair_name in self.tracked_markets:
+            self.candle_store.save(coin_pair_name, self.candle_time_minutes, to_candle_rows(self.market_historic[coin_pair_name]))
+
+    '''
+    Stores the last num_candles candles of the coin after the stored ones, like store_candles.
+    '''
+    def store_new_candles(self, coin_pair_name, num_candles: int) -> None:
+        if self.candle_store is not None and coin_pair_name in self.tracked_markets:
+            self.candle_store.append(coin_pair_name, self.candle_time_minutes, to_candle_rows(self.market_historic[coin_pair_name], num_candles))
+
+    def flush_candle_store(self) -> None:
+        if self.candle_store is not None:
+            self.candle_store.flush()
+
+    '''
+    Returns the candles stored on disk for the coin in the given timeframe, or None if there are no candles stored.
+    '''
+    def load_stored_candles(self, coin_pair_name, timeframe_minutes: int) -> CoinMarketData:
+        if self.candle_store is None:
+            return None
+        return self.candle_store.load(coin_pair_name, timeframe_minutes)
+
+    '''
+    Returns the number of candles of timeframe_minutes opened after the last candle of coin_market_data, including the
+    current one that is still open.
+    '''
+    def count_missing_candles(self, coin_market_data: CoinMarketData, timeframe_minutes: int) -> int:
+        if coin_market_data is None or len(coin_market_data.timestamp) == 0:
+            return -1
+        return int((time.time() - coin_market_data.timestamp[-1]) // (timeframe_minutes * 60))
@@ -0,0 +1,30 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+from typing import NamedTuple
+
+
+class MarketTicker(NamedTuple):
+    '''
+    Last ticker values of a market. It's never modified: every ticker received replaces the whole MarketTicker, so all
+    the values read from one of them belong to the same tick.
+    '''
+    high24hr: float = 0.0
+    low24hr: float = 0.0
+    last: float = 0.0
+    lowestAsk: float = 0.0
+    highestBid: float = 0.0
+    percentChange: float = 0.0
+    baseVolume: float = 0.0
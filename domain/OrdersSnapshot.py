@@ -0,0 +1,50 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+from typing import Iterable, Optional
+
+
+class OrdersSnapshot(object):
+    '''
+    Open orders and orders with trades of the account, read from the Exchange at once for all the markets.
+    An order is completed when it has trades and it's no longer open. Once completed an order never changes, so an old
+    snapshot can say that an open order is still open, but never the opposite.
+    It can also be kept up to date with the orders pushed by the Exchange account websocket.
+    '''
+    def __init__(self, open_order_ids: Iterable, traded_order_ids: Iterable):
+        self.open_order_ids = set(str(order_id) for order_id in open_order_ids)
+        self.traded_order_ids = set(str(order_id) for order_id in traded_order_ids)
+
+    '''
+    Returns if the order is completed, or None if the order is not in the snapshot (ex: it was placed after it, or
+    its trades are older than the history read) and it has to be asked to the Exchange.
+    '''
+    def is_order_completed(self, order_id) -> Optional[bool]:
+        order_id = str(order_id)
+        if order_id in self.open_order_ids:
+            return False
+        if order_id in self.traded_order_ids:
+            return True
+        return None
+
+    def add_open_order(self, order_id) -> None:
+        self.open_order_ids.add(str(order_id))
+
+    def close_order(self, order_id, traded: bool) -> None:
+        order_id = str(order_id)
+        self.open_order_ids.discard(order_id)
+        if traded:
+            self.traded_order_ids.add(order_id)
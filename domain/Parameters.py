@@ -15,7 +15,7 @@
 
 from typing import List
 
-from domain.InfoAlt import InfoAlt
+from domain.CoinRegistry import CoinRegistry
 
 
 class Parameters(object):
@@ -26,8 +26,8 @@ class Parameters(object):
         # Api key in use
         self.api_key = ""  # type: str
 
-        # Array of InfoAlt with the coins that will be used to trade
-        self.coins_trader = None  # type: List[InfoAlt]
+        # InfoAlt of the coins that will be used to trade
+        self.coins_trader = None  # type: CoinRegistry
 
         # Strategy to use (examples: "A", "B", "1", "2",... )
         self.funcionamiento = ""  # type: str
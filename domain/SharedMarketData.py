@@ -0,0 +1,228 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+import time
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from domain.MarketTicker import MarketTicker
+
+MARKET_NAME_DTYPE = 'S32'
+HEADER_SIZE = 8
+HEADER_MAX_MARKETS = 0
+HEADER_CANDLE_CAPACITY = 1
+HEADER_NUM_MARKETS = 2
+HEADER_TICKERS_VERSION = 3
+HEADER_CANDLES_VERSION = 4
+# Columns of the tickers, the last one is the Exchange time of the tick
+SHARED_TICKER_COLUMNS = ['high24hr', 'low24hr', 'last', 'lowestAsk', 'highestBid', 'percentChange', 'baseVolume', 'time']
+# Rows of the candles: timestamp, open, high, low, close and volume
+CANDLE_ROWS = 6
+READ_RETRIES = 100
+
+
+class SharedMarketData(object):
+    '''
+    Latest ticker and closed candles of every market in a block of shared memory, written by one process (the one with
+    the websocket, see SharedMarketPublisher) and read by many (see SharedMarketFeed) without messages between them.
+    Every market has a fixed slot, given in order of arrival, with:
+      - Its ticker: one row of SHARED_TICKER_COLUMNS.
+      - Its candles: a ring buffer like utils.RingBuffer (twice the capacity, compacted when it reaches the end), so
+        the candles are always contiguous and can be read as numpy views over the shared memory.
+    Tickers and candles of a slot have their own sequence counter (seqlock): odd while being written, so readers
+    retry if it changed while they were reading, and the writer never waits for the readers.
+    The candle generation of a slot is increased when its candles are replaced instead of appended (repaired
+    candles), so readers know they have to read all of them again.
+    '''
+    def __init__(self, shared_memory: SharedMemory):
+        self.shared_memory = shared_memory
+        self.header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shared_memory.buf)
+        max_markets = int(self.header[HEADER_MAX_MARKETS])
+        candle_capacity = int(self.header[HEADER_CANDLE_CAPACITY])
+        offset = self.header.nbytes
+        arrays = {}
+        for name, shape, dtype in get_layout(max_markets, candle_capacity):
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf, offset=offset)
+            offset += arrays[name].nbytes
+        self.market_names = arrays['market_names']
+        self.ticker_sequences = arrays['ticker_sequences']
+        self.tickers = arrays['tickers']
+        self.candle_sequences = arrays['candle_sequences']
+        self.candle_generations = arrays['candle_generations']
+        self.candle_bounds = arrays['candle_bounds']  # start and end of the candles of each slot in its ring buffer
+        self.candles = arrays['candles']
+        self.candle_capacity = candle_capacity
+        # Writer only: slot of each market
+        self.market_slots = {}  # type: Dict[str, int]
+        self.markets_lock = Lock()
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def __len__(self) -> int:
+        return int(self.header[HEADER_NUM_MARKETS])
+
+    def get_market_names(self, first_slot=0) -> List[str]:
+        return [market_name.decode() for market_name in self.market_names[first_slot:len(self)]]
+
+    def get_tickers_version(self) -> int:
+        return int(self.header[HEADER_TICKERS_VERSION])
+
+    def get_candles_version(self) -> int:
+        return int(self.header[HEADER_CANDLES_VERSION])
+
+    def close(self) -> None:
+        # The views must be released before the shared memory
+        self.header = self.market_names = self.ticker_sequences = self.tickers = None
+        self.candle_sequences = self.candle_generations = self.candle_bounds = self.candles = None
+        self.shared_memory.close()
+
+    def unlink(self) -> None:
+        self.shared_memory.unlink()
+
+    ##############################################
+    #                  Writer                    #
+    ##############################################
+
+    def get_market_slot(self, market_name) -> Optional[int]:
+        slot = self.market_slots.get(market_name)
+        if slot is None:
+            with self.markets_lock:
+                num_markets = len(self)
+                if num_markets == len(self.market_names):
+                    return None
+                slot = num_markets
+                self.market_names[slot] = market_name.encode()
+                self.market_slots[market_name] = slot
+                # Readers only see the market once its name is written
+                self.header[HEADER_NUM_MARKETS] = num_markets + 1
+        return slot
+
+    def write_ticker(self, market_name, ticker: MarketTicker, exchange_time: float) -> None:
+        slot = self.get_market_slot(market_name)
+        if slot is None:
+            return
+        self.ticker_sequences[slot] += 1
+        self.tickers[slot] = (ticker.high24hr, ticker.low24hr, ticker.last, ticker.lowestAsk, ticker.highestBid,
+                              ticker.percentChange, ticker.baseVolume, exchange_time)
+        self.ticker_sequences[slot] += 1
+        self.header[HEADER_TICKERS_VERSION] += 1
+
+    '''
+    Writes the candles (rows of timestamp, open, high, low, close and volume) of the market. Only the candles after
+    the ones already written are appended, unless the ones written have changed: then all of them are replaced.
+    '''
+    def write_candles(self, market_name, candles: np.ndarray) -> None:
+        slot = self.get_market_slot(market_name)
+        if slot is None or self.candle_capacity == 0:
+            return
+        candles = candles[:, -self.candle_capacity:]
+        start, end = self.candle_bounds[slot]
+        written = self.candles[slot, :, start:end]
+        first_new = int(np.searchsorted(candles[0], written[0, -1], side='right')) if end > start else 0
+        overlap = min(first_new, end - start)
+        appended = np.array_equal(candles[:, first_new - overlap:first_new], written[:, end - start - overlap:])
+        if appended and first_new == candles.shape[1]:
+            return
+        self.candle_sequences[slot] += 1
+        if not appended:
+            self.candle_generations[slot] += 1
+            start, end = 0, 0
+            first_new = 0
+        new_candles = candles[:, first_new:]
+        if end + new_candles.shape[1] > self.candles.shape[2]:
+            # Compact: keep the last candles at the beginning of the ring buffer
+            kept = self.candle_capacity - new_candles.shape[1]
+            self.candles[slot, :, :kept] = self.candles[slot, :, end - kept:end]
+            start, end = 0, kept
+        self.candles[slot, :, end:end + new_candles.shape[1]] = new_candles
+        self.candle_bounds[slot] = (max(start, end + new_candles.shape[1] - self.candle_capacity), end + new_candles.shape[1])
+        self.candle_sequences[slot] += 1
+        self.header[HEADER_CANDLES_VERSION] += 1
+
+    ##############################################
+    #                  Readers                   #
+    ##############################################
+
+    '''
+    Returns which of the slots could be read (a mask), and the tickers of those as rows of SHARED_TICKER_COLUMNS with
+    their sequences. Rows being written are read again, and the ones still being written after every try are left out.
+    '''
+    def read_tickers(self, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        sequences = self.ticker_sequences[slots].copy()
+        tickers = self.tickers[slots].copy()
+        for _ in range(READ_RETRIES):
+            torn = (sequences % 2 == 1) | (sequences != self.ticker_sequences[slots])
+            if not torn.any():
+                break
+            time.sleep(0)
+            sequences[torn] = self.ticker_sequences[slots[torn]]
+            tickers[torn] = self.tickers[slots[torn]]
+        read = ~torn
+        return read, tickers[read], sequences[read]
+
+    '''
+    Returns the generation of the candles of the slot, and a copy of its candles after after_timestamp (all of them
+    if None). Returns None if they were being written on every try.
+    '''
+    def read_candles(self, slot: int, after_timestamp: float = None) -> Optional[Tuple[int, np.ndarray]]:
+        for _ in range(READ_RETRIES):
+            sequence = self.candle_sequences[slot]
+            if sequence % 2 == 0:
+                generation = int(self.candle_generations[slot])
+                start, end = self.candle_bounds[slot]
+                if after_timestamp is not None:
+                    # Only the new candles are copied, the search is done over the shared memory
+                    start += int(np.searchsorted(self.candles[slot, 0, start:end], after_timestamp, side='right'))
+                candles = self.candles[slot, :, start:end].copy()
+                if sequence == self.candle_sequences[slot]:
+                    return generation, candles
+            time.sleep(0)
+        return None
+
+
+def get_layout(max_markets: int, candle_capacity: int):
+    return [('market_names', (max_markets,), MARKET_NAME_DTYPE),
+            ('ticker_sequences', (max_markets,), np.int64),
+            ('tickers', (max_markets, len(SHARED_TICKER_COLUMNS)), np.float64),
+            ('candle_sequences', (max_markets,), np.int64),
+            ('candle_generations', (max_markets,), np.int64),
+            ('candle_bounds', (max_markets, 2), np.int64),
+            ('candles', (max_markets, CANDLE_ROWS, candle_capacity * 2), np.float64)]
+
+
+'''
+Creates the shared memory for max_markets markets with up to candle_capacity candles each (0 to share only the tickers).
+'''
+def create_shared_market_data(name, max_markets: int, candle_capacity: int) -> SharedMarketData:
+    size = HEADER_SIZE * 8
+    for _, shape, dtype in get_layout(max_markets, candle_capacity):
+        size += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    shared_memory = SharedMemory(name=name, create=True, size=size)
+    header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shared_memory.buf)
+    header[:] = 0
+    header[HEADER_MAX_MARKETS] = max_markets
+    header[HEADER_CANDLE_CAPACITY] = candle_capacity
+    del header
+    return SharedMarketData(shared_memory)
+
+
+def attach_shared_market_data(name) -> SharedMarketData:
+    return SharedMarketData(SharedMemory(name=name))
@@ -0,0 +1,49 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+from domain.CandleStore import to_candle_rows
+from domain.MarketHistoric import MarketHistoric
+from domain.SharedMarketData import SharedMarketData
+from event.CandleClosed import CandleClosed
+from event.TickerUpdated import TickerUpdated
+
+
+class SharedMarketPublisher(object):
+    '''
+    Copies the tickers and the closed candles of market_historic to the shared market data as they arrive, for the
+    worker processes. Only the candles of candle_time_minutes are shared, the workers roll up the higher timeframes.
+    '''
+    def __init__(self, market_historic: MarketHistoric, shared_data: SharedMarketData):
+        self.market_historic = market_historic
+        self.shared_data = shared_data
+        self.market_historic.events.subscribe(TickerUpdated, self.on_ticker_updated)
+        self.market_historic.events.subscribe(CandleClosed, self.on_candle_closed)
+
+    def close(self) -> None:
+        self.market_historic.events.unsubscribe(TickerUpdated, self.on_ticker_updated)
+        self.market_historic.events.unsubscribe(CandleClosed, self.on_candle_closed)
+
+    def on_ticker_updated(self, event: TickerUpdated) -> None:
+        for market_name in event.market_names:
+            self.shared_data.write_ticker(market_name, self.market_historic.get_ticker(market_name), event.exchange_time)
+
+    def on_candle_closed(self, event: CandleClosed) -> None:
+        if event.timeframe_minutes != self.market_historic.candle_time_minutes:
+            return
+        with self.market_historic.candles_lock:
+            for market_name in event.market_names:
+                coin = self.market_historic.get_coin_market_data(market_name)
+                self.shared_data.write_candles(market_name, to_candle_rows(coin))
@@ -0,0 +1,138 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import time
+from queue import Queue, Full
+from threading import Thread
+from typing import Dict, List
+
+import numpy as np
+
+from domain.TickerData import TickerData
+from utils.LoggingUtils import LoggingUtils
+
+# One fixed width record (68 bytes, little endian, no padding) for every ticker update received from the websocket
+TICK_RECORD = np.dtype([('timestamp', '<f8'), ('market_id', '<u4'), ('last', '<f8'), ('ask', '<f8'), ('bid', '<f8'),
+                        ('high', '<f8'), ('low', '<f8'), ('percent_change', '<f8'), ('base_volume', '<f8')])
+TICK_JOURNAL_QUEUE_SIZE = 10000  # Ticker batches waiting to be written, batches received when it's full are lost
+MARKETS_FILE = "markets.json"
+
+
+class TickJournal(object):
+    '''
+    Append-only binary journal with every ticker update received from the websocket, to replay or analyze later the
+    exact ticks the bot used. Records are written to one file per day (UTC), ticks_YYYYMMDD.bin, and the names of the
+    markets are stored once in markets.json, mapped to the integer market_id used in the records.
+    append() only queues the ticker batch, the records are built and written by a background thread.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        self.logger = LoggingUtils()
+        os.makedirs(directory, exist_ok=True)
+        self.market_ids = self.load_market_ids()  # type: Dict[str, int]
+        self.queue = Queue(TICK_JOURNAL_QUEUE_SIZE)
+        self.lost_batches = 0
+        self.journal_file = None
+        self.journal_day = None
+        self.writer_thread = Thread(target=self.run_writer)
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    def append(self, ticker: List[TickerData]) -> None:
+        try:
+            self.queue.put_nowait((time.time(), ticker))
+        except Full:
+            self.lost_batches += 1
+
+    '''
+    Writes the records still in the queue and closes the journal.
+    '''
+    def close(self) -> None:
+        self.queue.put((None, None))
+        self.writer_thread.join()
+
+    def run_writer(self) -> None:
+        while True:
+            received_time, ticker = self.queue.get()
+            if ticker is None:
+                break
+            try:
+                self.write_records(received_time, ticker)
+                if self.queue.empty():
+                    self.journal_file.flush()
+            except Exception:
+                self.logger.logging_bittbot_error('ESCRIBIR EL DIARIO DE TICKS EN {}'.format(self.directory))
+        if self.journal_file is not None:
+            self.journal_file.close()
+        if self.lost_batches > 0:
+            self.logger.logging_warning("Se han perdido {} actualizaciones del ticker en el diario de ticks".format(self.lost_batches))
+
+    def write_records(self, received_time, ticker: List[TickerData]) -> None:
+        day = time.strftime("%Y%m%d", time.gmtime(received_time))
+        if day != self.journal_day:
+            if self.journal_file is not None:
+                self.journal_file.close()
+            self.journal_file = open(os.path.join(self.directory, "ticks_{}.bin".format(day)), 'ab')
+            self.journal_day = day
+        records = np.empty(len(ticker), dtype=TICK_RECORD)
+        records['timestamp'] = received_time
+        records['market_id'] = [self.get_market_id(ticker_alt.marketName) for ticker_alt in ticker]
+        records['last'] = [ticker_alt.last for ticker_alt in ticker]
+        records['ask'] = [ticker_alt.ask for ticker_alt in ticker]
+        records['bid'] = [ticker_alt.bid for ticker_alt in ticker]
+        records['high'] = [ticker_alt.high for ticker_alt in ticker]
+        records['low'] = [ticker_alt.low for ticker_alt in ticker]
+        records['percent_change'] = [ticker_alt.percentChange for ticker_alt in ticker]
+        records['base_volume'] = [ticker_alt.baseVolume for ticker_alt in ticker]
+        self.journal_file.write(records.tobytes())
+
+    def get_market_id(self, market_name) -> int:
+        if market_name not in self.market_ids:
+            self.market_ids[market_name] = len(self.market_ids)
+            self.save_market_ids()
+        return self.market_ids[market_name]
+
+    def load_market_ids(self) -> Dict[str, int]:
+        file_name = os.path.join(self.directory, MARKETS_FILE)
+        if not os.path.isfile(file_name):
+            return {}
+        with open(file_name, 'r') as markets_file:
+            return json.load(markets_file)
+
+    def save_market_ids(self) -> None:
+        file_name = os.path.join(self.directory, MARKETS_FILE)
+        with open(file_name + ".tmp", 'w') as markets_file:
+            json.dump(self.market_ids, markets_file, indent=4)
+        os.replace(file_name + ".tmp", file_name)
+
+
+'''
+Reads a journal file as a numpy structured array of TICK_RECORD. A record cut by a crash at the end of the file is
+ignored.
+'''
+def read_ticks(file_name) -> np.ndarray:
+    with open(file_name, 'rb') as journal_file:
+        data = journal_file.read()
+    return np.frombuffer(data[:len(data) - len(data) % TICK_RECORD.itemsize], dtype=TICK_RECORD)
+
+
+'''
+Reads markets.json of a journal directory, returning market_id -> market name.
+'''
+def read_market_names(directory) -> Dict[int, str]:
+    with open(os.path.join(directory, MARKETS_FILE), 'r') as markets_file:
+        return {market_id: market_name for market_name, market_id in json.load(markets_file).items()}
@@ -0,0 +1,122 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+from threading import RLock
+from typing import Dict, List
+
+import numpy as np
+
+from domain.TickerData import TickerData
+
+TICKER_SNAPSHOT_CAPACITY = 512  # Initial number of markets, doubled when there are more
+TICKER_COLUMNS = ['last', 'bid', 'ask', 'high', 'low', 'percent_change', 'base_volume']
+
+
+class TickerSnapshot(object):
+    '''
+    Latest ticker of every market stored by columns: one numpy array for each value (last, bid, ask, ...), where each
+    market has always the same position (its market id). The main and alt coins of every market are split only once,
+    when the market is first seen, so markets can be screened with a few vectorized conditions over all of them.
+    The websocket thread updates it while the strategies screen it, so both take the lock: a market is never screened
+    with values of different tickers.
+    '''
+    def __init__(self, capacity=TICKER_SNAPSHOT_CAPACITY):
+        self.market_ids = {}  # type: Dict[str, int]
+        self.market_names = []  # type: List[str]
+        self.main_coins = np.empty(capacity, dtype=object)
+        self.alt_coins = np.empty(capacity, dtype=object)
+        self.last = np.zeros(capacity)
+        self.bid = np.zeros(capacity)
+        self.ask = np.zeros(capacity)
+        self.high = np.zeros(capacity)
+        self.low = np.zeros(capacity)
+        self.percent_change = np.zeros(capacity)
+        self.base_volume = np.zeros(capacity)
+        self.lock = RLock()
+
+    def __len__(self) -> int:
+        return len(self.market_names)
+
+    def __contains__(self, market_name) -> bool:
+        return market_name in self.market_ids
+
+    def update(self, ticker: List[TickerData]) -> None:
+        if len(ticker) == 0:
+            return
+        # The new values are built before taking the lock, so the screening waits only for the copy
+        columns = [(ticker_alt.last, ticker_alt.bid, ticker_alt.ask, ticker_alt.high, ticker_alt.low,
+                    ticker_alt.percentChange, ticker_alt.baseVolume) for ticker_alt in ticker]
+        values = np.array(columns, dtype=np.float64).T
+        with self.lock:
+            ids = [self.get_market_id(ticker_alt.marketName) for ticker_alt in ticker]
+            for column, column_values in zip(TICKER_COLUMNS, values):
+                getattr(self, column)[ids] = column_values
+
+    def get_market_id(self, market_name) -> int:
+        market_id = self.market_ids.get(market_name)
+        if market_id is None:
+            market_id = len(self.market_names)
+            if market_id == len(self.last):
+                self.grow()
+            pair = market_name.split('_')  # pair[0] -> Main coin, pair[1] -> Alt coin
+            self.main_coins[market_id] = pair[0]
+            self.alt_coins[market_id] = pair[1] if len(pair) > 1 else ""
+            self.market_names.append(market_name)
+            self.market_ids[market_name] = market_id
+        return market_id
+
+    def grow(self) -> None:
+        for column in ['main_coins', 'alt_coins'] + TICKER_COLUMNS:
+            current = getattr(self, column)
+            grown = np.zeros(len(current) * 2, dtype=current.dtype)
+            grown[:len(current)] = current
+            setattr(self, column, grown)
+
+    '''
+    Returns the ids of the markets of main_coin (ex: BTC) that fulfill all the conditions given:
+    - alt_coins / excluded_alt_coins: alt coins (ex: ETH) allowed / not allowed
+    - min_percent_change / max_percent_change: limits of the 24h change (0.05 = 5%)
+    - min_base_volume: minimum 24h volume in main_coin
+    - max_ask_range_position: the ask must be under low + (high - low) * max_ask_range_position
+    If sort_by is one of the columns (ex: 'base_volume'), the ids are sorted by it in descending order.
+    '''
+    def select_market_ids(self, main_coin, alt_coins=None, excluded_alt_coins=None, min_percent_change=None,
+                          max_percent_change=None, min_base_volume=None, max_ask_range_position=None, sort_by=None) -> np.ndarray:
+        with self.lock:
+            num_markets = len(self.market_names)
+            mask = self.main_coins[:num_markets] == main_coin
+            if alt_coins is not None:
+                mask &= np.isin(self.alt_coins[:num_markets], list(alt_coins))
+            if excluded_alt_coins is not None and len(excluded_alt_coins) > 0:
+                mask &= ~np.isin(self.alt_coins[:num_markets], list(excluded_alt_coins))
+            if min_percent_change is not None:
+                mask &= self.percent_change[:num_markets] >= min_percent_change
+            if max_percent_change is not None:
+                mask &= self.percent_change[:num_markets] <= max_percent_change
+            if min_base_volume is not None:
+                mask &= self.base_volume[:num_markets] >= min_base_volume
+            if max_ask_range_position is not None:
+                low = self.low[:num_markets]
+                mask &= self.ask[:num_markets] <= low + (self.high[:num_markets] - low) * max_ask_range_position
+            market_ids = np.flatnonzero(mask)
+            if sort_by is not None:
+                market_ids = market_ids[np.argsort(-getattr(self, sort_by)[market_ids], kind='stable')]
+            return market_ids
+
+    '''
+    Same than select_market_ids, returning the names of the markets (ex: BTC_ETH).
+    '''
+    def select_markets(self, main_coin, **conditions) -> List[str]:
+        return [self.market_names[market_id] for market_id in self.select_market_ids(main_coin, **conditions)]
@@ -0,0 +1,101 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+from typing import List, Tuple
+
+from domain.CoinMarketData import CoinMarketData, CANDLE_HISTORY_CAPACITY
+
+
+class TimeframeAggregator(object):
+    '''
+    Rolls up base candles (ex: 5min) into a higher timeframe (ex: 30min) as the base candles are closed.
+    Higher timeframe candles are aligned to the clock (a 30min candle starts at :00 or :30) like the Exchange ones,
+    and they are sealed as soon as the last base candle of the period is added. If the first base candle added doesn't
+    open the period (the history starts in the middle of it), that period is skipped: it would not be complete.
+    '''
+    def __init__(self, timeframe_minutes: int, base_minutes: int):
+        self.timeframe_seconds = timeframe_minutes * 60
+        self.base_seconds = base_minutes * 60
+        self.bucket_start = None
+        # Period of the first base candle added, and if its candles are skipped
+        self.first_bucket_start = None
+        self.skip_first_bucket = False
+        self.open = 0.0
+        self.high = 0.0
+        self.low = 0.0
+        self.close = 0.0
+        self.volume = 0.0
+
+    '''
+    Adds a closed base candle. Returns the list of higher timeframe candles sealed by it as tuples
+    (timestamp, open, high, low, close, volume), usually empty or with one candle.
+    '''
+    def add_candle(self, timestamp, open_value, high, low, close, volume) -> List[Tuple]:
+        sealed = []
+        bucket_start = int(timestamp // self.timeframe_seconds) * self.timeframe_seconds
+        if self.first_bucket_start is None:
+            self.first_bucket_start = bucket_start
+            self.skip_first_bucket = timestamp != bucket_start
+        if self.skip_first_bucket and bucket_start == self.first_bucket_start:
+            return sealed
+        if self.bucket_start is not None and bucket_start != self.bucket_start:
+            # Some base candles are missing, close the incomplete one we have
+            sealed.append(self.seal())
+        if self.bucket_start is None:
+            self.bucket_start = bucket_start
+            self.open = open_value
+            self.high = high
+            self.low = low
+            self.volume = 0.0
+        else:
+            self.high = max(self.high, high)
+            self.low = min(self.low, low)
+        self.close = close
+        self.volume += volume
+        if timestamp + self.base_seconds >= self.bucket_start + self.timeframe_seconds:
+            sealed.append(self.seal())
+        return sealed
+
+    def seal(self) -> Tuple:
+        candle = (float(self.bucket_start), self.open, self.high, self.low, self.close, self.volume)
+        self.bucket_start = None
+        return candle
+
+
+def append_candle(coin_market_data: CoinMarketData, candle: Tuple) -> None:
+    timestamp, open_value, high, low, close, volume = candle
+    coin_market_data.timestamp.append(timestamp)
+    coin_market_data.open.append(open_value)
+    coin_market_data.high.append(high)
+    coin_market_data.low.append(low)
+    coin_market_data.close.append(close)
+    coin_market_data.volume.append(volume)
+
+
+'''
+Returns a new CoinMarketData with the last max_candles candles of coin_market_data rolled up to timeframe_minutes.
+The first and last candles are not returned if their periods are not complete.
+'''
+def roll_up(coin_market_data: CoinMarketData, timeframe_minutes: int, base_minutes: int, max_candles=CANDLE_HISTORY_CAPACITY) -> CoinMarketData:
+    candles = []
+    aggregator = TimeframeAggregator(timeframe_minutes, base_minutes)
+    for i in range(len(coin_market_data.close)):
+        candles.extend(aggregator.add_candle(coin_market_data.timestamp[i], coin_market_data.open[i], coin_market_data.high[i],
+                                             coin_market_data.low[i], coin_market_data.close[i], coin_market_data.volume[i]))
+    rolled = CoinMarketData()
+    rolled.alt_name = coin_market_data.alt_name
+    for candle in candles[-max_candles:]:
+        append_candle(rolled, candle)
+    return rolled
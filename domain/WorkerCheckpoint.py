@@ -0,0 +1,195 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import time
+from threading import Lock
+from typing import Dict, Iterable
+
+from domain.InfoAlt import InfoAlt
+from utils import Config
+from utils.LoggingUtils import LoggingUtils
+
+
+class WorkerCheckpoint(object):
+    '''
+    Crash-safe state of a worker: its coins (InfoAlt) and its counters (cycles, profit, ...), to go on where it was
+    after a restart. Every change is appended to a journal (a JSON line, on disk before returning), and from time to
+    time the whole state is written to a snapshot, replaced atomically, and the journal is started again.
+    The state is the snapshot plus the changes of the journal after it. A line cut by a crash can only be the last
+    one, and it is ignored.
+    Only changes are written: coins and counters equal to the ones already saved are skipped.
+    '''
+    def __init__(self, directory, name):
+        self.snapshot_file_name = os.path.join(directory, name + ".snapshot.json")
+        self.journal_file_name = os.path.join(directory, name + ".journal")
+        self.logger = LoggingUtils()
+        os.makedirs(directory, exist_ok=True)
+        # Last state saved of every coin, by name, and of the counters
+        self.coins = {}  # type: Dict[str, Dict]
+        self.counters = {}  # type: Dict
+        # Number of the last change saved, snapshots have the number of the last change they include
+        self.sequence = 0
+        self.journal_file = None
+        self.journal_records = 0
+        self.last_snapshot_time = time.monotonic()
+        self.lock = Lock()
+
+    '''
+    Reads the state saved, and starts a new snapshot with it. Returns False if there was no state saved.
+    '''
+    def load(self) -> bool:
+        with self.lock:
+            found = False
+            if os.path.isfile(self.snapshot_file_name):
+                with open(self.snapshot_file_name, 'r') as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+                self.sequence = snapshot["sequence"]
+                self.coins = {coin["n_alt"]: coin for coin in snapshot["coins"]}
+                self.counters = snapshot["counters"]
+                found = True
+            if os.path.isfile(self.journal_file_name):
+                with open(self.journal_file_name, 'r') as journal_file:
+                    for line in journal_file:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            self.logger.logging_warning("Ignorado el último cambio del checkpoint {}, no se terminó de escribir".format(self.journal_file_name))
+                            break
+                        if record["sequence"] > self.sequence:
+                            self.apply(record)
+                            found = True
+            self.write_snapshot()
+            return found
+
+    def apply(self, record) -> None:
+        self.sequence = record["sequence"]
+        if "coin" in record:
+            self.coins[record["coin"]["n_alt"]] = record["coin"]
+        elif "removed" in record:
+            self.coins.pop(record["removed"], None)
+        if "counters" in record:
+            self.counters = record["counters"]
+
+    def save_coin(self, coin: InfoAlt) -> None:
+        state = to_state(coin)
+        with self.lock:
+            if self.coins.get(coin.n_alt) != state:
+                self.append({"coin": state})
+
+    '''
+    Saves the coins, and removes the ones saved that are not in coins.
+    '''
+    def save_coins(self, coins: Iterable[InfoAlt]) -> None:
+        coin_names = set()
+        for coin in coins:
+            coin_names.add(coin.n_alt)
+            self.save_coin(coin)
+        with self.lock:
+            for coin_name in [coin_name for coin_name in self.coins if coin_name not in coin_names]:
+                self.append({"removed": coin_name})
+
+    '''
+    Saves the coin and the counters in the same change, for the changes of the coin that are counted (a completed
+    cycle): after a crash either both are saved or none, so the cycle is never counted twice.
+    '''
+    def save_coin_and_counters(self, coin: InfoAlt, counters: Dict) -> None:
+        state = to_state(coin)
+        with self.lock:
+            record = {}
+            if self.coins.get(coin.n_alt) != state:
+                record["coin"] = state
+            if self.counters != counters:
+                record["counters"] = counters
+            if len(record) > 0:
+                self.append(record)
+
+    def save_counters(self, counters: Dict) -> None:
+        with self.lock:
+            if self.counters != counters:
+                self.append({"counters": counters})
+
+    '''
+    Writes a change to the journal, and to disk. Must be called with lock.
+    '''
+    def append(self, record) -> None:
+        record["sequence"] = self.sequence + 1
+        # Through JSON, so the state kept is the same that would be read from the journal
+        record = json.loads(json.dumps(record))
+        if self.journal_file is None:
+            self.journal_file = open(self.journal_file_name, 'a')
+        self.journal_file.write(json.dumps(record) + "\n")
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+        self.apply(record)
+        self.journal_records += 1
+
+    def snapshot_if_due(self) -> None:
+        with self.lock:
+            if self.journal_records >= Config.CHECKPOINT_JOURNAL_MAX_RECORDS or \
+                    (self.journal_records > 0 and time.monotonic() - self.last_snapshot_time >= Config.CHECKPOINT_SNAPSHOT_SECONDS):
+                self.write_snapshot()
+
+    '''
+    Replaces the snapshot with the current state, and starts the journal again. Must be called with lock.
+    If it crashes after replacing the snapshot, the changes of the journal are already in it and are skipped.
+    '''
+    def write_snapshot(self) -> None:
+        snapshot = {"sequence": self.sequence, "coins": list(self.coins.values()), "counters": self.counters}
+        with open(self.snapshot_file_name + ".tmp", 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(self.snapshot_file_name + ".tmp", self.snapshot_file_name)
+        if self.journal_file is not None:
+            self.journal_file.close()
+        self.journal_file = open(self.journal_file_name, 'w')
+        self.journal_records = 0
+        self.last_snapshot_time = time.monotonic()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+
+    '''
+    Deletes the state saved, when the worker has finished and there is nothing to go on with.
+    '''
+    def clear(self) -> None:
+        self.close()
+        with self.lock:
+            for file_name in [self.snapshot_file_name, self.journal_file_name]:
+                if os.path.isfile(file_name):
+                    os.remove(file_name)
+            self.coins = {}
+            self.counters = {}
+
+
+'''
+Returns the values of the coin to save, all but its registry.
+'''
+def to_state(coin: InfoAlt) -> Dict:
+    return {key.lstrip('_'): value for key, value in vars(coin).items() if key != 'registry'}
+
+
+'''
+Sets the values saved to the coin. If it's in a registry, the registry is updated with its operation type.
+'''
+def restore_state(coin: InfoAlt, state: Dict) -> None:
+    for key, value in state.items():
+        setattr(coin, key, value)
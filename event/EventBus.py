@@ -0,0 +1,52 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+import time
+from threading import Lock
+from typing import Callable, Dict, List
+
+from utils.LatencyStats import latency_stats
+from utils.LoggingUtils import LoggingUtils
+
+
+class EventBus(object):
+    '''
+    Delivers the events published (ex: CandleClosed) to the handlers subscribed to their type.
+    Handlers are called in the thread that publishes the event (the websocket or the candle thread), so they must
+    return fast: anything slow has to be passed to another thread. An exception in a handler is logged and doesn't
+    stop the other handlers.
+    '''
+    def __init__(self):
+        # The lists of handlers are replaced instead of modified, so publish() doesn't need the lock
+        self.handlers = {}  # type: Dict[type, List[Callable]]
+        self.lock = Lock()
+        self.logger = LoggingUtils()
+
+    def subscribe(self, event_type: type, handler: Callable) -> None:
+        with self.lock:
+            self.handlers[event_type] = self.handlers.get(event_type, []) + [handler]
+
+    def unsubscribe(self, event_type: type, handler: Callable) -> None:
+        with self.lock:
+            self.handlers[event_type] = [h for h in self.handlers.get(event_type, []) if h != handler]
+
+    def publish(self, event) -> None:
+        for handler in self.handlers.get(type(event), []):
+            start = time.perf_counter()
+            try:
+                handler(event)
+            except Exception:
+                self.logger.logging_bittbot_error('PROCESAR EL EVENTO {}'.format(type(event).__name__))
+            latency_stats.record('{}.{}'.format(type(event).__name__, getattr(handler, '__qualname__', 'handler')), time.perf_counter() - start)
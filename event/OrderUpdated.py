@@ -0,0 +1,26 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+from typing import List, NamedTuple
+
+
+class OrderUpdated(NamedTuple):
+    '''
+    The state of an order (filled, partially filled, cancelled...) of the markets has changed at the Exchange.
+    market_names is empty when the Exchange doesn't say the market of the order.
+    '''
+    market_names: List[str]
+    order_id: str
@@ -0,0 +1,68 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+import math
+from collections import deque
+
+from indicator.BaseIndicator import BaseIndicator, NAN
+
+
+class BBandsIndicator(BaseIndicator):
+    '''
+    Outputs upperband, middleband and lowerband like talib.BBANDS with a simple moving average. The window sum and
+    sum of squares are updated with each close, adding the new value and removing the oldest one. They are recalculated
+    from the window every 'period' closes to avoid accumulating rounding errors, so the bands match talib within
+    floating point precision.
+    '''
+    def __init__(self, period: int = 5, nbdevup: float = 2, nbdevdn: float = 2):
+        super().__init__(3)
+        self.period = period
+        self.nbdevup = nbdevup
+        self.nbdevdn = nbdevdn
+        self.window = deque()
+        self.window_sum = 0.0
+        self.window_sum_squares = 0.0
+        self.updates_since_resync = 0
+
+    def update(self, close: float) -> None:
+        self.window.append(close)
+        self.window_sum += close
+        self.window_sum_squares += close * close
+        if len(self.window) < self.period:
+            self.append_outputs(NAN, NAN, NAN)
+            return
+        middle = self.window_sum / self.period
+        variance = self.window_sum_squares / self.period - middle * middle
+        oldest = self.window.popleft()
+        self.window_sum -= oldest
+        self.window_sum_squares -= oldest * oldest
+        self.updates_since_resync += 1
+        if self.updates_since_resync >= self.period:
+            self.resync()
+        stddev = math.sqrt(variance) if variance > 0.0 else 0.0
+        self.append_outputs(middle + stddev * self.nbdevup, middle, middle - stddev * self.nbdevdn)
+
+    def resync(self) -> None:
+        self.window_sum = 0.0
+        self.window_sum_squares = 0.0
+        for value in self.window:
+            self.window_sum += value
+            self.window_sum_squares += value * value
+        self.updates_since_resync = 0
+
+    def append_outputs(self, upper: float, middle: float, lower: float) -> None:
+        self.values[0].append(upper)
+        self.values[1].append(middle)
+        self.values[2].append(lower)
@@ -0,0 +1,53 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+import abc
+from typing import Tuple
+
+import numpy as np
+
+from domain.CoinMarketData import CANDLE_HISTORY_CAPACITY
+from utils.RingBuffer import RingBuffer
+
+NAN = float('nan')
+
+'''
+Same epsilon than talib uses to decide that a value is zero.
+'''
+TALIB_EPSILON = 0.00000001
+
+
+class BaseIndicator(metaclass=abc.ABCMeta):
+    '''
+    Indicator calculated incrementally, one close at a time. Each output is stored in a RingBuffer aligned with the
+    candles used to calculate it (output[-1] is the value for the last candle), with NaN values while there are not
+    enough candles, like talib does.
+    '''
+    def __init__(self, num_outputs: int) -> None:
+        self.values = [RingBuffer(CANDLE_HISTORY_CAPACITY) for _ in range(num_outputs)]
+
+    def __len__(self) -> int:
+        return len(self.values[0])
+
+    @abc.abstractmethod
+    def update(self, close: float) -> None:
+        pass
+
+    def warm_up(self, closes: np.ndarray) -> None:
+        for close in closes:
+            self.update(float(close))
+
+    def outputs(self) -> Tuple[np.ndarray, ...]:
+        return tuple(value.view() for value in self.values)
@@ -0,0 +1,93 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+# Indicators calculated at once for many markets. Every function receives a 2D array with one row per market and one
+# column per candle (oldest first), and returns arrays with the same shape and the same values (and NaN lookback)
+# that the talib function would return for each row.
+
+from typing import Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from indicator.BaseIndicator import TALIB_EPSILON
+
+
+def ema(closes: np.ndarray, period: int) -> np.ndarray:
+    output = np.full(closes.shape, np.nan)
+    if closes.shape[1] < period:
+        return output
+    k = 2.0 / (period + 1)
+    value = closes[:, :period].sum(axis=1) / period
+    output[:, period - 1] = value
+    for i in range(period, closes.shape[1]):
+        value = ((closes[:, i] - value) * k) + value
+        output[:, i] = value
+    return output
+
+
+def macd(closes: np.ndarray, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if slow_period < fast_period:
+        fast_period, slow_period = slow_period, fast_period
+    macd_line = np.full(closes.shape, np.nan)
+    signal = np.full(closes.shape, np.nan)
+    first = slow_period - 1
+    if closes.shape[1] > first:
+        # Like talib, the fast EMA starts at the same candle than the slow one
+        fast_ema = ema(closes[:, slow_period - fast_period:], fast_period)
+        slow_ema = ema(closes, slow_period)
+        macd_line[:, first:] = fast_ema[:, first - (slow_period - fast_period):] - slow_ema[:, first:]
+        signal[:, first:] = ema(macd_line[:, first:], signal_period)
+        # talib doesn't return macd values until the signal is available
+        macd_line[:, :first + signal_period - 1] = np.nan
+    return macd_line, signal, macd_line - signal
+
+
+def rsi(closes: np.ndarray, period: int = 14) -> np.ndarray:
+    output = np.full(closes.shape, np.nan)
+    if closes.shape[1] <= period:
+        return output
+    changes = np.diff(closes, axis=1)
+    gains = np.where(changes > 0, changes, 0.0)
+    losses = np.where(changes < 0, -changes, 0.0)
+    avg_gain = gains[:, :period].sum(axis=1) / period
+    avg_loss = losses[:, :period].sum(axis=1) / period
+    output[:, period] = rsi_value(avg_gain, avg_loss)
+    for i in range(period, changes.shape[1]):
+        avg_gain = (avg_gain * (period - 1) + gains[:, i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[:, i]) / period
+        output[:, i + 1] = rsi_value(avg_gain, avg_loss)
+    return output
+
+
+def rsi_value(avg_gain: np.ndarray, avg_loss: np.ndarray) -> np.ndarray:
+    total = avg_gain + avg_loss
+    is_zero = np.abs(total) < TALIB_EPSILON
+    return np.where(is_zero, 0.0, 100.0 * avg_gain / np.where(is_zero, 1.0, total))
+
+
+def bbands(closes: np.ndarray, period: int = 5, nbdevup: float = 2, nbdevdn: float = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    upper = np.full(closes.shape, np.nan)
+    middle = np.full(closes.shape, np.nan)
+    lower = np.full(closes.shape, np.nan)
+    if closes.shape[1] < period:
+        return upper, middle, lower
+    windows = sliding_window_view(closes, period, axis=1)
+    window_mean = windows.mean(axis=2)
+    stddev = np.sqrt(((windows - window_mean[:, :, np.newaxis]) ** 2).mean(axis=2))
+    middle[:, period - 1:] = window_mean
+    upper[:, period - 1:] = window_mean + stddev * nbdevup
+    lower[:, period - 1:] = window_mean - stddev * nbdevdn
+    return upper, middle, lower
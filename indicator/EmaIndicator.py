@@ -0,0 +1,47 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+from indicator.BaseIndicator import BaseIndicator, NAN
+
+
+class EmaState(object):
+    '''
+    Exponential Moving Average state, seeded with the simple average of the first 'period' values like talib.EMA.
+    '''
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, value: float) -> float:
+        self.count += 1
+        if self.count < self.period:
+            self.value += value
+            return NAN
+        if self.count == self.period:
+            self.value = (self.value + value) / self.period
+        else:
+            self.value = ((value - self.value) * self.k) + self.value
+        return self.value
+
+
+class EmaIndicator(BaseIndicator):
+    def __init__(self, period: int = 30):
+        super().__init__(1)
+        self.ema = EmaState(period)
+
+    def update(self, close: float) -> None:
+        self.values[0].append(self.ema.update(close))
@@ -0,0 +1,54 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+from domain.CoinMarketData import CoinMarketData
+from indicator.BaseIndicator import BaseIndicator
+
+
+class IndicatorEngine(object):
+    '''
+    Keeps the state of every indicator requested for each (market, timeframe), so they are updated in O(1) when a
+    candle is closed instead of recalculating them over the whole historic.
+    An indicator is created and warmed up with the existing candles the first time it is requested.
+    '''
+    def __init__(self):
+        self.indicators = {}  # type: Dict[Tuple[str, int], Dict[Tuple, BaseIndicator]]
+
+    def get(self, coin_pair_name, timeframe_minutes: int, candles: CoinMarketData, indicator_class, *params) -> Tuple[np.ndarray, ...]:
+        market_indicators = self.indicators.setdefault((coin_pair_name, timeframe_minutes), {})
+        key = (indicator_class.__name__,) + params
+        indicator = market_indicators.get(key)
+        # If the candles changed without notifying us, start again with the current ones
+        if indicator is None or len(indicator) != len(candles.close):
+            indicator = indicator_class(*params)
+            indicator.warm_up(candles.close.view())
+            market_indicators[key] = indicator
+        return indicator.outputs()
+
+    def update(self, coin_pair_name, timeframe_minutes: int, close: float) -> None:
+        market_indicators = self.indicators.get((coin_pair_name, timeframe_minutes))
+        if market_indicators is None:
+            return
+        for indicator in market_indicators.values():
+            indicator.update(close)
+
+    def reset(self, coin_pair_name) -> None:
+        for series_key in list(self.indicators):
+            if series_key[0] == coin_pair_name:
+                del self.indicators[series_key]
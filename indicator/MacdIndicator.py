@@ -0,0 +1,56 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+from indicator.BaseIndicator import BaseIndicator, NAN
+from indicator.EmaIndicator import EmaState
+
+
+class MacdIndicator(BaseIndicator):
+    '''
+    Outputs macd, macdsignal and macdhist like talib.MACD. talib seeds the fast EMA with the 'fast_period' values just
+    before the first slow EMA value, so both EMAs start at the same candle, and it doesn't return any macd value until
+    the signal EMA is available.
+    '''
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        super().__init__(3)
+        if slow_period < fast_period:
+            fast_period, slow_period = slow_period, fast_period
+        self.fast_delay = slow_period - fast_period
+        self.fast_ema = EmaState(fast_period)
+        self.slow_ema = EmaState(slow_period)
+        self.signal_ema = EmaState(signal_period)
+        self.count = 0
+
+    def update(self, close: float) -> None:
+        self.count += 1
+        slow = self.slow_ema.update(close)
+        if self.count <= self.fast_delay:
+            self.append_outputs(NAN, NAN, NAN)
+            return
+        fast = self.fast_ema.update(close)
+        if slow != slow:  # NaN, slow EMA not ready yet
+            self.append_outputs(NAN, NAN, NAN)
+            return
+        macd = fast - slow
+        signal = self.signal_ema.update(macd)
+        if signal != signal:
+            self.append_outputs(NAN, NAN, NAN)
+            return
+        self.append_outputs(macd, signal, macd - signal)
+
+    def append_outputs(self, macd: float, signal: float, hist: float) -> None:
+        self.values[0].append(macd)
+        self.values[1].append(signal)
+        self.values[2].append(hist)
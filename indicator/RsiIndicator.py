@@ -0,0 +1,63 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+from indicator.BaseIndicator import BaseIndicator, NAN, TALIB_EPSILON
+
+
+class RsiIndicator(BaseIndicator):
+    '''
+    Wilder's RSI like talib.RSI: the first average gain/loss is the simple average of the first 'period' changes.
+    '''
+    def __init__(self, period: int = 14):
+        super().__init__(1)
+        self.period = period
+        self.count = 0
+        self.prev_close = 0.0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, close: float) -> None:
+        self.count += 1
+        if self.count == 1:
+            self.prev_close = close
+            self.values[0].append(NAN)
+            return
+        change = close - self.prev_close
+        self.prev_close = close
+        if self.count <= self.period:
+            self.add_change(change)
+            self.values[0].append(NAN)
+            return
+        if self.count == self.period + 1:
+            self.add_change(change)
+            self.avg_loss /= self.period
+            self.avg_gain /= self.period
+        else:
+            self.avg_loss *= (self.period - 1)
+            self.avg_gain *= (self.period - 1)
+            self.add_change(change)
+            self.avg_loss /= self.period
+            self.avg_gain /= self.period
+        total = self.avg_gain + self.avg_loss
+        if -TALIB_EPSILON < total < TALIB_EPSILON:
+            self.values[0].append(0.0)
+        else:
+            self.values[0].append(100.0 * (self.avg_gain / total))
+
+    def add_change(self, change: float) -> None:
+        if change < 0:
+            self.avg_loss -= change
+        else:
+            self.avg_gain += change
@@ -14,15 +14,22 @@
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
 import abc
+from typing import Dict, List, Optional, Tuple
 
 from api.Api import Api
 from domain.InfoAlt import InfoAlt
 from domain.MarketHistoric import MarketHistoric
 from domain.Parameters import Parameters
+from event.CandleClosed import CandleClosed
 from utils.Telegram import Telegram
 
 
 class BaseStrategy(metaclass=abc.ABCMeta):
+    # Timeframe of the candles calculated by the strategy, None if it only uses the ticker.
+    # Strategies with the same timeframe can share the market historic.
+    candles_time_minutes = None  # type: Optional[int]
+    # Buy signals of all the coins calculated at once by evaluate_buy_signals: (candles version, coin names, signals)
+    buy_signals = None  # type: Optional[Tuple[int, List[str], Dict[str, bool]]]
 
     @abc.abstractmethod
     def __init__(self, params: Parameters, api: Api, telegram_bot: Telegram, market_historic: MarketHistoric) -> None:
@@ -48,6 +55,45 @@ class BaseStrategy(metaclass=abc.ABCMeta):
     def pre_coins_interator(self) -> None:
         pass
 
+    '''
+    Calculates the buy signals of all the coins at once with calculate_buy_signals, only when there are new candles.
+    should_buy_coin then reads the signal of each coin with get_buy_signal.
+    '''
+    def evaluate_buy_signals(self, coins: List[InfoAlt]) -> None:
+        coin_names = [coin.n_alt for coin in coins]
+        candles_version = self.market_historic.candles_version
+        buy_signals = self.buy_signals
+        if buy_signals is not None and buy_signals[0] == candles_version and buy_signals[1] == coin_names:
+            return
+        # The worker and the candle thread (on_candle_closed) may both be here, so the signals are published together
+        # with their version in one assignment
+        self.buy_signals = (candles_version, coin_names, self.calculate_buy_signals(coin_names))
+
+    '''
+    Returns the buy signal of the coin calculated by evaluate_buy_signals, or None if there is none for the current
+    candles.
+    '''
+    def get_buy_signal(self, coin_name) -> Optional[bool]:
+        buy_signals = self.buy_signals
+        if buy_signals is None or buy_signals[0] != self.market_historic.candles_version:
+            return None
+        return buy_signals[2].get(coin_name)
+
+    '''
+    Calculates the buy signals as soon as the candles are closed, instead of waiting for the next cycle. Subscribed by
+    the strategies that calculate their signals from the candles.
+    '''
+    def on_candle_closed(self, event: CandleClosed) -> None:
+        if event.timeframe_minutes == self.candles_time_minutes:
+            self.evaluate_buy_signals(list(self.params.coins_trader))
+
+    '''
+    Returns the buy signal of each coin, calculated for all of them at once. Without signal, the coin is evaluated by
+    should_buy_coin on its own.
+    '''
+    def calculate_buy_signals(self, coin_names: List[str]) -> Dict[str, bool]:
+        return {}
+
     @abc.abstractmethod
     def should_buy_coin(self, coin: InfoAlt) -> bool:
         pass
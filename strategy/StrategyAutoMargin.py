@@ -14,6 +14,7 @@
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
 import time
+from typing import List
 
 from api.Api import Api
 from domain import InfoAlt
@@ -47,7 +48,7 @@ class StrategyAutoMargin(BaseStrategy):
             coin_pairs = self.choose_alts()
             p = len(self.params.coins_trader)
             for coin_pair in coin_pairs:
-                if p <= self.params.max_alts_to_trade and not self.api.exists_in_coins_trader(coin_pair):
+                if p <= self.params.max_alts_to_trade and coin_pair not in self.params.coins_trader:
                     fit_coin = InfoAlt.InfoAlt()
                     fit_coin.n_alt = coin_pair
                     self.params.coins_trader.append(fit_coin)
@@ -74,15 +75,23 @@ class StrategyAutoMargin(BaseStrategy):
     def post_cycles_iterator(self) -> None:
         pass
 
+    def evaluate_buy_signals(self, coins: List[InfoAlt.InfoAlt]) -> None:
+        return
+
     def should_buy_coin(self, coin: InfoAlt) -> bool:
-        if self.num_currently_operating_alts >= self.params.max_alts_to_trade:
+        # Coins in BUY are placing their order (AsyncBotWorker places many at the same time), their slot is taken
+        if self.num_currently_operating_alts + self.params.coins_trader.count('BUY') >= self.params.max_alts_to_trade:
             return False
 
-        coin_market = self.market_historic.get_coin_market_data(coin.n_alt)
-        if coin_market.percentChange >= self.params.margin_increment_24h and coin_market.lowestAsk <= coin_market.low24hr + ((coin_market.high24hr - coin_market.low24hr) * self.params.current_margin_increment):
+        ticker = self.market_historic.get_ticker(coin.n_alt)
+        if ticker.percentChange >= self.params.margin_increment_24h and ticker.lowestAsk <= ticker.low24hr + ((ticker.high24hr - ticker.low24hr) * self.params.current_margin_increment):
+            if coin in self.alts_no_cumplen:
+                self.alts_no_cumplen.remove(coin)
             return True
         else:
-            self.alts_no_cumplen.append(coin)
+            # It can be evaluated several times between heartbeats
+            if coin not in self.alts_no_cumplen:
+                self.alts_no_cumplen.append(coin)
             return False
 
     #################################################
@@ -110,29 +119,26 @@ class StrategyAutoMargin(BaseStrategy):
     def choose_alts(self):
         alts_ok = []
         alts_ok_def = []
-        ticker = self.api.get_full_ticker()
+        # Coins with the 24h increment and the ask low enough in the 24h range, with the highest increment first
+        coin_pairs = self.market_historic.ticker_snapshot.select_markets(
+            self.params.altstr, alt_coins=self.params.working_alts, min_percent_change=self.params.margin_increment_24h,
+            max_ask_range_position=self.params.current_margin_increment, sort_by='percent_change')
 
-        for ticker_alt in ticker:
-            pair = ticker_alt.marketName.split('_')  # pair[0] -> Main coin, pair[1] -> Alt coin
-            if pair[0] == self.params.altstr and pair[1] in self.params.working_alts:
-                desired_increment = (ticker_alt.high - ticker_alt.low) * self.params.current_margin_increment
-                pass_percentage = ticker_alt.percentChange >= self.params.margin_increment_24h
-                pass_current_increment = ticker_alt.ask <= ticker_alt.low + desired_increment
-                if pass_percentage and pass_current_increment:
-                    historic = self.market_historic.get_coin_market_data(ticker_alt.marketName)
-                    if historic is None:  # This could happen on a coin that has near no movement
-                        continue
-                    alts_ok.append(historic)
+        for coin_pair in coin_pairs:
+            historic = self.market_historic.get_coin_market_data(coin_pair)
+            if historic is None:  # This could happen on a coin that has near no movement
+                continue
+            alts_ok.append(historic)
 
         if len(alts_ok) == 0:
             self.logger.logging_info('### NINGUNA NUEVA ALT CUMPLE CON LOS CRITERIOS DE TRADER ###')
         else:
             self.logger.logging_line_char("-")
-            alts_ok = sorted(alts_ok, key=lambda objeto: objeto.percentChange, reverse=True)
             n_tr = 1
             for coin in alts_ok:
                 if n_tr <= self.params.max_alts_to_trade:
-                    self.logger.logging_info("{} -- Max 24H: {} - Min 24H: {} - Inc: {} % - Last: {}".format(coin.alt_name, coin.high24hr, coin.low24hr, round(coin.percentChange * 100, 3), coin.last))
+                    ticker = coin.ticker
+                    self.logger.logging_info("{} -- Max 24H: {} - Min 24H: {} - Inc: {} % - Last: {}".format(coin.alt_name, ticker.high24hr, ticker.low24hr, round(ticker.percentChange * 100, 3), ticker.last))
                     alts_ok_def.append(coin.alt_name)
                     n_tr += 1
             self.logger.logging_line_char("-")
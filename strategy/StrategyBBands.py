@@ -14,14 +14,18 @@
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
 import time
-import numpy as np
-import talib
+from typing import Dict, List
 
 from api.Api import Api
+from domain import CandleStore
 from domain.CoinMarketData import CoinMarketData
 from domain.InfoAlt import InfoAlt
 from domain.MarketHistoric import MarketHistoric
 from domain.Parameters import Parameters
+from event.CandleClosed import CandleClosed
+from indicator import BatchIndicators
+from indicator.BBandsIndicator import BBandsIndicator
+from indicator.EmaIndicator import EmaIndicator
 from strategy.BaseStrategy import BaseStrategy
 from utils import Config
 from utils.LoggingUtils import LoggingUtils
@@ -30,6 +34,7 @@ from utils.Telegram import Telegram
 
 
 class StrategyBBands(BaseStrategy):
+    candles_time_minutes = 5
 
     def __init__(self, params: Parameters, api: Api, telegram_bot: Telegram, market_historic: MarketHistoric):
         super().__init__(params, api, telegram_bot, market_historic)
@@ -40,15 +45,19 @@ class StrategyBBands(BaseStrategy):
         self.update_market_timer = None
         self.print_status_timer = None
         self.num_currently_operating_alts = 0
-        self.candles_time_minutes = 5
+        self.market_state_candles_time_minutes = 30
         self.market_historic = market_historic
         self.logger = LoggingUtils()
         self.bbands_period = 20
         self.bbands_stddev = 2
-        self.min_historic_data = 300  # A little more than 24h with 5min candle
+        self.min_historic_data = 360  # 30h with 5min candles, needed for the 24h EMA9 of the 30min candles
+        self.max_historic_candles = 500
+        self.market_state_min_candles = 56  # EMA9[-48] needs 48 candles more than the 8 candles of EMA9 lookback
 
     def pre_cycles_iterator(self) -> None:
         self.market_historic.start_candle_calculations(self.candles_time_minutes)
+        self.market_historic.add_timeframe(self.market_state_candles_time_minutes)
+        self.market_historic.events.subscribe(CandleClosed, self.on_candle_closed)
         self.api.subscribe_websocket(self.market_historic)
         self.print_status_timer = timer.RepeatedTimer(60, self.print_coins_bbands_status)
         time.sleep(30)
@@ -63,66 +72,42 @@ class StrategyBBands(BaseStrategy):
                 self.logger.logging_info("NO HAY ALTS QUE CUMPLAN LOS REQUISITOS")
                 return
             for coin in coins:
-                if not self.api.exists_in_coins_trader(coin.n_alt):
+                if coin.n_alt not in self.params.coins_trader:
                     self.params.coins_trader.append(coin)
             # Update historic if it's the first time we use this alt -> doesn't have historic data
+            coins_without_historic = []
             for coin in self.params.coins_trader:
                 coin_market_data = self.market_historic.get_coin_market_data(coin.n_alt)
                 if coin_market_data is None:
                     bugged_coins.append(coin)
-                    continue
-                if len(coin_market_data.close) < self.min_historic_data:
-                    self.populate_market_history(coin)
-                    coin_market_data = self.market_historic.get_coin_market_data(coin.n_alt)
-                    if len(coin_market_data.close) < self.min_historic_data:
+                elif len(coin_market_data.close) < self.min_historic_data:
+                    coins_without_historic.append(coin)
+            if len(coins_without_historic) > 0:
+                self.populate_market_history(coins_without_historic)
+                for coin in coins_without_historic:
+                    if len(self.market_historic.get_coin_market_data(coin.n_alt).close) < self.min_historic_data:
                         bugged_coins.append(coin)
-                        continue
             for coin in bugged_coins:
                 self.params.coins_trader.remove(coin)
 
     def delete_not_operating_coins(self):
-        alt_not_operating = []
-        for coin in self.params.coins_trader:
-            if coin.operation_type == 'NO_ORDER':
-                alt_not_operating.append(coin)
-        if len(alt_not_operating) > 0:
-            for coin in alt_not_operating:
-                self.params.coins_trader.remove(coin)
+        for coin in self.params.coins_trader.get_coins('NO_ORDER'):
+            self.params.coins_trader.remove(coin)
 
     def select_coins_to_operate(self):
-        blacklisted_coins = []
+        blacklisted_alts = []
         if "Blacklisted_Coins" in self.params.config:
-            for alt_name in self.params.config["Blacklisted_Coins"]:
-                blacklisted_coins.append("{}_{}".format(self.params.altstr, alt_name))
-        market_alts = []  # List[CoinMarketData]
-        ticker = self.api.get_full_ticker()
-        for ticker_alt in ticker:
-            if ticker_alt.marketName.find(self.params.altstr) != 0:  # We want ALT_*** only, so we want it in position 0
-                continue
-            if ticker_alt.marketName in blacklisted_coins:
-                continue
-            volume = ticker_alt.baseVolume
-            change24h = ticker_alt.percentChange * 100
-            if change24h < self.params.coin_selection_min_24_increment or change24h > self.params.coin_selection_max_24_increment:
-                continue
-            if volume < self.params.coin_selection_min_volume:
-                continue
-            # If we reach here, it fulfills all requirements, so add it
-            alt = CoinMarketData()
-            alt.alt_name = ticker_alt.marketName
-            alt.baseVolume = volume
-            alt.high24hr = ticker_alt.high
-            alt.low24hr = ticker_alt.low
-            alt.percentChange = change24h
-            alt.lowestAsk = ticker_alt.ask
-            alt.highestBid = ticker_alt.bid
-            alt.last = ticker_alt.last
-            market_alts.append(alt)
-        market_alts.sort(key=lambda x: x.baseVolume, reverse=True)  # Sort by Volume descending
+            blacklisted_alts = self.params.config["Blacklisted_Coins"]
+        # Sorted by Volume descending
+        market_names = self.market_historic.ticker_snapshot.select_markets(
+            self.params.altstr, excluded_alt_coins=blacklisted_alts,
+            min_percent_change=self.params.coin_selection_min_24_increment / 100,
+            max_percent_change=self.params.coin_selection_max_24_increment / 100,
+            min_base_volume=self.params.coin_selection_min_volume, sort_by='base_volume')
         alts = []
-        for market_coin in market_alts:
+        for market_name in market_names:
             alt = InfoAlt()
-            alt.n_alt = market_coin.alt_name
+            alt.n_alt = market_name
             alts.append(alt)
         return alts
 
@@ -136,7 +121,8 @@ class StrategyBBands(BaseStrategy):
             self.print_status_timer.stop()
 
     def should_buy_coin(self, coin: InfoAlt) -> bool:
-        if self.num_currently_operating_alts >= self.params.max_alts_to_trade:
+        # Coins in BUY are placing their order (AsyncBotWorker places many at the same time), their slot is taken
+        if self.num_currently_operating_alts + self.params.coins_trader.count('BUY') >= self.params.max_alts_to_trade:
             # self.logger.logging_info("[{}] No compramos porque ya estamos usando el numero maximo de alts simultaneas {}/{}".format(coin.n_alt, self.num_currently_operating_alts, self.params.max_alts_to_trade))
             return False
 
@@ -145,6 +131,10 @@ class StrategyBBands(BaseStrategy):
             # self.logger.logging_info("[{}] No compramos porque ya hemos operado en esta coin y esta vela {}".format(coin.n_alt, coin.last_used_candle))
             return False
 
+        buy_signal = self.get_buy_signal(coin.n_alt)
+        if buy_signal is not None:
+            return buy_signal
+
         # We analyse current 5-min candle BB entry condition. If it's valid, we then check if the market is bullish.
         # If both conditions are fulfilled, we issue a buy signal.
         bbands_entry_signal = self.analyze_bbands_entry(coin)
@@ -154,6 +144,33 @@ class StrategyBBands(BaseStrategy):
                 return True
         return False
 
+    '''
+    Calculates the BB entry condition and the market state for all the coins at once.
+    '''
+    def calculate_buy_signals(self, coin_names: List[str]) -> Dict[str, bool]:
+        buy_signals = {}  # type: Dict[str, bool]
+        entry_names = []
+        # BB entry condition: we only need the bands for the last candle
+        for names, (closes, opens) in self.market_historic.get_candles_matrices(coin_names, self.candles_time_minutes, self.bbands_period, ('close', 'open')):
+            upperband, middleband, lowerband = BatchIndicators.bbands(closes[:, -self.bbands_period:], self.bbands_period, self.bbands_stddev, self.bbands_stddev)
+            last_close = closes[:, -1]
+            last_open = opens[:, -1]
+            lower = lowerband[:, -1]
+            entry = (last_close < last_open) & (lower >= ((last_open - last_close) * self.params.bbands_crossing_share) + last_close) & (lower < last_open)
+            buy_signals.update(dict.fromkeys(names, False))
+            entry_names.extend(name for name, is_entry in zip(names, entry.tolist()) if is_entry)
+
+        # Market state, only for the coins that fulfill the entry condition
+        for state_names, (state_closes,) in self.market_historic.get_candles_matrices(entry_names, self.market_state_candles_time_minutes, self.market_state_min_candles):
+            ema9 = BatchIndicators.ema(state_closes, 9)
+            ema12 = BatchIndicators.ema(state_closes, 12)
+            ema24 = BatchIndicators.ema(state_closes, 24)
+            is_bull = (ema9[:, -1] >= (ema9[:, -48] + (ema9[:, -48] * self.params.market_state_24h_share))) \
+                & (ema12[:, -1] >= (ema12[:, -24] + (ema12[:, -24] * self.params.market_state_12h_share))) \
+                & (ema24[:, -1] >= (ema24[:, -10] + (ema24[:, -10] * self.params.market_state_5h_share)))
+            buy_signals.update(zip(state_names, is_bull.tolist()))
+        return buy_signals
+
     #################################################
     #                 NOTIFICATIONS                 #
     #################################################
@@ -176,25 +193,38 @@ class StrategyBBands(BaseStrategy):
     #                 TECHNICAL ANALYSIS                 #
     ######################################################
 
-    def populate_market_history(self, coin: InfoAlt):
-        self.logger.logging_info('Obteniendo los valores historicos de la alt {}'.format(coin.n_alt))
-        coin_historic = self.api.get_historic_values_five_min(coin.n_alt)
-        if len(coin_historic.close) >= self.min_historic_data:
-            self.market_historic.set_coin_market_historic_only(coin.n_alt, coin_historic)
-            return True
-        else:
-            self.logger.logging_info("NO SE HA PODIDO OBTENER LOS DATOS HISTORICOS DE {}".format(coin.n_alt))
-            return False
+    def populate_market_history(self, coins: List[InfoAlt]):
+        self.logger.logging_info('Obteniendo los valores historicos de las alts {}'.format(", ".join(coin.n_alt for coin in coins)))
+        # Use the candles stored on disk from previous executions, and only get from the exchange the ones after them
+        coins_historic = {}  # type: Dict[str, CoinMarketData]
+        historic_requests = {}  # type: Dict[str, int]
+        for coin in coins:
+            coin_historic = self.market_historic.load_stored_candles(coin.n_alt, self.candles_time_minutes)
+            missing_candles = self.market_historic.count_missing_candles(coin_historic, self.candles_time_minutes)
+            if missing_candles < 0 or missing_candles >= self.max_historic_candles:
+                historic_requests[coin.n_alt] = self.max_historic_candles
+                continue
+            coins_historic[coin.n_alt] = coin_historic
+            if missing_candles > 0:
+                historic_requests[coin.n_alt] = missing_candles + 1
+        for coin_name, coin_historic in self.api.get_historic_values_many(historic_requests, self.candles_time_minutes):
+            if coin_name in coins_historic:
+                coin_historic = CandleStore.merge_candles(coins_historic[coin_name], coin_historic)
+            coins_historic[coin_name] = coin_historic
+        for coin in coins:
+            coin_historic = coins_historic[coin.n_alt]
+            if len(coin_historic.close) >= self.min_historic_data:
+                self.market_historic.set_coin_market_historic_only(coin.n_alt, coin_historic)
+            else:
+                self.logger.logging_info("NO SE HA PODIDO OBTENER LOS DATOS HISTORICOS DE {}".format(coin.n_alt))
 
     def calculate_bbands(self, coin: InfoAlt):
-        candles = np.array(self.market_historic.get_coin_market_data(coin.n_alt).close, dtype=float)
-        upperband, middleband, lowerband = talib.BBANDS(candles, self.bbands_period, self.bbands_stddev, self.bbands_stddev)
+        upperband, middleband, lowerband = self.market_historic.get_indicator(coin.n_alt, self.candles_time_minutes, BBandsIndicator, self.bbands_period, self.bbands_stddev, self.bbands_stddev)
         return upperband, middleband, lowerband
 
     def analyze_bbands_entry(self, coin: InfoAlt):
         upperband, middleband, lowerband = self.calculate_bbands(coin)
-        last_close = self.market_historic.get_coin_market_data(coin.n_alt).close[-1]
-        last_open = self.market_historic.get_coin_market_data(coin.n_alt).open[-1]
+        _, last_open, _, _, last_close, _ = self.market_historic.get_last_candle(coin.n_alt, self.candles_time_minutes)
 
         # Check for a red candle (close < open)
         if last_close < last_open:
@@ -205,51 +235,19 @@ class StrategyBBands(BaseStrategy):
         return False
 
     def get_market_state(self, coin: InfoAlt):
-        candles = self.generate_half_hour_candles(coin)
-        closes = np.array(candles.close, dtype=float)
-        ema9 = talib.EMA(closes, 9)
+        ema9, = self.market_historic.get_indicator(coin.n_alt, self.market_state_candles_time_minutes, EmaIndicator, 9)
         # self.logger.logging_info("[{}] -> Will start analysing market EMA9[-1] = {}, EMA9[-48] = {}".format(coin.n_alt, ema9[-1], ema9[-48]))
         if ema9[-1] >= (ema9[-48] + (ema9[-48] * self.params.market_state_24h_share)):
             # self.logger.logging_info("[{}] -> Passed ema9 (24h)".format(coin.n_alt))
-            ema12 = talib.EMA(closes, 12)
+            ema12, = self.market_historic.get_indicator(coin.n_alt, self.market_state_candles_time_minutes, EmaIndicator, 12)
             if ema12[-1] >= (ema12[-24] + (ema12[-24] * self.params.market_state_12h_share)):
                 # self.logger.logging_info("[{}] -> Passed ema12 (12h)".format(coin.n_alt))
-                ema24 = talib.EMA(closes, 24)
+                ema24, = self.market_historic.get_indicator(coin.n_alt, self.market_state_candles_time_minutes, EmaIndicator, 24)
                 if ema24[-1] >= (ema24[-10] + (ema24[-10] * self.params.market_state_5h_share)):
                     # self.logger.logging_info("[{}] -> Passed ema24 (5h)".format(coin.n_alt))
                     return True
         return False
 
-    '''
-    Returns 30 minutes candles based on 5min candles from exchange.
-    '''
-    def generate_half_hour_candles(self, coin: InfoAlt) -> CoinMarketData:
-        coin_data = self.market_historic.get_coin_market_data(coin.n_alt)
-        chunk_size = 5  # 30 min -> 5x 5min candles
-
-        # The order will be reversed to create the 30minute candle data.
-        # That means newest candle will be on position [0] while the oldest one will be at [-1]
-        chunk_open = [coin_data.open[::-1][i:i + chunk_size] for i in range(0, len(coin_data.open), chunk_size)]  # [::-1] reverses the array as a view
-        chunk_high = [coin_data.high[::-1][i:i + chunk_size] for i in range(0, len(coin_data.high), chunk_size)]
-        chunk_low = [coin_data.low[::-1][i:i + chunk_size] for i in range(0, len(coin_data.low), chunk_size)]
-        chunk_close = [coin_data.close[::-1][i:i + chunk_size] for i in range(0, len(coin_data.close), chunk_size)]
-
-        # Reverse the order to get back to the original one.
-        # That means newest candle on [-1] and oldest on [0]
-        chunk_open.reverse()
-        chunk_high.reverse()
-        chunk_low.reverse()
-        chunk_close.reverse()
-
-        new_candles = CoinMarketData()
-        new_candles.alt_name = coin_data.alt_name
-        for i in range(0, len(chunk_close)):
-            new_candles.open.append(chunk_open[i][-1])
-            new_candles.high.append(max(chunk_high))
-            new_candles.low.append(min(chunk_low))
-            new_candles.close.append(chunk_close[i][0])
-        return new_candles
-
     def print_coins_bbands_status(self):
         if len(self.params.coins_trader) == 0:
             return
@@ -260,7 +258,7 @@ class StrategyBBands(BaseStrategy):
                 # This may crash when there is a bugged coin that is still not removed because we are still calculating
                 # the market historic and we didn't detect it yet.
                 upperband, middleband, lowerband = self.calculate_bbands(coin)
-                timestamp = self.market_historic.get_coin_market_data(coin.n_alt).timestamp[-1]
+                timestamp = time.strftime("%d/%m/%y %H:%M", time.localtime(self.market_historic.get_coin_market_data(coin.n_alt).timestamp[-1]))
                 self.logger.logging_info("\t[{}] - BB Candle {} - upper: {}, middle: {}, lower: {}".format(coin.n_alt, timestamp, upperband[-1], middleband[-1], lowerband[-1]))
             except Exception:
                 continue
@@ -14,6 +14,7 @@
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
 import time
+from typing import List
 
 from api.Api import Api
 from domain.InfoAlt import InfoAlt
@@ -48,10 +49,13 @@ class StrategyGeneral(BaseStrategy):
     def post_cycles_iterator(self) -> None:
         pass
 
+    def evaluate_buy_signals(self, coins: List[InfoAlt]) -> None:
+        return
+
     def should_buy_coin(self, coin: InfoAlt) -> bool:
-        coin_market = self.market_historic.get_coin_market_data(coin.n_alt)
-        is_valid_change = coin_market.percentChange >= self.params.margin_increment_24h
-        is_valid_lowest_ask = coin_market.lowestAsk <= (coin_market.high24hr + coin_market.low24hr) * self.params.current_margin_increment
+        ticker = self.market_historic.get_ticker(coin.n_alt)
+        is_valid_change = ticker.percentChange >= self.params.margin_increment_24h
+        is_valid_lowest_ask = ticker.lowestAsk <= (ticker.high24hr + ticker.low24hr) * self.params.current_margin_increment
         return is_valid_change and is_valid_lowest_ask
 
     #################################################
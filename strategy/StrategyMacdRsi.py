@@ -15,13 +15,18 @@
 
 import sys
 import time
-import numpy as np
-import talib
+from typing import Dict, List
 
 from api.Api import Api
+from domain import CandleStore
+from domain.CoinMarketData import CoinMarketData
 from domain.InfoAlt import InfoAlt
 from domain.MarketHistoric import MarketHistoric
 from domain.Parameters import Parameters
+from event.CandleClosed import CandleClosed
+from indicator import BatchIndicators
+from indicator.MacdIndicator import MacdIndicator
+from indicator.RsiIndicator import RsiIndicator
 from strategy.BaseStrategy import BaseStrategy
 from utils import Config
 from utils.LoggingUtils import LoggingUtils
@@ -30,6 +35,7 @@ from utils.Telegram import Telegram
 
 
 class StrategyMacdRsi(BaseStrategy):
+    candles_time_minutes = 15
 
     def __init__(self, params: Parameters, api: Api, telegram_bot: Telegram, market_historic: MarketHistoric):
         super().__init__(params, api, telegram_bot, market_historic)
@@ -40,13 +46,14 @@ class StrategyMacdRsi(BaseStrategy):
         self.update_market_timer = None
         self.print_status_timer = None
         self.num_currently_operating_alts = 0
-        self.candles_time_minutes = 15
+        self.max_historic_candles = 500
         self.logger = LoggingUtils()
 
     def pre_cycles_iterator(self) -> None:
-        self.populate_market_history()
         self.market_historic.start_candle_calculations(self.candles_time_minutes)
+        self.populate_market_history()
         self.print_coins_macd_status()
+        self.market_historic.events.subscribe(CandleClosed, self.on_candle_closed)
         self.api.subscribe_websocket(self.market_historic)
         self.print_status_timer = timer.RepeatedTimer(60, self.print_coins_macd_status)
         time.sleep(30)
@@ -64,15 +71,33 @@ class StrategyMacdRsi(BaseStrategy):
             self.print_status_timer.stop()
 
     def should_buy_coin(self, coin: InfoAlt) -> bool:
-        if self.num_currently_operating_alts >= self.params.max_alts_to_trade:
+        # Coins in BUY are placing their order (AsyncBotWorker places many at the same time), their slot is taken
+        if self.num_currently_operating_alts + self.params.coins_trader.count('BUY') >= self.params.max_alts_to_trade:
             return False
 
         # If we have the same number of Candles than when we last bought this coin, ignore it until next candle is calculated.
         if len(self.market_historic.get_coin_market_data(coin.n_alt).close) == coin.last_used_candle:
             return False
 
+        buy_signal = self.get_buy_signal(coin.n_alt)
+        if buy_signal is not None:
+            return buy_signal
         return self.analyze_macd_rsi(coin)
 
+    '''
+    Calculates MACD and RSI for all the coins at once, with the same conditions than analyze_macd_rsi.
+    '''
+    def calculate_buy_signals(self, coin_names: List[str]) -> Dict[str, bool]:
+        buy_signals = {}  # type: Dict[str, bool]
+        for names, (closes,) in self.market_historic.get_candles_matrices(coin_names, self.candles_time_minutes, self.params.macd_long_period * 2):
+            macd, macdsignal, macdhist = BatchIndicators.macd(closes, self.params.macd_short_period, self.params.macd_long_period, self.params.macd_smoothing)
+            rsi = BatchIndicators.rsi(closes, 14)
+            # Same conditions than analyze_macd_rsi, for every coin
+            case_1 = (macdhist[:, -1] > 0) & (rsi[:, -3] < 50) & (rsi[:, -2] <= 50) & (rsi[:, -1] > 50)
+            case_2 = (rsi[:, -1] > 50) & (macdhist[:, -3] < 0) & (macdhist[:, -2] <= 0) & (macdhist[:, -1] > 0)
+            buy_signals.update(zip(names, (case_1 | case_2).tolist()))
+        return buy_signals
+
     #################################################
     #                 NOTIFICATIONS                 #
     #################################################
@@ -97,24 +122,38 @@ class StrategyMacdRsi(BaseStrategy):
 
     def populate_market_history(self):
         self.logger.logging_info('OBTENIENDO LOS DATOS DE HISTORIAL DE LAS MONEDAS DEL EXCHANGE PARA EL ANÁLISIS TÉCNICO (MACD/RSI)')
+        # Use the candles stored on disk from previous executions, and only get from the exchange the ones after them
+        coins_historic = {}  # type: Dict[str, CoinMarketData]
+        historic_requests = {}  # type: Dict[str, int]
+        for coin in self.params.coins_trader:
+            coin_historic = self.market_historic.load_stored_candles(coin.n_alt, self.candles_time_minutes)
+            missing_candles = self.market_historic.count_missing_candles(coin_historic, self.candles_time_minutes)
+            if missing_candles < 0 or missing_candles >= self.max_historic_candles:
+                historic_requests[coin.n_alt] = self.max_historic_candles
+                continue
+            coins_historic[coin.n_alt] = coin_historic
+            if missing_candles > 0:
+                historic_requests[coin.n_alt] = missing_candles + 1
+        for coin_name, coin_historic in self.api.get_historic_values_many(historic_requests, self.candles_time_minutes):
+            if coin_name in coins_historic:
+                coin_historic = CandleStore.merge_candles(coins_historic[coin_name], coin_historic)
+            coins_historic[coin_name] = coin_historic
         for coin in self.params.coins_trader:
-            coin_historic = self.api.get_historic_values_fifteen_min(coin.n_alt)
+            coin_historic = coins_historic[coin.n_alt]
             if len(coin_historic.close) >= (self.params.macd_long_period * 2):
                 self.market_historic.set_coin_market_data(coin.n_alt, coin_historic)
             else:
                 self.logger.logging_info("NO SE HA PODIDO OBTENER LOS DATOS HISTORICOS DE {}".format(coin.n_alt))
                 sys.exit(0)
-            time.sleep(2)
         self.logger.logging_info('### INICIANDO BITTBOT CON LOS VALORES RECOGIDOS DEL EXCHANGE ###')
 
     def calculate_macd(self, coin: InfoAlt):
-        candles = np.array(self.market_historic.get_coin_market_data(coin.n_alt).close, dtype=float)
-        macd, macdsignal, macdhist = talib.MACD(candles, self.params.macd_short_period, self.params.macd_long_period, self.params.macd_smoothing)
+        macd, macdsignal, macdhist = self.market_historic.get_indicator(coin.n_alt, self.candles_time_minutes, MacdIndicator, self.params.macd_short_period, self.params.macd_long_period, self.params.macd_smoothing)
         return macd, macdsignal, macdhist
 
     def calculate_rsi(self, coin: InfoAlt):
-        candles = np.array(self.market_historic.get_coin_market_data(coin.n_alt).close, dtype=float)
-        return talib.RSI(candles)
+        rsi, = self.market_historic.get_indicator(coin.n_alt, self.candles_time_minutes, RsiIndicator, 14)
+        return rsi
 
     def analyze_macd_rsi(self, coin: InfoAlt):
         macd, macdsignal, macdhist = self.calculate_macd(coin)
@@ -19,6 +19,7 @@ import sys
 from pathlib import Path
 from domain import Parameters
 from domain import InfoAlt
+from domain.TickerSnapshot import TickerSnapshot
 from utils.LoggingUtils import LoggingUtils
 
 VERSION_MAJOR = 2
@@ -35,8 +36,23 @@ STRATEGY_AUTO_MARGIN = "4"
 
 API_KEYS_FILE = "apikeys.cfg"
 TELEGRAM_CONFIG_FILE = "telegram.cfg"
+CANDLES_DIRECTORY = "candles"  # Closed candles of every market stored between executions
+TICKS_DIRECTORY = "ticks"  # Journal of the websocket ticker updates, enabled with "Tick_Journal": true in the config
+HISTORIC_BACKFILL_WORKERS = 4  # Threads getting historic candles at the same time, limited by the Exchange rate limiter
+HISTORIC_MAX_RETRIES = 5
+BALANCE_CACHE_SECONDS = 30  # Balances older than this are read again from the Exchange
+ORDERS_HISTORY_SECONDS = 24 * 60 * 60  # Trades read to find the completed orders, older ones are asked order by order
+DEFAULT_HEARTBEAT_SECONDS = 10  # Max seconds between order checks of the worker, change it with "Heartbeat_Seconds" in the config
+ASYNC_WORKER_EXCHANGE_THREADS = 32  # Exchange calls at the same time of the "Async_Worker", limited by the Exchange rate limiter
+SHARED_MARKET_MAX_MARKETS = 512  # Markets of the market data shared with the worker processes ("Process": true workers)
+SHARED_MARKET_POLL_SECONDS = 0.1  # How often the worker processes look for new tickers and candles in the shared market data
+CHECKPOINT_DIRECTORY = "checkpoints"  # State of the workers to go on after a crash, enabled with "Checkpoint": true in the config
+CHECKPOINT_SNAPSHOT_SECONDS = 300  # How often the whole state is written, the changes in between go to the journal
+CHECKPOINT_JOURNAL_MAX_RECORDS = 1000  # Changes in the journal that force a new snapshot before its time
+LATENCY_REPORT_SECONDS = 600  # How often the summary of how long the Exchange calls, strategy hooks, ... take is logged
 
 logger = LoggingUtils()
+arguments = sys.argv  # Strategy parameters given in the command line, each worker of a "Workers" config has its own
 
 
 def read_config(fichero):
@@ -133,7 +149,7 @@ def get_balance_invest(api, alt):
     logger.logging_decorative('Entra saldo Maximo de {} a invertir. Maximo Disponible: {} {}'.format(alt, account_balance, alt))
 
     balance_invest = float(get_parameter_value('-s', 'Inversion:? '))
-    if get_argument_position(sys.argv, '-bypass_restrictions') > 0:
+    if get_argument_position(arguments, '-bypass_restrictions') > 0:
         return balance_invest
     while balance_invest <= 0.0 or balance_invest > account_balance:
         balance_invest = float(get_parameter_value('-s', 'Inversion:? '))
@@ -245,6 +261,18 @@ def populate_coins(params: Parameters):
         pos += 1
 
 
+# Removes from working_alts the alts without a market with altstr in the Exchange
+def remove_invalid_alt_pairs(params: Parameters, ticker_snapshot: TickerSnapshot):
+    existing_pairs = ticker_snapshot.select_markets(params.altstr, alt_coins=params.working_alts)
+    not_existing_alts = [alt for alt in params.working_alts if params.altstr + '_' + alt not in existing_pairs]
+    if len(not_existing_alts) > 0:
+        logger.logging_line_char("-")
+        for al in not_existing_alts:
+            logger.logging_warning('LA COMBINACION {}_{} NO EXISTE EN EL EXCHANGE, ELIMINANDOLA DE LA LISTA'.format(params.altstr, al))
+            params.working_alts.remove(al)
+        logger.logging_line_char("-")
+
+
 ######################
 # Auxiliar functions #
 ######################
@@ -258,10 +286,16 @@ def get_argument_position(arguments, search_argument):
     return -1
 
 
+# The strategy parameters are read from these arguments until they are set again
+def set_arguments(new_arguments):
+    global arguments
+    arguments = new_arguments
+
+
 def get_parameter_value(arg_name, ask_phrase):
-    pos = get_argument_position(sys.argv, arg_name)
+    pos = get_argument_position(arguments, arg_name)
     if pos > 0:
-        value = sys.argv[pos + 1]
+        value = arguments[pos + 1]
     else:
         value = input(ask_phrase).strip()
     return value
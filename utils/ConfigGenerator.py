@@ -13,13 +13,11 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
-from typing import List
-
 from api import Api
 from api.bittrex import Bittrex
 from api.poloniex import Poloniex
 from domain import InfoAlt
-from domain.TickerData import TickerData
+from domain.TickerSnapshot import TickerSnapshot
 from domain.Parameters import Parameters
 
 
@@ -53,19 +51,18 @@ class ConfigGenerator(object):
 
     def populate_alts_from_ticker(self):
         alts = []
-        ticker = self.api.get_full_ticker()  # type: List[TickerData]
-        for ticker_alt in ticker:
-            if ticker_alt.marketName.find(self.main_alt) != 0:  # We want ALT_*** only, so we want it in position 0
-                continue
+        ticker_snapshot = TickerSnapshot()
+        ticker_snapshot.update(self.api.get_full_ticker())
+        for market_id in ticker_snapshot.select_market_ids(self.main_alt):  # We want ALT_*** only
             alt = InfoAlt.InfoAlt()
-            alt.n_alt = ticker_alt.marketName
-            alt.baseVolume = ticker_alt.baseVolume
-            alt.high24hr = ticker_alt.high
-            alt.low24hr = ticker_alt.low
-            alt.percentChange = ticker_alt.percentChange
-            alt.lowestAsk = ticker_alt.ask
-            alt.highestBid = ticker_alt.bid
-            alt.last = ticker_alt.last
+            alt.n_alt = ticker_snapshot.market_names[market_id]
+            alt.baseVolume = float(ticker_snapshot.base_volume[market_id])
+            alt.high24hr = float(ticker_snapshot.high[market_id])
+            alt.low24hr = float(ticker_snapshot.low[market_id])
+            alt.percentChange = float(ticker_snapshot.percent_change[market_id])
+            alt.lowestAsk = float(ticker_snapshot.ask[market_id])
+            alt.highestBid = float(ticker_snapshot.bid[market_id])
+            alt.last = float(ticker_snapshot.last[market_id])
             alts.append(alt)
 
         return alts
@@ -0,0 +1,54 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+from typing import List
+
+# Bucket i has the durations up to 2^i microseconds, the last one everything longer (2^30 us is ~18 minutes)
+NUM_BUCKETS = 31
+
+
+class LatencyHistogram(object):
+    '''
+    Durations of an operation in buckets of powers of two microseconds. Adding one is a few integer operations, and
+    the percentiles are approximated to the upper limit of their bucket (at most twice the real value).
+    '''
+    def __init__(self):
+        self.buckets = [0] * NUM_BUCKETS  # type: List[int]
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.buckets[min(int(seconds * 1000000).bit_length(), NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.count if self.count > 0 else 0.0
+
+    '''
+    Returns the duration under which are the given fraction (0.5, 0.99) of the durations added.
+    '''
+    def percentile_seconds(self, fraction: float) -> float:
+        needed = fraction * self.count
+        accumulated = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            accumulated += bucket_count
+            if accumulated >= needed and accumulated > 0:
+                return min((1 << bucket) / 1000000, self.max_seconds)
+        return self.max_seconds
@@ -0,0 +1,46 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+import time
+
+from utils.LatencyStats import latency_stats
+
+
+class LatencyProxy(object):
+    '''
+    Stands for target, measuring in latency_stats how long its methods take, as "<name>.<method>". The rest of the
+    attributes are read from target. Setting attributes must be done in target itself.
+    '''
+    def __init__(self, target, name: str):
+        self._target = target
+        self._name = name
+
+    def __getattr__(self, attribute_name):
+        value = getattr(self._target, attribute_name)
+        if not callable(value):
+            return value
+        stat_name = '{}.{}'.format(self._name, attribute_name)
+
+        def measured(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return value(*args, **kwargs)
+            finally:
+                latency_stats.record(stat_name, time.perf_counter() - start)
+
+        # Methods don't change, the next calls don't go through __getattr__
+        self.__dict__[attribute_name] = measured
+        return measured
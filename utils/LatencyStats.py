@@ -0,0 +1,78 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict
+
+from utils import Config
+from utils.LatencyHistogram import LatencyHistogram
+from utils.LoggingUtils import LoggingUtils
+
+
+class LatencyStats(object):
+    '''
+    Histograms of how long the operations of the bot take (Exchange calls, strategy hooks, notifications...), by
+    name, to find the slow ones in production. A summary is logged every Config.LATENCY_REPORT_SECONDS and the
+    histograms start again, so every summary is about the last interval.
+    There is one for the whole process (latency_stats), shared by all the workers.
+    '''
+    def __init__(self):
+        self.histograms = {}  # type: Dict[str, LatencyHistogram]
+        self.lock = Lock()
+        self.last_report_time = time.monotonic()
+        self.logger = LoggingUtils()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report_if_due(self) -> None:
+        if time.monotonic() - self.last_report_time >= Config.LATENCY_REPORT_SECONDS:
+            self.report()
+
+    '''
+    Logs the operations measured since the last report, the ones with more total time first.
+    '''
+    def report(self) -> None:
+        with self.lock:
+            histograms = self.histograms
+            self.histograms = {}
+            interval_seconds = time.monotonic() - self.last_report_time
+            self.last_report_time = time.monotonic()
+        if len(histograms) == 0:
+            return
+        self.logger.logging_info('LATENCIAS DE LOS ULTIMOS {:.0f} SEGUNDOS (ms):'.format(interval_seconds))
+        for name, histogram in sorted(histograms.items(), key=lambda item: item[1].total_seconds, reverse=True):
+            self.logger.logging_info('{}: {} llamadas, total {:.1f} - media {:.2f} - p50 {:.2f} - p90 {:.2f} - p99 {:.2f} - max {:.2f}'.format(
+                name, histogram.count, histogram.total_seconds * 1000, histogram.mean_seconds() * 1000,
+                histogram.percentile_seconds(0.5) * 1000, histogram.percentile_seconds(0.9) * 1000,
+                histogram.percentile_seconds(0.99) * 1000, histogram.max_seconds * 1000))
+
+
+latency_stats = LatencyStats()
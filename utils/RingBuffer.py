@@ -0,0 +1,86 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+
+class RingBuffer(object):
+    '''
+    Fixed capacity float64 buffer that keeps only the last 'capacity' values appended.
+    The storage is allocated with twice the capacity, so the stored values are always contiguous in memory and
+    view() can return them without copying (talib can use it directly). When the end of the storage is reached, the
+    last values are copied to the beginning of a new storage, which happens once every 'capacity' appends.
+    Values in the storage are never overwritten, so a view keeps its values while new ones are appended from another
+    thread. There must be only one thread writing.
+    '''
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # Storage, start and end are replaced together, so readers never see a mix of old and new ones.
+        # The storage is allocated on first write, so empty buffers don't use memory
+        self._state = (None, 0, 0)
+
+    def __len__(self) -> int:
+        _, start, end = self._state
+        return end - start
+
+    def __getitem__(self, item):
+        return self.view()[item]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def append(self, value: float) -> None:
+        data, start, end = self._state
+        if data is None:
+            data = np.empty(self.capacity * 2, dtype=np.float64)
+        elif end == len(data):
+            data, start, end = self._compact(data, start, end)
+        data[end] = value
+        end += 1
+        if end - start > self.capacity:
+            start += 1
+        self._state = (data, start, end)
+
+    def extend(self, values) -> None:
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        if len(values) == 0:
+            return
+        data, start, end = self._state
+        if data is None:
+            data = np.empty(self.capacity * 2, dtype=np.float64)
+        elif end + len(values) > len(data):
+            data, start, end = self._compact(data, start, end)
+        data[end:end + len(values)] = values
+        end += len(values)
+        if end - start > self.capacity:
+            start = end - self.capacity
+        self._state = (data, start, end)
+
+    def clear(self) -> None:
+        # Views of the current values must stay valid, so new values will go to a new storage
+        self._state = (None, 0, 0)
+
+    def view(self) -> np.ndarray:
+        data, start, end = self._state
+        if data is None:
+            return np.empty(0, dtype=np.float64)
+        return data[start:end]
+
+    def _compact(self, data, start, end):
+        # Copy the last 'capacity' values to the beginning of a new storage
+        keep = min(end - start, self.capacity)
+        compacted = np.empty(self.capacity * 2, dtype=np.float64)
+        compacted[0:keep] = data[end - keep:end]
+        return compacted, 0, keep
@@ -0,0 +1,322 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from api.Api import Api
+from domain.InfoAlt import InfoAlt
+from domain.MarketHistoric import MarketHistoric
+from domain.OrdersSnapshot import OrdersSnapshot
+from domain.Parameters import Parameters
+from event.CandleClosed import CandleClosed
+from event.OrderUpdated import OrderUpdated
+from event.TickerUpdated import TickerUpdated
+from utils import Config
+from utils.LatencyStats import latency_stats
+from utils.Telegram import Telegram
+from worker.BotWorker import BotWorker
+
+
+class AsyncBotWorker(BotWorker):
+    '''
+    Runs the order state machine of every coin as its own asyncio task, so a slow Exchange call of one coin doesn't
+    delay the others. Tasks are woken up by the market and order events of their coin and on every heartbeat.
+    The Exchange and Telegram calls are run in a thread pool, and everything else (the strategy, the coins and the
+    results) is only used from the event loop thread, so it needs no locks. The exception are the strategy hooks
+    run on every heartbeat, which may call the Exchange: they run in the thread pool while every coin task is paused
+    (see run_strategy_hook).
+    Enabled with "Async_Worker": true in the config.
+    '''
+    def __init__(self, params: Parameters, api: Api, market_historic: MarketHistoric = None, telegram_bot: Telegram = None):
+        super().__init__(params, api, market_historic, telegram_bot)
+        self.loop = None  # type: asyncio.AbstractEventLoop
+        self.executor = ThreadPoolExecutor(max_workers=Config.ASYNC_WORKER_EXCHANGE_THREADS)
+        # Event of each coin task, set to wake it up
+        self.coin_wake_ups = {}  # type: Dict[str, asyncio.Event]
+        # Coins that have to check their orders when they wake up, with the snapshot to use (None to ask the Exchange)
+        self.coins_to_check = {}  # type: Dict[str, Optional[OrdersSnapshot]]
+        self.finished = None  # type: asyncio.Event
+        # A strategy hook runs in the thread pool only when no coin step is running, and coin steps don't start
+        # while it runs. Both guarded by strategy_condition, created with the event loop.
+        self.strategy_hook_running = False
+        self.coin_steps_running = 0
+        self.strategy_condition = None  # type: asyncio.Condition
+
+    def operate(self):
+        self.strategy.pre_cycles_iterator()
+        self.restore_checkpoint()
+
+        self.logger.print_init_bot()
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self.run_cycles())
+        finally:
+            self.loop.close()
+            self.executor.shutdown()
+
+        self.strategy.post_cycles_iterator()
+        self.close_checkpoint()
+        if self.owns_market_data:
+            self.api.close_tick_journal()
+            self.market_historic.flush_candle_store()
+        self.print_results()
+        if self.owns_market_data:
+            latency_stats.report()
+
+    async def run_cycles(self):
+        self.finished = asyncio.Event()
+        self.strategy_condition = asyncio.Condition()
+        self.market_historic.events.subscribe(TickerUpdated, self.on_market_event)
+        self.market_historic.events.subscribe(CandleClosed, self.on_market_event)
+        self.market_historic.events.subscribe(OrderUpdated, self.on_order_event)
+        coin_tasks = []
+        try:
+            while self.global_cycles < self.params.cycles:
+                # Heartbeat: strategy housekeeping and tasks for the coins added or removed by the strategy
+                with latency_stats.measure('AsyncBotWorker.heartbeat'):
+                    await self.run_strategy_hook(self.strategy.pre_coins_interator)
+                    self.strategy.evaluate_buy_signals(self.params.coins_trader)
+                    self.logger.logging_result('CICLOS: {}/{} -- Tot. Ciclos Benef: {} - Tot. Ciclos Perd: {} -- Beneficio: {}'.format(self.global_cycles, self.params.cycles, self.num_profit_cycles, self.num_losses_cycles, self.total_profit))
+                    coin_tasks.extend(self.update_coin_tasks())
+                    await self.heartbeat_coins()
+                try:
+                    await asyncio.wait_for(self.finished.wait(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                with latency_stats.measure('AsyncBotWorker.post_heartbeat'):
+                    await self.run_strategy_hook(self.strategy.post_coins_interator)
+                    coin_tasks.extend(self.update_coin_tasks())
+                    self.save_checkpoint()
+                latency_stats.report_if_due()
+        finally:
+            self.market_historic.events.unsubscribe(TickerUpdated, self.on_market_event)
+            self.market_historic.events.unsubscribe(CandleClosed, self.on_market_event)
+            self.market_historic.events.unsubscribe(OrderUpdated, self.on_order_event)
+            # Coin tasks end once their current step is done, so no order is left half placed
+            for wake_up in self.coin_wake_ups.values():
+                wake_up.set()
+            self.coin_wake_ups = {}
+            await asyncio.gather(*coin_tasks, return_exceptions=True)
+
+    '''
+    Runs a pre_coins_interator or post_coins_interator hook of the strategy in the thread pool, as they may call the
+    Exchange (BBands gets the historic candles of the new coins) and the event loop keeps receiving the events
+    meanwhile. The hooks change the coins and the strategy state that the coin steps use (StrategyAutoMargin resets
+    alts_borrar, that sell_order_completed appends to), so the hook waits for the coin steps running to finish and
+    no coin step starts until the hook has finished.
+    '''
+    async def run_strategy_hook(self, hook):
+        async with self.strategy_condition:
+            self.strategy_hook_running = True
+            await self.strategy_condition.wait_for(lambda: self.coin_steps_running == 0)
+        try:
+            await self.call(hook)
+        finally:
+            async with self.strategy_condition:
+                self.strategy_hook_running = False
+                self.strategy_condition.notify_all()
+
+    '''
+    Runs a step of the coin when no strategy hook is running, unless the hook has removed the coin meanwhile.
+    '''
+    async def run_coin_step(self, coin: InfoAlt, check_orders: bool, orders_snapshot: Optional[OrdersSnapshot]):
+        async with self.strategy_condition:
+            await self.strategy_condition.wait_for(lambda: not self.strategy_hook_running)
+            if self.params.coins_trader.get(coin.n_alt) is not coin:
+                return
+            self.coin_steps_running += 1
+        try:
+            await self.process_coin_async(coin, check_orders, orders_snapshot)
+        finally:
+            async with self.strategy_condition:
+                self.coin_steps_running -= 1
+                self.strategy_condition.notify_all()
+
+    '''
+    Starts a task for each new coin in coins_trader, and stops the tasks of the coins no longer in it.
+    Returns the new tasks.
+    '''
+    def update_coin_tasks(self):
+        coin_names = set(coin.n_alt for coin in self.params.coins_trader)
+        for coin_name in list(self.coin_wake_ups):
+            if coin_name not in coin_names:
+                self.coin_wake_ups.pop(coin_name).set()
+        new_tasks = []
+        for coin in self.params.coins_trader:
+            if coin.n_alt not in self.coin_wake_ups:
+                self.coin_wake_ups[coin.n_alt] = asyncio.Event()
+                new_tasks.append(self.loop.create_task(self.run_coin(coin)))
+        return new_tasks
+
+    async def run_coin(self, coin: InfoAlt):
+        wake_up = self.coin_wake_ups[coin.n_alt]
+        while self.global_cycles < self.params.cycles:
+            await wake_up.wait()
+            if self.coin_wake_ups.get(coin.n_alt) is not wake_up:
+                break
+            wake_up.clear()
+            check_orders = coin.n_alt in self.coins_to_check
+            orders_snapshot = self.coins_to_check.pop(coin.n_alt, None)
+            try:
+                # Including the waits for the Exchange and Telegram calls of the coin
+                with latency_stats.measure('AsyncBotWorker.process_coin'):
+                    await self.run_coin_step(coin, check_orders, orders_snapshot)
+            except Exception:
+                self.logger.logging_bittbot_error('PROCESAR LA ALT {}'.format(coin.n_alt))
+            if self.global_cycles >= self.params.cycles:
+                self.finished.set()
+
+    '''
+    Wakes up all the coins, like a cycle of BotWorker. The orders of the coins waiting for them are read at once and
+    checked with the snapshot (or asked one by one to the Exchange if it can't be read).
+    '''
+    async def heartbeat_coins(self):
+        orders_snapshot = None
+        if self.is_any_coin_waiting_orders():
+            orders_snapshot = await self.call(self.api.get_orders_snapshot)
+        for coin in self.params.coins_trader:
+            wake_up = self.coin_wake_ups.get(coin.n_alt)
+            if wake_up is not None:
+                if coin.operation_type in ['WAIT_BUY', 'WAIT_SELL']:
+                    # An order event received meanwhile is newer than the snapshot
+                    self.coins_to_check.setdefault(coin.n_alt, orders_snapshot)
+                wake_up.set()
+
+    async def process_coin_async(self, coin: InfoAlt, check_orders: bool, orders_snapshot: Optional[OrdersSnapshot]):
+        if coin.operation_type == 'NO_ORDER':
+            # Only check for potential new buys if with this new buy we won't surpass max cycles.
+            if self.params.coins_trader.num_open_orders() + self.global_cycles < self.params.cycles:
+                if self.strategy.should_buy_coin(coin):
+                    coin.operation_type = 'BUY'
+
+        # A new order is not checked until the next pass, it's not going to be completed yet
+        placed = False
+        if coin.operation_type == 'BUY':
+            placed = await self.do_buy_async(coin)
+            if placed:
+                self.strategy.buy_order_placed_at_exchange(coin)
+                await self.send_message('[{}] Orden de compra creada a {}'.format(coin.n_alt, coin.last_buy_price))
+            else:
+                # Release its slot for the coins deciding meanwhile, it's decided again on its next wake up
+                coin.operation_type = 'NO_ORDER'
+
+        if coin.operation_type == 'WAIT_BUY':
+            bought = await self.do_wait_for_buy_to_complete_async(coin, check_orders and not placed, orders_snapshot)
+            if bought:
+                self.strategy.buy_order_completed(coin)
+                await self.send_message('[{}] Compra realizada correctamente a {}!'.format(coin.n_alt, coin.last_buy_price))
+
+        if coin.operation_type == 'SELL':
+            placed = await self.do_sell_async(coin)
+            if placed:
+                self.strategy.sell_order_placed_at_exchange(coin)
+                await self.send_message('[{}] Orden de venta creada a {}'.format(coin.n_alt, coin.last_sell_price))
+
+        if coin.operation_type == 'WAIT_SELL':
+            sold = await self.do_wait_for_sell_to_complete_async(coin, check_orders and not placed, orders_snapshot)
+            if sold:
+                self.strategy.sell_order_completed(coin)
+                await self.send_message('[{}] Venta finalizada correctamente a {}!'.format(coin.n_alt, coin.last_sell_price))
+
+        # Order moves and changes made by the strategy
+        self.checkpoint_coin(coin)
+
+    async def do_buy_async(self, coin: InfoAlt):
+        ticker = self.market_historic.get_ticker(coin.n_alt)
+        num_last_order, buy_price = await self.call(self.api.order_buy, coin.n_alt, ticker.lowestAsk, self.params.saldo_inv)
+        if num_last_order is not None:
+            self.set_buy_order(coin, num_last_order, buy_price)
+            return True
+        return False
+
+    async def do_wait_for_buy_to_complete_async(self, coin: InfoAlt, check_orders: bool, orders_snapshot: Optional[OrdersSnapshot]):
+        if check_orders and await self.is_order_completed_async(coin, orders_snapshot):
+            self.set_buy_completed(coin)
+            return True
+        ticker = self.market_historic.get_ticker(coin.n_alt)
+        if self.is_buy_price_outdated(coin, ticker):
+            mv_num_orden = await self.call(self.api.order_move, coin.num_last_orden, ticker.lowestAsk, coin.operation_type)
+            if mv_num_orden is not None:
+                coin.last_buy_price = ticker.lowestAsk
+                coin.num_last_orden = mv_num_orden
+        elif check_orders:
+            self.log_waiting_order(coin, coin.last_buy_price)
+        return False
+
+    async def do_sell_async(self, coin: InfoAlt):
+        saldo_inv_alt = await self.call(self.api.get_balance, coin.n_alt)
+        if saldo_inv_alt is not None and saldo_inv_alt <= 0:
+            # The cached balance may not have the last fill yet
+            saldo_inv_alt = await self.call(self.api.get_balance, coin.n_alt, True)
+        # The ticker is read after the balance call, so the price is the current one
+        sell_price = self.get_sell_price(coin, self.market_historic.get_ticker(coin.n_alt))
+
+        if saldo_inv_alt is not None and saldo_inv_alt > 0:
+            order_id = await self.call(self.api.order_sell, coin.n_alt, sell_price, saldo_inv_alt)
+            if order_id is not None:
+                self.set_sell_order(coin, order_id, sell_price, saldo_inv_alt)
+                return True
+        else:
+            self.log_insufficient_balance(coin)
+        return False
+
+    async def do_wait_for_sell_to_complete_async(self, coin: InfoAlt, check_orders: bool, orders_snapshot: Optional[OrdersSnapshot]):
+        if check_orders and await self.is_order_completed_async(coin, orders_snapshot):
+            self.set_sell_completed(coin)
+            return True
+        ticker = self.market_historic.get_ticker(coin.n_alt)
+        if self.is_stop_loss_reached(coin, ticker):
+            self.logger.logging_info('STOP LOSS: MOVIENDO LA ORDEN A PARA CERRAR CON PERDIDAS')
+            mv_num_orden = await self.call(self.api.order_move, coin.num_last_orden, ticker.highestBid, coin.operation_type)
+            if mv_num_orden is not None:
+                coin.last_sell_price = ticker.highestBid
+                coin.num_last_orden = mv_num_orden
+        elif check_orders:
+            self.log_waiting_order(coin, coin.last_sell_price)
+        return False
+
+    async def is_order_completed_async(self, coin: InfoAlt, orders_snapshot: Optional[OrdersSnapshot]) -> bool:
+        completed = self.get_known_order_state(coin, orders_snapshot)
+        if completed is not None:
+            return completed
+        if not await self.call(self.api.hist_exists, coin.n_alt, coin.num_last_orden):
+            return False
+        return not await self.call(self.api.open_orders, coin.n_alt, coin.num_last_orden)
+
+    async def send_message(self, text: str):
+        await self.call(self.telegram_bot.send_message, text)
+
+    '''
+    Runs a blocking call (Exchange, Telegram) in the thread pool without blocking the event loop.
+    '''
+    async def call(self, function, *args):
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    def on_market_event(self, event) -> None:
+        self.loop.call_soon_threadsafe(self.wake_up_coins, event.market_names, False)
+
+    def on_order_event(self, event: OrderUpdated) -> None:
+        self.loop.call_soon_threadsafe(self.wake_up_coins, self.get_order_market_names(event), True)
+
+    def wake_up_coins(self, market_names, check_orders: bool) -> None:
+        for market_name in market_names:
+            wake_up = self.coin_wake_ups.get(market_name)
+            if wake_up is not None:
+                if check_orders:
+                    self.coins_to_check[market_name] = None
+                wake_up.set()
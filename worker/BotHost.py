@@ -0,0 +1,285 @@
+#  This file is part of Bittbot.
+#
+#  Bittbot is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bittbot is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
+
+
+import copy
+import multiprocessing
+import os
+import sys
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from threading import Thread
+from typing import Dict, List, Optional, Tuple
+
+from api import ExchangeFactory
+from api.Api import Api
+from api.SharedMarketFeed import SharedMarketFeed
+from domain.CoinMarketData import CANDLE_HISTORY_CAPACITY
+from domain.CoinRegistry import CoinRegistry
+from domain.MarketHistoric import MarketHistoric
+from domain.Parameters import Parameters
+from domain.SharedMarketData import SharedMarketData, create_shared_market_data
+from domain.SharedMarketPublisher import SharedMarketPublisher
+from domain.TickerSnapshot import TickerSnapshot
+from utils import Config
+from utils.LatencyStats import latency_stats
+from utils.LoggingUtils import LoggingUtils
+from utils.Telegram import Telegram
+from worker.AsyncBotWorker import AsyncBotWorker
+from worker.BotWorker import BotWorker
+
+# Keys of a worker in the config that are not config values
+WORKER_KEYS = ["Strategy", "Arguments", "Process", "Shard"]
+
+
+class BotHost(object):
+    '''
+    Runs many workers in the same process, each one with its own strategy, parameters, coins and results, configured
+    in "Workers" of the config:
+        "Workers": [{"Strategy": "2", "Arguments": ["-s", "0.01", ...], "Exchange": "Bittrex", "Coins": [...]}, ...]
+    "Arguments" are the command line arguments of the strategy, and any other key replaces the one of the config for
+    that worker, so the workers can trade in different exchanges at once.
+    The workers of an exchange share its Api (websocket, REST client, rate limiter and balances), and the workers of an
+    exchange with the same candle timeframe share the market historic, so its candles and indicators are calculated
+    once. The REST clients send their private calls one at a time, so the nonces of all the workers arrive in order.
+    All the workers share the Telegram bot and the logger, and their results are summed up at the end.
+    Workers with "Process": true run in their own process, to use more than one core for the strategies. This process
+    keeps the websocket and the market historic, and shares its tickers and candles with them in shared memory (see
+    SharedMarketData). With "Shard": [index, count] the worker only gets the markets of that shard, so the coins can
+    be split between many processes. Process workers read the parameters of their strategy only from "Arguments".
+    '''
+    def __init__(self, params: Parameters, api: Api, api_keys):
+        self.params = params
+        self.api_keys = api_keys
+        self.logger = LoggingUtils()
+        self.telegram_bot = Telegram()
+        # Api and full ticker of each exchange, created when the first worker of the exchange needs them
+        self.apis = {}  # type: Dict[str, Api]
+        self.ticker_snapshots = {}  # type: Dict[str, TickerSnapshot]
+        # Market historic of each exchange and candle timeframe (None when no worker calculates candles)
+        self.market_historics = {}  # type: Dict[Tuple[str, Optional[int]], MarketHistoric]
+        self.workers = []  # type: List[BotWorker]
+        # Process workers, and the market data shared with them for each market historic
+        self.processes = []  # type: List[BaseProcess]
+        self.shared_market_data = {}  # type: Dict[Tuple[str, Optional[int]], SharedMarketData]
+        self.publishers = []  # type: List[SharedMarketPublisher]
+        self.add_api(self.params.config["Exchange"], api)
+
+    def run(self):
+        worker_configs = self.params.config["Workers"]
+        strategy_classes = [BotWorker.get_strategy_class(worker_config.get("Strategy")) for worker_config in worker_configs]
+        # Market historics with candles first, so the workers that only need the ticker use one of them
+        for worker_config, strategy_class in zip(worker_configs, strategy_classes):
+            if strategy_class is not None and strategy_class.candles_time_minutes is not None:
+                self.get_market_historic(self.get_worker_exchange(worker_config), strategy_class.candles_time_minutes)
+
+        # Parameters are asked one worker after another, they may be read from the console
+        for worker_config, strategy_class in zip(worker_configs, strategy_classes):
+            if strategy_class is None:
+                self.logger.logging_error("[ERROR] {} No es una estrategia válida para un worker.".format(worker_config.get("Strategy")))
+                continue
+            exchange = self.get_worker_exchange(worker_config)
+            if self.get_api(exchange) is None:
+                self.logger.logging_error("[ERROR] El exchange {} del worker no está soportado.".format(exchange))
+                continue
+            num_worker = len(self.workers) + len(self.processes) + 1
+            if worker_config.get("Process", False):
+                self.logger.logging_info('PREPARANDO EL WORKER {} CON LA ESTRATEGIA {} EN {} (PROCESO PROPIO)'.format(num_worker, worker_config["Strategy"], exchange))
+                self.processes.append(self.create_process_worker(worker_config, strategy_class, num_worker))
+                continue
+            self.logger.logging_info('PREPARANDO EL WORKER {} CON LA ESTRATEGIA {} EN {}'.format(num_worker, worker_config["Strategy"], exchange))
+            worker = self.create_worker(worker_config, strategy_class, num_worker)
+            Config.set_arguments([sys.argv[0]] + worker_config.get("Arguments", []))
+            try:
+                worker.prepare()
+            finally:
+                Config.set_arguments(sys.argv)
+            self.workers.append(worker)
+
+        try:
+            for process in self.processes:
+                process.start()
+            threads = []
+            for worker in self.workers:
+                thread = Thread(target=self.run_worker, args=(worker,), name='Worker-{}'.format(len(threads) + 1))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+            # With a timeout, so the main thread still gets the KeyboardInterrupt
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+            for process in self.processes:
+                while process.is_alive():
+                    process.join(1)
+        finally:
+            self.close_shared_market_data()
+        for api in self.apis.values():
+            api.close_tick_journal()
+        for market_historic in self.market_historics.values():
+            market_historic.flush_candle_store()
+        self.print_results()
+
+    def run_worker(self, worker: BotWorker):
+        try:
+            worker.operate()
+        except Exception:
+            self.logger.logging_exception("Worker {} Crashed".format(self.workers.index(worker) + 1))
+
+    def create_worker(self, worker_config, strategy_class, num_worker: int) -> BotWorker:
+        worker_params = self.create_worker_params(worker_config, num_worker)
+        exchange = worker_params.config["Exchange"]
+        api = self.get_api(exchange)
+        market_historic = self.get_market_historic(exchange, strategy_class.candles_time_minutes)
+        if worker_params.config.get("Async_Worker", False):
+            return AsyncBotWorker(worker_params, api, market_historic, self.telegram_bot)
+        return BotWorker(worker_params, api, market_historic, self.telegram_bot)
+
+    def create_process_worker(self, worker_config, strategy_class, num_worker: int) -> BaseProcess:
+        worker_params = self.create_worker_params(worker_config, num_worker)
+        shared_data = self.get_shared_market_data(worker_params.config["Exchange"], strategy_class.candles_time_minutes)
+        shard_index, shard_count = worker_config.get("Shard", [0, 1])
+        arguments = [sys.argv[0]] + worker_config.get("Arguments", [])
+        # Spawned, not forked: this process already has the threads of the websocket and the timers
+        context = multiprocessing.get_context('spawn')
+        return context.Process(target=run_process_worker, name='Worker-{}'.format(num_worker),
+                               args=(worker_params, self.api_keys, arguments, shared_data.name, shard_index, shard_count))
+
+    def create_worker_params(self, worker_config, num_worker: int) -> Parameters:
+        worker_params = copy.copy(self.params)
+        worker_params.config = dict(self.params.config)
+        worker_params.config.update({key: value for key, value in worker_config.items() if key not in WORKER_KEYS})
+        # Every worker has its own checkpoint, a name in the main config would be shared by all of them
+        worker_params.config["Checkpoint_Name"] = worker_config.get("Checkpoint_Name", "{}_worker{}".format(Path(self.params.config_file).stem, num_worker))
+        worker_params.config["WorkingAlts"] = list(worker_params.config["Coins"])
+        worker_params.funcionamiento = worker_config["Strategy"]
+        worker_params.api_key = self.api_keys[worker_params.config["Exchange"] + "_ApiKey"]
+        worker_params.altstr = worker_params.config["Alt_Coin"]
+        worker_params.working_alts = worker_params.config["WorkingAlts"]
+        worker_params.coins_trader = CoinRegistry()
+        Config.remove_invalid_alt_pairs(worker_params, self.ticker_snapshots[worker_params.config["Exchange"]])
+        return worker_params
+
+    def get_worker_exchange(self, worker_config):
+        return worker_config.get("Exchange", self.params.config["Exchange"])
+
+    '''
+    Returns the Api of the exchange, created the first time, or None if the exchange is not supported.
+    '''
+    def get_api(self, exchange) -> Optional[Api]:
+        if exchange not in self.apis:
+            api = ExchangeFactory.create_api(self.params, exchange, self.api_keys)
+            if api is None:
+                return None
+            self.add_api(exchange, api)
+        return self.apis[exchange]
+
+    def add_api(self, exchange, api: Api):
+        if self.params.config.get("Tick_Journal", False):
+            api.enable_tick_journal(os.path.join(Config.TICKS_DIRECTORY, exchange))
+        ticker_snapshot = TickerSnapshot()
+        ticker_snapshot.update(api.get_full_ticker())
+        self.apis[exchange] = api
+        self.ticker_snapshots[exchange] = ticker_snapshot
+
+    '''
+    Returns the market historic of the exchange for the candles of candle_time_minutes, created the first time.
+    Without candles (None) any market historic of the exchange is valid, they all have its ticker.
+    '''
+    def get_market_historic(self, exchange, candles_time_minutes: Optional[int]) -> MarketHistoric:
+        key = self.get_market_historic_key(exchange, candles_time_minutes)
+        if key not in self.market_historics:
+            market_historic = MarketHistoric()
+            market_historic.enable_candle_store(os.path.join(Config.CANDLES_DIRECTORY, exchange))
+            self.market_historics[key] = market_historic
+        return self.market_historics[key]
+
+    def get_market_historic_key(self, exchange, candles_time_minutes: Optional[int]) -> Tuple[str, Optional[int]]:
+        if candles_time_minutes is None:
+            for key in self.market_historics:
+                if key[0] == exchange:
+                    return key
+        return exchange, candles_time_minutes
+
+    '''
+    Returns the market data of the market historic of the exchange and candle_time_minutes shared with the process
+    workers. The first time, the market historic starts calculating its candles and is fed by the websocket, even
+    if no worker of this process uses it.
+    '''
+    def get_shared_market_data(self, exchange, candles_time_minutes: Optional[int]) -> SharedMarketData:
+        key = self.get_market_historic_key(exchange, candles_time_minutes)
+        if key not in self.shared_market_data:
+            market_historic = self.get_market_historic(exchange, candles_time_minutes)
+            if key[1] is not None:
+                market_historic.start_candle_calculations(key[1])
+            name = 'bittbot_{}_{}_{}'.format(os.getpid(), exchange.lower(), key[1] if key[1] is not None else 'ticker')
+            shared_data = create_shared_market_data(name, Config.SHARED_MARKET_MAX_MARKETS, CANDLE_HISTORY_CAPACITY if key[1] is not None else 0)
+            self.publishers.append(SharedMarketPublisher(market_historic, shared_data))
+            self.shared_market_data[key] = shared_data
+            self.get_api(exchange).subscribe_websocket(market_historic)
+        return self.shared_market_data[key]
+
+    def close_shared_market_data(self):
+        for publisher in self.publishers:
+            publisher.close()
+        for shared_data in self.shared_market_data.values():
+            shared_data.close()
+            shared_data.unlink()
+        self.publishers = []
+        self.shared_market_data = {}
+
+    def print_results(self):
+        self.logger.logging_empty_line()
+        self.logger.logging_line_char("-")
+        total_profit = {}  # type: Dict[str, float]
+        for n, worker in enumerate(self.workers):
+            exchange = worker.params.config["Exchange"]
+            self.logger.logging_info('WORKER {} ({} EN {}): CICLOS {}/{} -- Benef: {} - Perd: {} -- Beneficio: {}'.format(
+                n + 1, worker.params.funcionamiento, exchange, worker.global_cycles, worker.params.cycles,
+                worker.num_profit_cycles, worker.num_losses_cycles, worker.total_profit))
+            total_profit[exchange] = total_profit.get(exchange, 0.0) + worker.total_profit
+        for process in self.processes:
+            # Their results are logged by themselves
+            self.logger.logging_info('{} (PROCESO PROPIO): FINALIZADO CON CODIGO {}'.format(process.name.upper(), process.exitcode))
+        for exchange, profit in total_profit.items():
+            self.logger.logging_info('BENEFICIO TOTAL EN {}: {}'.format(exchange, profit))
+        self.logger.logging_line_char("-")
+        # Of the workers in this process, the ones in their own process report their latencies by themselves
+        latency_stats.report()
+
+
+'''
+Runs a worker in its own process ("Process": true in its config). Its market data is read from the shared memory of
+the host, and it has its own Api for the orders.
+'''
+def run_process_worker(params: Parameters, api_keys, arguments, shared_data_name, shard_index: int, shard_count: int):
+    logger = LoggingUtils()
+    try:
+        api = ExchangeFactory.create_api(params, params.config["Exchange"], api_keys)
+        api.market_feed = SharedMarketFeed(shared_data_name, shard_index, shard_count)
+        market_historic = MarketHistoric()
+        market_historic.external_candles = True
+        Config.set_arguments(arguments)
+        if params.config.get("Async_Worker", False):
+            worker = AsyncBotWorker(params, api, market_historic)
+        else:
+            worker = BotWorker(params, api, market_historic)
+        worker.run()
+        latency_stats.report()
+    except Exception:
+        logger.logging_exception("Worker Crashed")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -13,174 +13,437 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Bittbot. If not, see <https://www.gnu.org/licenses/>.
 
+import os
 import time
+from pathlib import Path
+from queue import Queue, Empty
+from typing import Dict, Optional
 
 from api.Api import Api
 from domain.InfoAlt import InfoAlt
 from domain.MarketHistoric import MarketHistoric
+from domain.OrdersSnapshot import OrdersSnapshot
 from domain.Parameters import Parameters
+from domain.WorkerCheckpoint import WorkerCheckpoint, restore_state
+from event.CandleClosed import CandleClosed
+from event.OrderUpdated import OrderUpdated
+from event.TickerUpdated import TickerUpdated
 from strategy.StrategyAutoMargin import StrategyAutoMargin
 from strategy.StrategyBBands import StrategyBBands
 from strategy.StrategyMacdRsi import StrategyMacdRsi
 from strategy.StrategyGeneral import StrategyGeneral
 from utils import Config
+from utils.LatencyProxy import LatencyProxy
+from utils.LatencyStats import latency_stats
 from utils.LoggingUtils import LoggingUtils
 from utils.Telegram import Telegram
 
 
 class BotWorker(object):
-    def __init__(self, params: Parameters, api: Api):
+    '''
+    Trades the coins of params with its strategy. The market data is read from market_historic and the notifications
+    sent with telegram_bot, both can be shared with other workers (see BotHost). New ones are created if not given.
+    The calls to the Api, the strategy, Telegram, the logger and the checkpoint are measured in latency_stats, as well
+    as the phases of the cycle, and a summary is logged from time to time.
+    '''
+    def __init__(self, params: Parameters, api: Api, market_historic: MarketHistoric = None, telegram_bot: Telegram = None):
         self.params = params
-        self.api = api
+        self.api = LatencyProxy(api, 'Api')
         self.global_cycles = 0
         self.num_profit_cycles = 0
         self.num_losses_cycles = 0
         self.total_profit = 0.0
-        self.sleep = 10
+        self.heartbeat_seconds = self.params.config.get("Heartbeat_Seconds", Config.DEFAULT_HEARTBEAT_SECONDS)
+        # Markets with new events, put by the event handlers, and if their orders have to be checked
+        self.wake_up_queue = Queue()
         self.profit_alts = []
         self.losses_alts = []
-        self.telegram_bot = Telegram()
-        self.logger = LoggingUtils()
-        self.market_historic = MarketHistoric()
+        self.telegram_bot = LatencyProxy(telegram_bot if telegram_bot is not None else Telegram(), 'Telegram')
+        self.logger = LatencyProxy(LoggingUtils(), 'LoggingUtils')
+        # The shared market data is owned, and closed, by the one who created it
+        self.owns_market_data = market_historic is None
+        if self.owns_market_data:
+            market_historic = MarketHistoric()
+            market_historic.enable_candle_store(os.path.join(Config.CANDLES_DIRECTORY, self.params.config["Exchange"]))
+            if self.params.config.get("Tick_Journal", False):
+                self.api.enable_tick_journal(os.path.join(Config.TICKS_DIRECTORY, self.params.config["Exchange"]))
+        self.market_historic = market_historic
         self.strategy = self.get_entry_strategy()
+        self.checkpoint = None  # type: Optional[WorkerCheckpoint]
+        if self.params.config.get("Checkpoint", False):
+            self.checkpoint = LatencyProxy(WorkerCheckpoint(Config.CHECKPOINT_DIRECTORY, self.get_checkpoint_name()), 'WorkerCheckpoint')
 
     def get_entry_strategy(self):
-        if self.params.funcionamiento == Config.STRATEGY_AUTO_MARGIN:
-            return StrategyAutoMargin(self.params, self.api, self.telegram_bot, self.market_historic)
-        elif self.params.funcionamiento == Config.STRATEGY_MACD_RSI:
-            return StrategyMacdRsi(self.params, self.api, self.telegram_bot, self.market_historic)
-        elif self.params.funcionamiento == Config.STRATEGY_MANUAL_INCREMENT_24H_ALL_ALTS:
-            return StrategyGeneral(self.params, self.api, self.telegram_bot, self.market_historic)
-        elif self.params.funcionamiento == Config.STRATEGY_BBANDS:
-            return StrategyBBands(self.params, self.api, self.telegram_bot, self.market_historic)
+        strategy_class = self.get_strategy_class(self.params.funcionamiento)
+        if strategy_class is not None:
+            return LatencyProxy(strategy_class(self.params, self.api, self.telegram_bot, self.market_historic), strategy_class.__name__)
+
+    @staticmethod
+    def get_strategy_class(funcionamiento):
+        if funcionamiento == Config.STRATEGY_AUTO_MARGIN:
+            return StrategyAutoMargin
+        elif funcionamiento == Config.STRATEGY_MACD_RSI:
+            return StrategyMacdRsi
+        elif funcionamiento == Config.STRATEGY_MANUAL_INCREMENT_24H_ALL_ALTS:
+            return StrategyGeneral
+        elif funcionamiento == Config.STRATEGY_BBANDS:
+            return StrategyBBands
+        return None
 
     def run(self):
+        self.prepare()
+        self.operate()
+
+    '''
+    Asks the parameters of the strategy, from the arguments or the console.
+    '''
+    def prepare(self):
         self.strategy.get_needed_parameters()
         self.strategy.show_config_summary()
         self.strategy.telegram_config_summary()
+
+    def get_checkpoint_name(self):
+        default_name = "{}_{}_{}".format(Path(self.params.config_file).stem, self.params.config["Exchange"], self.params.funcionamiento)
+        return self.params.config.get("Checkpoint_Name", default_name)
+
+    def operate(self):
         self.strategy.pre_cycles_iterator()
+        self.restore_checkpoint()
+        # After the strategy, so its handlers have already calculated the buy signals when the worker is woken up
+        self.market_historic.events.subscribe(TickerUpdated, self.on_market_event)
+        self.market_historic.events.subscribe(CandleClosed, self.on_market_event)
+        self.market_historic.events.subscribe(OrderUpdated, self.on_order_event)
 
         self.logger.print_init_bot()
+        next_heartbeat = time.monotonic()
         while self.global_cycles < self.params.cycles:
-            self.strategy.pre_coins_interator()
-            self.logger.logging_result('CICLOS: {}/{} -- Tot. Ciclos Benef: {} - Tot. Ciclos Perd: {} -- Beneficio: {}'.format(self.global_cycles, self.params.cycles, self.num_profit_cycles, self.num_losses_cycles, self.total_profit))
-            for coin in self.params.coins_trader:
-                if coin.operation_type == 'NO_ORDER':
-                    # Only check for potential new buys if with this new buy we won't surpass max cycles.
-                    if self.api.num_open_orders() + self.global_cycles < self.params.cycles:
-                        if self.strategy.should_buy_coin(coin):
-                            coin.operation_type = 'BUY'
-
-                if coin.operation_type == 'BUY':
-                    if self.do_buy(coin):
-                        self.telegram_bot.send_message('[{}] Orden de compra creada a {}'.format(coin.n_alt, coin.last_buy_price))
-
-                if coin.operation_type == 'WAIT_BUY':
-                    self.strategy.buy_order_placed_at_exchange(coin)
-                    bought = self.do_wait_for_buy_to_complete(coin)
-                    if bought:
-                        self.strategy.buy_order_completed(coin)
-                        self.telegram_bot.send_message('[{}] Compra realizada correctamente a {}!'.format(coin.n_alt, coin.last_buy_price))
-
-                if coin.operation_type == 'SELL':
-                    if self.do_sell(coin):
-                        self.telegram_bot.send_message('[{}] Orden de venta creada a {}'.format(coin.n_alt, coin.last_sell_price))
-
-                if coin.operation_type == 'WAIT_SELL':
-                    self.strategy.sell_order_placed_at_exchange(coin)
-                    sold = self.do_wait_for_sell_to_complete(coin)
-                    if sold:
-                        self.strategy.sell_order_completed(coin)
-                        self.telegram_bot.send_message('[{}] Venta finalizada correctamente a {}!'.format(coin.n_alt, coin.last_sell_price))
-
-            self.strategy.post_coins_interator()
-            time.sleep(self.sleep)
+            if time.monotonic() >= next_heartbeat:
+                # Heartbeat: strategy housekeeping and check the orders of all the coins
+                next_heartbeat = time.monotonic() + self.heartbeat_seconds
+                with latency_stats.measure('BotWorker.heartbeat'):
+                    self.strategy.pre_coins_interator()
+                    self.strategy.evaluate_buy_signals(self.params.coins_trader)
+                    self.logger.logging_result('CICLOS: {}/{} -- Tot. Ciclos Benef: {} - Tot. Ciclos Perd: {} -- Beneficio: {}'.format(self.global_cycles, self.params.cycles, self.num_profit_cycles, self.num_losses_cycles, self.total_profit))
+                    orders_snapshot = self.get_orders_snapshot()
+                    for coin in list(self.params.coins_trader):
+                        with latency_stats.measure('BotWorker.process_coin'):
+                            self.process_coin(coin, True, orders_snapshot)
+                    self.strategy.post_coins_interator()
+                    self.save_checkpoint()
+                latency_stats.report_if_due()
+            else:
+                with latency_stats.measure('BotWorker.wait_for_wake_up'):
+                    woken_markets = self.wait_for_wake_up(next_heartbeat - time.monotonic())
+                if woken_markets is None:
+                    continue
+                with latency_stats.measure('BotWorker.wake_up'):
+                    self.strategy.evaluate_buy_signals(self.params.coins_trader)
+                    for coin in list(self.params.coins_trader):
+                        if coin.n_alt in woken_markets and self.global_cycles < self.params.cycles:
+                            with latency_stats.measure('BotWorker.process_coin'):
+                                self.process_coin(coin, woken_markets[coin.n_alt])
 
+        self.market_historic.events.unsubscribe(TickerUpdated, self.on_market_event)
+        self.market_historic.events.unsubscribe(CandleClosed, self.on_market_event)
+        self.market_historic.events.unsubscribe(OrderUpdated, self.on_order_event)
         self.strategy.post_cycles_iterator()
+        self.close_checkpoint()
+        if self.owns_market_data:
+            self.api.close_tick_journal()
+            self.market_historic.flush_candle_store()
         self.print_results()
+        # The host reports once all its workers have finished
+        if self.owns_market_data:
+            latency_stats.report()
+
+    '''
+    Advances the coin to its next operation, if possible. The orders at the Exchange are only checked (REST calls)
+    when check_orders is True, the price based decisions (buy, move the order, stop loss) are always evaluated.
+    The orders are looked up first in orders_snapshot, if any.
+    '''
+    def process_coin(self, coin: InfoAlt, check_orders: bool, orders_snapshot: OrdersSnapshot = None):
+        if coin.operation_type == 'NO_ORDER':
+            # Only check for potential new buys if with this new buy we won't surpass max cycles.
+            if self.params.coins_trader.num_open_orders() + self.global_cycles < self.params.cycles:
+                if self.strategy.should_buy_coin(coin):
+                    coin.operation_type = 'BUY'
+
+        # A new order is not checked until the next pass, it's not going to be completed yet
+        placed = False
+        if coin.operation_type == 'BUY':
+            placed = self.do_buy(coin)
+            if placed:
+                self.strategy.buy_order_placed_at_exchange(coin)
+                self.telegram_bot.send_message('[{}] Orden de compra creada a {}'.format(coin.n_alt, coin.last_buy_price))
+
+        if coin.operation_type == 'WAIT_BUY':
+            bought = self.do_wait_for_buy_to_complete(coin, check_orders and not placed, orders_snapshot)
+            if bought:
+                self.strategy.buy_order_completed(coin)
+                self.telegram_bot.send_message('[{}] Compra realizada correctamente a {}!'.format(coin.n_alt, coin.last_buy_price))
+
+        if coin.operation_type == 'SELL':
+            placed = self.do_sell(coin)
+            if placed:
+                self.strategy.sell_order_placed_at_exchange(coin)
+                self.telegram_bot.send_message('[{}] Orden de venta creada a {}'.format(coin.n_alt, coin.last_sell_price))
+
+        if coin.operation_type == 'WAIT_SELL':
+            sold = self.do_wait_for_sell_to_complete(coin, check_orders and not placed, orders_snapshot)
+            if sold:
+                self.strategy.sell_order_completed(coin)
+                self.telegram_bot.send_message('[{}] Venta finalizada correctamente a {}!'.format(coin.n_alt, coin.last_sell_price))
+
+        # Order moves and changes made by the strategy
+        self.checkpoint_coin(coin)
+
+    '''
+    Waits up to timeout seconds for new events. Returns the markets with events, with True if their orders have to be
+    checked, or None if there were no events.
+    '''
+    def wait_for_wake_up(self, timeout: float) -> Optional[Dict[str, bool]]:
+        try:
+            market_names, check_orders = self.wake_up_queue.get(timeout=max(timeout, 0))
+        except Empty:
+            return None
+        woken_markets = {}
+        while True:
+            for market_name in market_names:
+                woken_markets[market_name] = woken_markets.get(market_name, False) or check_orders
+            try:
+                market_names, check_orders = self.wake_up_queue.get_nowait()
+            except Empty:
+                return woken_markets
+
+    def on_market_event(self, event) -> None:
+        self.wake_up_queue.put((event.market_names, False))
+
+    def on_order_event(self, event: OrderUpdated) -> None:
+        self.wake_up_queue.put((self.get_order_market_names(event), True))
+
+    def get_order_market_names(self, event: OrderUpdated):
+        if len(event.market_names) > 0:
+            return event.market_names
+        waiting_coins = self.params.coins_trader.get_coins('WAIT_BUY') + self.params.coins_trader.get_coins('WAIT_SELL')
+        return [coin.n_alt for coin in waiting_coins if str(coin.num_last_orden) == event.order_id]
 
     def do_buy(self, coin: InfoAlt):
-        coin_market_data = self.market_historic.get_coin_market_data(coin.n_alt)
-        num_last_order, buy_price = self.api.order_buy(coin.n_alt, coin_market_data.lowestAsk, self.params.saldo_inv)
+        ticker = self.market_historic.get_ticker(coin.n_alt)
+        num_last_order, buy_price = self.api.order_buy(coin.n_alt, ticker.lowestAsk, self.params.saldo_inv)
         if num_last_order is not None:
-            coin.num_last_orden = num_last_order
-            coin.last_buy_price = buy_price
-            coin.operation_type = 'WAIT_BUY'
-            coin.inv_last_compra = self.params.saldo_inv
-            time.sleep(self.sleep)
+            self.set_buy_order(coin, num_last_order, buy_price)
             return True
         return False
 
-    def do_wait_for_buy_to_complete(self, coin: InfoAlt):
-        if self.api.hist_exists(coin.n_alt, coin.num_last_orden) and not self.api.open_orders(coin.n_alt, coin.num_last_orden):
-            self.logger.logging_info('ORDEN DE COMPRA NUM: {} PARA {} FINALIZADA CORRECTAMENTE'.format(coin.num_last_orden, coin.n_alt))
-            coin.operation_type = 'SELL'
+    def do_wait_for_buy_to_complete(self, coin: InfoAlt, check_orders: bool, orders_snapshot: OrdersSnapshot = None):
+        if check_orders and self.is_order_completed(coin, orders_snapshot):
+            self.set_buy_completed(coin)
             return True
         else:
-            coin_market_data = self.market_historic.get_coin_market_data(coin.n_alt)
-            if coin_market_data.lowestAsk > (coin.last_buy_price + (coin.last_buy_price * 0.01)):
-                mv_num_orden = self.api.order_move(coin.num_last_orden, coin_market_data.lowestAsk, coin.operation_type)
+            ticker = self.market_historic.get_ticker(coin.n_alt)
+            if self.is_buy_price_outdated(coin, ticker):
+                mv_num_orden = self.api.order_move(coin.num_last_orden, ticker.lowestAsk, coin.operation_type)
                 if mv_num_orden is not None:
-                    coin.last_buy_price = coin_market_data.lowestAsk
+                    coin.last_buy_price = ticker.lowestAsk
                     coin.num_last_orden = mv_num_orden
-                    time.sleep(self.sleep)
-            else:
-                self.logger.logging_result('ESPERANDO QUE SE CIERRE LA ORDEN {} DE {} PARA {} ({})'.format(coin.num_last_orden, coin.operation_type, coin.n_alt, coin.last_buy_price))
+            elif check_orders:
+                self.log_waiting_order(coin, coin.last_buy_price)
             return False
 
     def do_sell(self, coin: InfoAlt):
-        coin_market_data = self.market_historic.get_coin_market_data(coin.n_alt)
+        ticker = self.market_historic.get_ticker(coin.n_alt)
         saldo_inv_alt = self.api.get_balance(coin.n_alt)
-        sell_price = coin.last_buy_price + (coin.last_buy_price * self.params.profit_margin_alts)
-        if sell_price < coin_market_data.highestBid:
-            sell_price = coin_market_data.highestBid
+        if saldo_inv_alt is not None and saldo_inv_alt <= 0:
+            # The cached balance may not have the last fill yet
+            saldo_inv_alt = self.api.get_balance(coin.n_alt, True)
+        sell_price = self.get_sell_price(coin, ticker)
 
-        if saldo_inv_alt > 0:
+        if saldo_inv_alt is not None and saldo_inv_alt > 0:
             order_id = self.api.order_sell(coin.n_alt, sell_price, saldo_inv_alt)
             if order_id is not None:
-                coin.num_last_orden = order_id
-                coin.last_sell_price = sell_price
-                coin.operation_type = 'WAIT_SELL'
-                coin.inv_last_venta = saldo_inv_alt
-                time.sleep(self.sleep)
+                self.set_sell_order(coin, order_id, sell_price, saldo_inv_alt)
                 return True
         else:
-            self.logger.logging_line_char(">")
-            self.logger.logging_error('ERROR. SALDO INSUFICIENTE EN {} PARA REALIZAR LA VENTA'.format(coin.n_alt))
-            self.logger.logging_error('ESPERANDO NUEVO SALDO')
-            self.logger.logging_line_char(">")
+            self.log_insufficient_balance(coin)
         return False
 
-    def do_wait_for_sell_to_complete(self, coin: InfoAlt):
-        if self.api.hist_exists(coin.n_alt, coin.num_last_orden) and not self.api.open_orders(coin.n_alt, coin.num_last_orden):
-            self.logger.logging_result('ORDEN DE VENTA NUM: {} PARA {} FINALIZADA CORRECTAMENTE'.format(coin.num_last_orden, coin.n_alt))
-            coin.operation_type = 'NO_ORDER'
+    def do_wait_for_sell_to_complete(self, coin: InfoAlt, check_orders: bool, orders_snapshot: OrdersSnapshot = None):
+        if check_orders and self.is_order_completed(coin, orders_snapshot):
+            self.set_sell_completed(coin)
+            return True
+        else:
+            ticker = self.market_historic.get_ticker(coin.n_alt)
+            if self.is_stop_loss_reached(coin, ticker):
+                self.logger.logging_info('STOP LOSS: MOVIENDO LA ORDEN A PARA CERRAR CON PERDIDAS')
+                mv_num_orden = self.api.order_move(coin.num_last_orden, ticker.highestBid, coin.operation_type)
+                if mv_num_orden is not None:
+                    coin.last_sell_price = ticker.highestBid
+                    coin.num_last_orden = mv_num_orden
+            elif check_orders:
+                self.log_waiting_order(coin, coin.last_sell_price)
+            return False
 
-            if coin.last_sell_price - coin.last_buy_price > 0:
-                self.num_profit_cycles += 1
-                self.profit_alts.append(coin.n_alt)
-            else:
-                self.num_losses_cycles += 1
-                self.losses_alts.append(coin.n_alt)
+    def is_order_completed(self, coin: InfoAlt, orders_snapshot: Optional[OrdersSnapshot]) -> bool:
+        completed = self.get_known_order_state(coin, orders_snapshot)
+        if completed is not None:
+            return completed
+        return self.api.hist_exists(coin.n_alt, coin.num_last_orden) and not self.api.open_orders(coin.n_alt, coin.num_last_orden)
 
-            self.total_profit += (coin.last_sell_price * coin.inv_last_venta) - coin.inv_last_compra
-            self.global_cycles += 1
+    '''
+    Returns if the order of the coin is completed, according to the snapshot and the orders pushed by the account
+    websocket, or None if none of them know it. A completed order never changes, so if any of them says it is, it is.
+    '''
+    def get_known_order_state(self, coin: InfoAlt, orders_snapshot: Optional[OrdersSnapshot]) -> Optional[bool]:
+        states = [snapshot.is_order_completed(coin.num_last_orden) for snapshot in [orders_snapshot, self.api.account_orders] if snapshot is not None]
+        if True in states:
             return True
+        if False in states:
+            return False
+        return None
+
+    '''
+    Reads the orders of all the coins waiting for them at once, instead of two calls for each coin.
+    '''
+    def get_orders_snapshot(self) -> Optional[OrdersSnapshot]:
+        if not self.is_any_coin_waiting_orders():
+            return None
+        return self.api.get_orders_snapshot()
+
+    def is_any_coin_waiting_orders(self) -> bool:
+        return self.params.coins_trader.count('WAIT_BUY') + self.params.coins_trader.count('WAIT_SELL') > 0
+
+    #################################################
+    #   ORDER STATE (no Exchange calls, no waits)   #
+    #################################################
+
+    def set_buy_order(self, coin: InfoAlt, num_last_order, buy_price):
+        coin.num_last_orden = num_last_order
+        coin.last_buy_price = buy_price
+        coin.operation_type = 'WAIT_BUY'
+        coin.inv_last_compra = self.params.saldo_inv
+        self.checkpoint_coin(coin)
+
+    def set_buy_completed(self, coin: InfoAlt):
+        self.logger.logging_info('ORDEN DE COMPRA NUM: {} PARA {} FINALIZADA CORRECTAMENTE'.format(coin.num_last_orden, coin.n_alt))
+        coin.operation_type = 'SELL'
+        self.api.invalidate_balances(coin.n_alt)
+        self.checkpoint_coin(coin)
+
+    def is_buy_price_outdated(self, coin: InfoAlt, ticker) -> bool:
+        return ticker.lowestAsk > (coin.last_buy_price + (coin.last_buy_price * 0.01))
+
+    def get_sell_price(self, coin: InfoAlt, ticker) -> float:
+        sell_price = coin.last_buy_price + (coin.last_buy_price * self.params.profit_margin_alts)
+        if sell_price < ticker.highestBid:
+            sell_price = ticker.highestBid
+        return sell_price
+
+    def set_sell_order(self, coin: InfoAlt, order_id, sell_price, saldo_inv_alt):
+        coin.num_last_orden = order_id
+        coin.last_sell_price = sell_price
+        coin.operation_type = 'WAIT_SELL'
+        coin.inv_last_venta = saldo_inv_alt
+        self.checkpoint_coin(coin)
+
+    def set_sell_completed(self, coin: InfoAlt):
+        self.logger.logging_result('ORDEN DE VENTA NUM: {} PARA {} FINALIZADA CORRECTAMENTE'.format(coin.num_last_orden, coin.n_alt))
+        coin.operation_type = 'NO_ORDER'
+        self.api.invalidate_balances(coin.n_alt)
+
+        if coin.last_sell_price - coin.last_buy_price > 0:
+            self.num_profit_cycles += 1
+            self.profit_alts.append(coin.n_alt)
         else:
-            if self.params.stop_loss > 0.0:
-                coin_market_data = self.market_historic.get_coin_market_data(coin.n_alt)
-                if coin_market_data.highestBid <= coin.last_buy_price - (coin.last_buy_price * self.params.stop_loss):
-                    self.logger.logging_info('STOP LOSS: MOVIENDO LA ORDEN A PARA CERRAR CON PERDIDAS')
-                    mv_num_orden = self.api.order_move(coin.num_last_orden, coin_market_data.highestBid, coin.operation_type)
-                    if mv_num_orden is not None:
-                        coin.last_sell_price = coin_market_data.highestBid
-                        coin.num_last_orden = mv_num_orden
-                        time.sleep(self.sleep)
-                else:
-                    self.logger.logging_result('ESPERANDO QUE SE CIERRE LA ORDEN {} DE {} PARA {} ({})'.format(coin.num_last_orden, coin.operation_type, coin.n_alt, coin.last_sell_price))
+            self.num_losses_cycles += 1
+            self.losses_alts.append(coin.n_alt)
+
+        self.total_profit += (coin.last_sell_price * coin.inv_last_venta) - coin.inv_last_compra
+        self.global_cycles += 1
+        if self.checkpoint is not None:
+            self.checkpoint.save_coin_and_counters(coin, self.get_counters())
+
+    #################################################
+    #   CHECKPOINT (state to go on after a crash)   #
+    #################################################
+
+    '''
+    Restores the coins and the results of the last execution, if it didn't finish. The coins with orders are added
+    to coins_trader if the strategy didn't add them, and the strategy is told about their buys. A buy that may not
+    have been placed is decided again. The orders are checked with the Exchange on the first heartbeat, so only what
+    changed while the bot was stopped has to be asked.
+    '''
+    def restore_checkpoint(self):
+        if self.checkpoint is None or not self.checkpoint.load():
+            return
+        counters = self.checkpoint.counters
+        self.global_cycles = counters.get("global_cycles", 0)
+        self.num_profit_cycles = counters.get("num_profit_cycles", 0)
+        self.num_losses_cycles = counters.get("num_losses_cycles", 0)
+        self.total_profit = counters.get("total_profit", 0.0)
+        self.profit_alts = counters.get("profit_alts", [])
+        self.losses_alts = counters.get("losses_alts", [])
+
+        num_restored_orders = 0
+        for state in self.checkpoint.coins.values():
+            coin = self.params.coins_trader.get(state["n_alt"])
+            if coin is None:
+                if state["operation_type"] in ['NO_ORDER', 'BUY']:
+                    continue
+                coin = InfoAlt()
+                restore_state(coin, state)
+                self.params.coins_trader.append(coin)
             else:
-                self.logger.logging_result('ESPERANDO QUE SE CIERRE LA ORDEN {} DE {} PARA {} ({})'.format(coin.num_last_orden, coin.operation_type, coin.n_alt, coin.last_sell_price))
+                restore_state(coin, state)
+            if coin.operation_type == 'BUY':
+                coin.operation_type = 'NO_ORDER'
+            if coin.operation_type in ['WAIT_BUY', 'SELL', 'WAIT_SELL']:
+                self.strategy.buy_order_placed_at_exchange(coin)
+                num_restored_orders += 1
+        self.logger.logging_info('RESTAURADO EL ESTADO ANTERIOR: {} CICLOS, {} ALTS CON ORDENES'.format(self.global_cycles, num_restored_orders))
+
+    def checkpoint_coin(self, coin: InfoAlt):
+        if self.checkpoint is not None:
+            self.checkpoint.save_coin(coin)
+
+    '''
+    Saves the coins added and removed by the strategy, and writes a new snapshot if it's time.
+    '''
+    def save_checkpoint(self):
+        if self.checkpoint is not None:
+            self.checkpoint.save_coins(self.params.coins_trader)
+            self.checkpoint.save_counters(self.get_counters())
+            self.checkpoint.snapshot_if_due()
+
+    '''
+    Deletes the checkpoint if all the cycles were done, there is nothing to go on with.
+    '''
+    def close_checkpoint(self):
+        if self.checkpoint is None:
+            return
+        if self.global_cycles >= self.params.cycles:
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.close()
+
+    def get_counters(self) -> Dict:
+        return {"global_cycles": self.global_cycles, "num_profit_cycles": self.num_profit_cycles,
+                "num_losses_cycles": self.num_losses_cycles, "total_profit": self.total_profit,
+                "profit_alts": self.profit_alts, "losses_alts": self.losses_alts}
+
+    def is_stop_loss_reached(self, coin: InfoAlt, ticker) -> bool:
+        if self.params.stop_loss <= 0.0:
             return False
+        # Once moved, it is only moved again if the price keeps going down
+        return ticker.highestBid <= coin.last_buy_price - (coin.last_buy_price * self.params.stop_loss) and ticker.highestBid < coin.last_sell_price
+
+    def log_waiting_order(self, coin: InfoAlt, price):
+        self.logger.logging_result('ESPERANDO QUE SE CIERRE LA ORDEN {} DE {} PARA {} ({})'.format(coin.num_last_orden, coin.operation_type, coin.n_alt, price))
+
+    def log_insufficient_balance(self, coin: InfoAlt):
+        self.logger.logging_line_char(">")
+        self.logger.logging_error('ERROR. SALDO INSUFICIENTE EN {} PARA REALIZAR LA VENTA'.format(coin.n_alt))
+        self.logger.logging_error('ESPERANDO NUEVO SALDO')
+        self.logger.logging_line_char(">")
 
     def print_results(self):
         self.logger.logging_empty_line()